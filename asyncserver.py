@@ -0,0 +1,276 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import sys
+import asyncio
+import logging
+from io import BytesIO
+from urllib.parse import unquote
+from wsgiref.handlers import format_date_time
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("server")
+
+
+class AsyncWSGIServer():
+    """
+        asyncio HTTP/1.1 server that hosts a WSGI app
+
+        Falcon (and WSGI) handlers are synchronous, so the app itself is called on a pool of executor threads, which
+        is where snapshot builds happen. Responses are written to the clients by the event loop with flow control, so
+        a slow client downloading a large term only holds a buffer instead of a worker thread.
+    """
+    maxLineLength = 65536
+    maxHeaders = 100
+
+    def __init__(self, app, threads, keepalive, timeout):
+        """
+        Constructor for the asyncio server
+
+        :param app: **falcon.API** WSGI app to serve
+        :param threads: **int** Amount of executor threads that call the app
+        :param keepalive: **int/float** Seconds an idle connection is kept open
+        :param timeout: **int/float** Seconds a client can take to send a request or accept part of a response
+        :return:
+        """
+        self.app = app
+        self.keepalive = keepalive
+        self.requestTimeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def buildEnviron(self, method, target, version, headers, body, writer):
+        """
+        Returns the WSGI environ of a parsed request
+
+        :param method: **string** HTTP method
+        :param target: **string** Request target (path and query string)
+        :param version: **string** HTTP version of the request (ex. HTTP/1.1)
+        :param headers: **list** (name, value) header tuples
+        :param body: **bytes** Request body
+        :param writer: **asyncio.StreamWriter** Writer of the connection
+        :return: **dict** WSGI environ
+        """
+        path, _, query = target.partition("?")
+        sockname = writer.get_extra_info("sockname")
+        peername = writer.get_extra_info("peername")
+
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path, "iso-8859-1"),
+            "QUERY_STRING": query,
+            "SERVER_NAME": str(sockname[0]) if sockname else "localhost",
+            "SERVER_PORT": str(sockname[1]) if sockname else "",
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": str(peername[0]) if peername else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False
+        }
+
+        for name, value in headers:
+            key = name.upper().replace("-", "_")
+
+            if key == "CONTENT_TYPE" or key == "CONTENT_LENGTH":
+                environ[key] = value
+            else:
+                key = "HTTP_" + key
+
+                if key in environ:
+                    environ[key] += "," + value
+                else:
+                    environ[key] = value
+
+        return environ
+
+    def callApp(self, environ):
+        """
+        Calls the WSGI app, this runs on an executor thread
+
+        :param environ: **dict** WSGI environ of the request
+        :return: **tuple** (status, headers, chunks) where chunks is a list or an iterator of the body
+        """
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+            return written.append
+
+        result = self.app(environ, start_response)
+
+        # Most responses are a list with a single cached body, which needs no more work in the executor
+        if isinstance(result, (list, tuple)):
+            return response["status"], response["headers"], written + list(result)
+
+        return response["status"], response["headers"], iter(result)
+
+    async def readRequest(self, reader):
+        """
+        Reads the request line, headers and body of a request
+
+        :param reader: **asyncio.StreamReader** Reader of the connection
+        :return: **tuple/bool** (method, target, version, headers, body), False if the connection should be closed
+        """
+        requestline = await asyncio.wait_for(reader.readline(), self.keepalive)
+
+        if not requestline or len(requestline) > self.maxLineLength:
+            return False
+
+        parts = requestline.decode("iso-8859-1").split()
+
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            return False
+
+        headers = []
+
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.requestTimeout)
+
+            if len(line) > self.maxLineLength or len(headers) > self.maxHeaders:
+                return False
+
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+            name, _, value = line.decode("iso-8859-1").partition(":")
+            headers.append((name.strip(), value.strip()))
+
+        body = b""
+
+        for name, value in headers:
+            if name.lower() == "content-length" and value.isdigit() and int(value) > 0:
+                body = await asyncio.wait_for(reader.readexactly(int(value)), self.requestTimeout)
+
+        return parts[0], parts[1], parts[2], headers, body
+
+    async def writeResponse(self, writer, status, headers, chunks, keepAlive):
+        """
+        Writes the response to the client, draining after every chunk so slow clients don't buffer the whole body
+
+        :param writer: **asyncio.StreamWriter** Writer of the connection
+        :param status: **string** WSGI status (ex. "200 OK")
+        :param headers: **list** (name, value) header tuples
+        :param chunks: **list/iterator** Body chunks, iterators are advanced on the executor
+        :param keepAlive: **bool** Whether the connection is kept open after this response
+        :return:
+        """
+        loop = asyncio.get_event_loop()
+
+        head = "HTTP/1.1 " + status + "\r\n"
+        head += "Date: " + format_date_time(time()) + "\r\n"
+
+        for name, value in headers:
+            head += name + ": " + value + "\r\n"
+
+        if not keepAlive:
+            head += "Connection: close\r\n"
+
+        writer.write((head + "\r\n").encode("iso-8859-1"))
+
+        if isinstance(chunks, list):
+            for chunk in chunks:
+                writer.write(chunk)
+                await asyncio.wait_for(writer.drain(), self.requestTimeout)
+        else:
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(self.pool, next, chunks, None)
+
+                    if chunk is None:
+                        break
+
+                    writer.write(chunk)
+                    await asyncio.wait_for(writer.drain(), self.requestTimeout)
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+
+    async def handleConnection(self, reader, writer):
+        """
+        Serves requests on a connection until the client closes it or it goes idle
+
+        :param reader: **asyncio.StreamReader** Reader of the connection
+        :param writer: **asyncio.StreamWriter** Writer of the connection
+        :return:
+        """
+        loop = asyncio.get_event_loop()
+
+        try:
+            while True:
+                request = await self.readRequest(reader)
+
+                if not request:
+                    break
+
+                method, target, version, headers, body = request
+                environ = self.buildEnviron(method, target, version, headers, body, writer)
+
+                status, responseHeaders, chunks = await loop.run_in_executor(self.pool, self.callApp, environ)
+
+                # Decide whether the connection can be reused
+                connection = environ.get("HTTP_CONNECTION", "").lower()
+                keepAlive = version == "HTTP/1.1" and "close" not in connection
+
+                # 1xx, 204 and 304 responses and responses to HEAD never have a body, so they're delimited without a
+                # Content-Length
+                code = int(status.split(" ", 1)[0])
+                hasBody = method != "HEAD" and code >= 200 and code not in (204, 304)
+
+                if not hasBody:
+                    if hasattr(chunks, "close"):
+                        chunks.close()
+
+                    chunks = []
+                elif not any(name.lower() == "content-length" for name, value in responseHeaders):
+                    if isinstance(chunks, list):
+                        length = sum(len(chunk) for chunk in chunks)
+                        responseHeaders = list(responseHeaders) + [("Content-Length", str(length))]
+                    else:
+                        # Streamed bodies without a length are delimited by closing the connection
+                        keepAlive = False
+
+                await self.writeResponse(writer, status, responseHeaders, chunks, keepAlive)
+
+                if not keepAlive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            log.exception("Error while serving a connection")
+        finally:
+            writer.close()
+
+    async def start(self, sock, backlog):
+        """
+        Starts accepting connections on the given listening socket and serves them forever
+
+        :param sock: **socket** Bound listening socket
+        :param backlog: **int** Amount of pending connections the kernel queues before refusing new ones
+        :return:
+        """
+        asyncserver = await asyncio.start_server(self.handleConnection, sock=sock, backlog=backlog)
+
+        async with asyncserver:
+            await asyncserver.serve_forever()
+
+    def serve_forever(self, sock, backlog):
+        """
+        Runs the event loop forever
+
+        :param sock: **socket** Bound listening socket
+        :param backlog: **int** Amount of pending connections the kernel queues before refusing new ones
+        :return:
+        """
+        asyncio.run(self.start(sock, backlog))
@@ -0,0 +1,607 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import json
+import gzip
+import hashlib
+import zlib
+import logging
+from threading import Lock, Thread
+from collections import OrderedDict
+from concurrent.futures import Future
+from termformat import encodeTerm
+from filters import ClassIndex
+
+# Brotli is optional, responses are only pre-compressed with gzip if it isn't installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger("cache")
+
+# Content codings we pre-compress to in order of preference
+encodings = ["br", "gzip"] if brotli else ["gzip"]
+
+# Bodies smaller than this aren't worth compressing
+minCompressSize = 1024
+
+
+def termETag(uni, term, generation, path=()):
+    """
+    Returns the ETag of a term's response given its scrape generation
+
+    Since the ETag only depends on the generation, it can be checked without building or hashing the body
+
+    :param uni: **string** uniID of the term
+    :param term: **string** ID of the term
+    :param generation: **int** Scrape generation of the term
+    :param path: **tuple** Path of the sub-resource below the term, () for /all
+    :return: **string** Weak ETag
+    """
+    return "W/" + "-".join([uni, term, str(generation)] + list(path))
+
+
+def bodyETag(body):
+    """
+    Returns the ETag of a response given its encoded body
+
+    Unlike termETag, it only changes when the body does, so a new generation doesn't invalidate unchanged subjects
+
+    :param body: **bytes** Encoded response body
+    :return: **string** Weak ETag
+    """
+    return "W/" + hashlib.sha1(body).hexdigest()
+
+
+def encodeBody(data):
+    """
+    Encodes a JSON response body, keys are sorted so equal data always has an equal body
+
+    :param data: **dict** Data to encode
+    :return: **bytes** Encoded body
+    """
+    return json.dumps(data, sort_keys=True).encode('utf-8')
+
+
+def flattenSubjects(classes):
+    """
+    Returns the subjects of a getSubjectListAll "classes" dict, whether or not they're grouped by faculty
+
+    :param classes: **dict** "classes" of a getSubjectListAll response
+    :return: **dict** Keys are the subject codes, values are the subject dicts (courses and "description")
+    """
+    subjects = {}
+
+    for key in classes:
+        # Subject dicts contain courses, which always have a class list
+        isSubject = False
+
+        for value in classes[key].values():
+            if isinstance(value, dict) and "classes" in value:
+                isSubject = True
+                break
+
+        if isSubject:
+            subjects[key] = classes[key]
+        else:
+            subjects.update(classes[key])
+
+    return subjects
+
+
+def filterRMP(rmp, courses):
+    """
+    Returns the RMP ratings of the teachers that teach the given courses
+
+    :param rmp: **dict** "rmp" of a getSubjectListAll response
+    :param courses: **list** Course dicts
+    :return: **dict** Subset of rmp
+    """
+    response = {}
+
+    for course in courses:
+        for classv in course["classes"]:
+            for teacher in classv["teachers"]:
+                if teacher in rmp:
+                    response[teacher] = rmp[teacher]
+
+    return response
+
+
+def negotiateEncoding(header, available):
+    """
+    Picks the content coding to respond with given the Accept-Encoding header of a request
+
+    :param header: **string/None** Value of the Accept-Encoding header
+    :param available: **dict/list** Content codings that the response is available in
+    :return: **string** Chosen content coding, "identity" if the body should be sent uncompressed
+    """
+    if not header:
+        return "identity"
+
+    # Parse the quality values of each coding (ex. "gzip;q=0.8, br")
+    qualities = {}
+
+    for part in header.split(","):
+        params = part.split(";")
+        coding = params[0].strip().lower()
+        quality = 1.0
+
+        for param in params[1:]:
+            name, _, value = param.partition("=")
+
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        qualities[coding] = quality
+
+    chosen = "identity"
+    chosenQuality = 0.0
+
+    for coding in encodings:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+
+        if coding in available and quality > chosenQuality:
+            chosen = coding
+            chosenQuality = quality
+
+    return chosen
+
+
+def acceptsType(header, mediatype):
+    """
+    Returns whether the Accept header of a request explicitly asks for the given media type
+
+    :param header: **string/None** Value of the Accept header
+    :param mediatype: **string** Media type to look for
+    :return: **bool** True if the media type is listed with a non-zero quality
+    """
+    if not header:
+        return False
+
+    for part in header.split(","):
+        params = part.split(";")
+
+        if params[0].strip().lower() != mediatype:
+            continue
+
+        for param in params[1:]:
+            name, _, value = param.partition("=")
+
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+
+        return True
+
+    return False
+
+
+def compressStream(chunks, encoding):
+    """
+    Compresses a stream of chunks on the fly
+
+    :param chunks: **iterator** Yields chunks of bytes
+    :param encoding: **string** "gzip" or "identity"
+    :return: **iterator** Yields the chunks in the given content coding
+    """
+    if encoding != "gzip":
+        yield from chunks
+        return
+
+    # wbits of 31 produces a gzip container
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+class CachedResponse():
+    """
+        Encoded API response along with its ETag
+
+        The body is compressed once per generation for every supported content coding
+    """
+    def __init__(self, body, etag):
+        """
+        Constructor for a cached response
+
+        :param body: **bytes** Encoded response body
+        :param etag: **string** ETag of the response
+        :return:
+        """
+        self.body = body
+        self.etag = etag
+
+        self.variants = {"identity": body}
+
+        if len(body) >= minCompressSize:
+            self.variants["gzip"] = gzip.compress(body, 9)
+
+            if brotli:
+                self.variants["br"] = brotli.compress(body, quality=9)
+
+        self.size = sum(len(variant) for variant in self.variants.values())
+
+
+class CachedTerm():
+    """
+        Every encoded API response of a (uni, term, generation)
+
+        Responses are keyed by their path below /v1/unis/{uni}/{term}:
+            () for /all
+            ("subjects",) for the subject index
+            ("subjects", subject) for a subject
+            ("subjects", subject, coursenum) for a course
+
+        /all is also kept in the columnar binary format of termformat.py, and the classes are indexed for filtered
+        queries
+    """
+    def __init__(self, uni, term, generation, termdata, body=None):
+        """
+        Constructor for a cached term, encodes every response from the getSubjectListAll structure
+
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :param generation: **int** Scrape generation that the data was built from
+        :param termdata: **dict** Response of getSubjectListAll
+        :param body: **bytes** termdata already encoded by encodeBody(), encoded here if not given
+        :return:
+        """
+        self.uni = uni
+        self.term = term
+        self.generation = generation
+        self.resources = {}
+
+        # Courses compiled for the schedule generator, filled on demand
+        self.compiled = {}
+
+        self.add((), termdata, body)
+
+        subjectIndex = {}
+        subjects = flattenSubjects(termdata["classes"])
+
+        for subject in subjects:
+            courses = {}
+
+            for key in subjects[subject]:
+                if key != "description":
+                    courses[key] = subjects[subject][key]
+
+            subjectIndex[subject] = {"description": subjects[subject].get("description", False),
+                                     "courses": sorted(courses.keys())}
+
+            self.add(("subjects", subject),
+                     {"subject": subjects[subject], "rmp": filterRMP(termdata["rmp"], courses.values())})
+
+            for coursenum in courses:
+                self.add(("subjects", subject, coursenum),
+                         {"course": courses[coursenum], "rmp": filterRMP(termdata["rmp"], [courses[coursenum]])})
+
+        self.add(("subjects",), subjectIndex)
+
+        self.binary = CachedResponse(encodeTerm(termdata), termETag(uni, term, generation, ("binary",)))
+
+        self.classIndex = ClassIndex(subjects)
+
+        self.size = sum(response.size for response in self.resources.values()) + self.binary.size + \
+            self.classIndex.size
+
+    def add(self, path, data, body=None):
+        """
+        Encodes and adds the response for the given path
+
+        /all keeps the generation based ETag so it can be checked before the term is built, the sub-resources get
+        the hash of their body
+
+        :param path: **tuple** Path of the response below the term
+        :param data: **dict** Data to encode
+        :param body: **bytes** data already encoded by encodeBody(), encoded here if not given
+        :return:
+        """
+        if body is None:
+            body = encodeBody(data)
+
+        etag = termETag(self.uni, self.term, self.generation) if path == () else bodyETag(body)
+
+        self.resources[path] = CachedResponse(body, etag)
+
+
+class ResponseCache():
+    """
+        Memory bounded LRU cache of encoded terms keyed by (uni, term, generation)
+
+        The cache also acts as the published buffer of a double-buffered snapshot model. When a scrape finishes, the
+        new generation is built into a staging dict and swapped in along with the university's snapshot in one step.
+        While a university is scraping its entries are pinned, so readers keep getting the last complete snapshot.
+        Universities that scrape into their published classes can't rebuild evicted terms while they scrape, so the
+        terms of their published snapshot are retained at all times.
+
+        Concurrent misses for the same term are coalesced, only the first one builds it from the DB while the others
+        wait for its result.
+    """
+    def __init__(self, maxbytes, changelog=None, search=None):
+        """
+        Constructor for the response cache
+
+        :param maxbytes: **int** Amount of bytes the cached bodies can take up before cold terms are evicted
+        :param changelog: **ChangeLog** If given, the changes of every published term are recorded in it
+        :param search: **SearchIndexes** If given, every published term is indexed in it
+        :return:
+        """
+        self.maxbytes = maxbytes
+        self.changelog = changelog
+        self.search = search
+        self.size = 0
+        self.entries = OrderedDict()
+        self.pinned = set()
+        self.retained = set()
+        self.building = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        """
+        Returns the cached response for the given key and marks it as recently used
+
+        :param key: **tuple** (uni, term, generation)
+        :return: **CachedTerm/bool** Cached term if it exists, False if not
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return False
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, entry):
+        """
+        Stores the response for the given key and evicts the least recently used terms if we're over budget
+
+        :param key: **tuple** (uni, term, generation)
+        :param entry: **CachedTerm** Term to store
+        :return:
+        """
+        with self.lock:
+            self.store(key, entry)
+            self.evict()
+
+    def store(self, key, entry):
+        """
+        Stores the response for the given key, the caller must hold the lock
+
+        :param key: **tuple** (uni, term, generation)
+        :param entry: **CachedTerm** Term to store
+        :return:
+        """
+        if key in self.entries:
+            self.size -= self.entries[key].size
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.size += entry.size
+
+    def evict(self):
+        """
+        Evicts the least recently used responses until we're within budget, the caller must hold the lock
+
+        The most recently used entry and the entries of pinned and retained unis are never evicted
+
+        :return:
+        """
+        if self.size <= self.maxbytes:
+            return
+
+        for key in list(self.entries.keys())[:-1]:
+            if key[0] not in self.pinned and key[0] not in self.retained:
+                self.size -= self.entries.pop(key).size
+                log.debug("Evicted " + str(key) + " from the response cache")
+
+                if self.size <= self.maxbytes:
+                    break
+
+    def pin(self, uni):
+        """
+        Prevents the responses of the given uni from being evicted (ex. while it is scraping)
+
+        :param uni: **string** uniID to pin
+        :return:
+        """
+        with self.lock:
+            self.pinned.add(uni)
+
+    def unpin(self, uni):
+        """
+        Allows the responses of the given uni to be evicted again
+
+        :param uni: **string** uniID to unpin
+        :return:
+        """
+        with self.lock:
+            self.pinned.discard(uni)
+            self.evict()
+
+    def retain(self, uni):
+        """
+        Never evicts the published responses of the given uni, even while it isn't scraping
+
+        publish() replaces them with every term of the new snapshot, so they're always available
+
+        :param uni: **string** uniID to retain
+        :return:
+        """
+        with self.lock:
+            self.retained.add(uni)
+
+    def encode(self, university, term, snapshot):
+        """
+        Builds the encoded responses for the given term
+
+        :param university: **University** University thread to obtain the term data from
+        :param term: **string** ID of the term
+        :param snapshot: **dict** Snapshot of the university to build the term for
+        :return: **CachedTerm** Built responses
+        """
+        return CachedTerm(university.settings["uniID"], term, snapshot["generations"][term],
+                          university.getSubjectListAll(term, snapshot))
+
+    def getTerm(self, university, term, snapshot, build=True):
+        """
+        Returns the encoded responses for the given term of a published snapshot
+
+        If it isn't cached, it is built from the DB unless the university is currently scraping into the published
+        classes (they would be half-written). If the term is already being built, this waits for that build instead of
+        starting another one.
+
+        :param university: **University** University thread to obtain the term data from
+        :param term: **string** ID of the term
+        :param snapshot: **dict** Snapshot of the university that the request is being served from
+        :param build: **bool** Whether to build the term if it isn't cached and isn't being built
+        :return: **CachedTerm/bool** Responses for the published generation of the term, False if unavailable
+        """
+        generation = snapshot["generations"][term]
+        key = (university.settings["uniID"], term, generation)
+
+        entry = self.get(key)
+
+        if entry:
+            return entry
+
+        with self.lock:
+            # The build may have finished since we checked
+            if key in self.entries:
+                return self.entries[key]
+
+            future = self.building.get(key)
+
+            if not future:
+                if not build or not university.canReadDB():
+                    return False
+
+                future = Future()
+                self.building[key] = future
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            return future.result()
+
+        try:
+            entry = self.encode(university, term, snapshot)
+
+            with self.lock:
+                # Don't store it if a new snapshot was published while we were building
+                if university.snapshot is snapshot:
+                    self.store(key, entry)
+                    self.evict()
+
+            future.set_result(entry)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.building[key]
+
+        return entry
+
+    def fill(self, university, term, snapshot):
+        """
+        Builds and stores the responses of a term on a background thread, unless it is already being built
+
+        :param university: **University** University thread to obtain the term data from
+        :param term: **string** ID of the term
+        :param snapshot: **dict** Snapshot of the university to build the term for
+        :return:
+        """
+        key = (university.settings["uniID"], term, snapshot["generations"][term])
+
+        with self.lock:
+            if key in self.building or key in self.entries:
+                return
+
+        def build():
+            try:
+                self.getTerm(university, term, snapshot)
+            except Exception:
+                log.exception("Failed to build " + str(key))
+
+        Thread(target=build, daemon=True).start()
+
+    def stage(self, university, snapshot):
+        """
+        Builds the responses for every term of a snapshot that hasn't been published yet
+
+        :param university: **University** University thread to obtain the term data from
+        :param snapshot: **dict** Snapshot with the "terms" and "generations" to build, the generations of terms
+                         whose bodies changed without a new generation are bumped
+        :return: **dict** "terms" maps term ids to the built terms, "changes" maps term ids to pending change records
+                 and "search" maps term ids to their search indexes
+        """
+        uni = university.settings["uniID"]
+        staging = {"terms": {}, "changes": {}, "search": {}}
+
+        for term in snapshot["terms"]:
+            termdata = university.getSubjectListAll(term, snapshot)
+            body = encodeBody(termdata)
+
+            # The term gets a new generation if its body changed since it was last published at this one
+            generation = university.termGeneration(term, snapshot, hashlib.sha1(body).hexdigest())
+
+            staging["terms"][term] = CachedTerm(uni, term, generation, termdata, body)
+
+            if self.changelog:
+                staging["changes"][term] = self.changelog.diff(uni, term, generation, termdata)
+
+            if self.search:
+                staging["search"][term] = self.search.build(uni, term, termdata)
+
+        return staging
+
+    def publish(self, university, snapshot, staging):
+        """
+        Atomically swaps in the staged responses and the snapshot for the given university
+
+        :param university: **University** University thread that is publishing
+        :param snapshot: **dict** Snapshot to publish
+        :param staging: **dict** Staged responses from stage()
+        :return:
+        """
+        uni = university.settings["uniID"]
+
+        with self.lock:
+            for key in list(self.entries.keys()):
+                if key[0] == uni:
+                    self.size -= self.entries.pop(key).size
+
+            for term in staging["terms"]:
+                self.store((uni, term, snapshot["generations"][term]), staging["terms"][term])
+
+            for term in staging["changes"]:
+                self.changelog.commit(uni, term, staging["changes"][term])
+
+            for term in staging["search"]:
+                self.search.commit(uni, term, staging["search"][term])
+
+            university.snapshot = snapshot
+            self.evict()
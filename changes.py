@@ -0,0 +1,177 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import json
+import hashlib
+from threading import Lock
+from collections import deque
+from cache import flattenSubjects
+
+
+class ChangeLog():
+    """
+        Keeps the classes that were inserted, updated and removed in the last few scrape generations of every term
+
+        Every published snapshot of a term is compared with the previous one by the fingerprints of its classes, so
+        clients can fetch what changed since the generation they have instead of the whole term
+    """
+    def __init__(self, history):
+        """
+        Constructor for the change log
+
+        :param history: **int** Amount of generations to keep the changes of for each term
+        :return:
+        """
+        self.history = history
+        self.terms = {}
+        self.lock = Lock()
+
+    def diff(self, uni, term, generation, termdata):
+        """
+        Compares a term that is about to be published with the last published generation of it
+
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :param generation: **int** Scrape generation that is about to be published
+        :param termdata: **dict** Response of getSubjectListAll for the new generation
+        :return: **dict** Pending record to pass to commit()
+        """
+        fingerprints = {}
+        entries = {}
+
+        subjects = flattenSubjects(termdata["classes"])
+
+        for subject in subjects:
+            for coursenum in subjects[subject]:
+                if coursenum == "description":
+                    continue
+
+                for classv in subjects[subject][coursenum]["classes"]:
+                    classid = str(classv["id"])
+
+                    fingerprints[classid] = hashlib.sha1(json.dumps(classv, sort_keys=True).encode('utf-8')).digest()
+                    entries[classid] = {"subject": subject, "coursenum": coursenum, "class": classv}
+
+        record = {"generation": generation, "fingerprints": fingerprints, "change": False}
+
+        with self.lock:
+            previous = self.terms.get((uni, term))
+
+        if previous and previous["generation"] != generation:
+            change = {"from": previous["generation"], "to": generation, "inserted": {}, "updated": {},
+                      "removed": set()}
+
+            for classid in fingerprints:
+                if classid not in previous["fingerprints"]:
+                    change["inserted"][classid] = entries[classid]
+                elif previous["fingerprints"][classid] != fingerprints[classid]:
+                    change["updated"][classid] = entries[classid]
+
+            for classid in previous["fingerprints"]:
+                if classid not in fingerprints:
+                    change["removed"].add(classid)
+
+            record["change"] = change
+
+        return record
+
+    def commit(self, uni, term, record):
+        """
+        Makes the pending record of a term visible, this should happen when its snapshot is published
+
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :param record: **dict** Pending record from diff()
+        :return:
+        """
+        with self.lock:
+            state = self.terms.get((uni, term))
+
+            if state and state["generation"] == record["generation"]:
+                # Republishing the same generation (ex. at startup)
+                history = state["history"]
+            elif state and record["change"] and state["generation"] == record["change"]["from"]:
+                history = state["history"]
+                history.append(record["change"])
+            else:
+                history = deque(maxlen=self.history)
+
+            self.terms[(uni, term)] = {"generation": record["generation"], "fingerprints": record["fingerprints"],
+                                       "history": history}
+
+    def getChanges(self, uni, term, since):
+        """
+        Returns the classes that changed in a term since the given generation
+
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :param since: **int** Generation that the client has
+        :return: **dict/bool** Inserted, updated and removed classes, False if the client must refetch the term
+        """
+        with self.lock:
+            state = self.terms.get((uni, term))
+
+            if not state:
+                return False
+
+            generation = state["generation"]
+            history = list(state["history"])
+
+        response = {"since": since, "generation": generation, "inserted": {}, "updated": {}, "removed": set()}
+
+        if since == generation:
+            return self.format(response)
+
+        # Find the change that starts at the client's generation
+        start = False
+
+        for index in range(len(history)):
+            if history[index]["from"] == since:
+                start = index
+                break
+
+        if start is False:
+            # The generation is too old (or unknown), we don't have the changes since then anymore
+            return False
+
+        # Merge every change up to the current generation
+        for change in history[start:]:
+            for classid in change["inserted"]:
+                if classid in response["removed"]:
+                    response["removed"].remove(classid)
+                    response["updated"][classid] = change["inserted"][classid]
+                else:
+                    response["inserted"][classid] = change["inserted"][classid]
+
+            for classid in change["updated"]:
+                if classid in response["inserted"]:
+                    response["inserted"][classid] = change["updated"][classid]
+                else:
+                    response["updated"][classid] = change["updated"][classid]
+
+            for classid in change["removed"]:
+                if classid in response["inserted"]:
+                    del response["inserted"][classid]
+                else:
+                    response["updated"].pop(classid, None)
+                    response["removed"].add(classid)
+
+        return self.format(response)
+
+    def format(self, response):
+        """
+        Converts merged changes to their JSON serializable form
+
+        :param response: **dict** Merged changes
+        :return: **dict** Changes with lists instead of dicts/sets
+        """
+        response["inserted"] = list(response["inserted"].values())
+        response["updated"] = list(response["updated"].values())
+        response["removed"] = sorted(response["removed"])
+
+        return response
@@ -0,0 +1,108 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import logging
+import threading
+import pymongo
+
+log = logging.getLogger("database")
+
+# "mongodb" settings mapped to the MongoClient options they set
+clientOptions = {
+    "maxpoolsize": "maxPoolSize",
+    "minpoolsize": "minPoolSize",
+    "connecttimeoutms": "connectTimeoutMS",
+    "sockettimeoutms": "socketTimeoutMS",
+    "serverselectiontimeoutms": "serverSelectionTimeoutMS",
+    "waitqueuetimeoutms": "waitQueueTimeoutMS",
+    "replicaset": "replicaset",
+    "readpreference": "readPreference",
+    "readconcern": "readConcernLevel",
+    "w": "w",
+    "wtimeoutms": "wtimeout",
+    "journal": "j"
+}
+
+# Settings of the connection, see configure()
+settings = {}
+
+# The client shared by every thread of this process
+client = None
+clientLock = threading.Lock()
+
+# Names of the index bootstraps that were started in this process
+bootstrapped = set()
+bootstrapLock = threading.Lock()
+
+
+def configure(dbsettings):
+    """
+    Sets the settings of the connection, must be called before the client is first used
+
+    :param dbsettings: **dict** "mongodb" settings (uri, database and the keys of clientOptions)
+    :return:
+    """
+    global settings
+
+    settings = dict(dbsettings or {})
+
+
+def getClient():
+    """
+    Returns the MongoClient of this process, creating it the first time
+
+    MongoClient is thread safe and pools its connections, so every scraper and API thread shares it
+
+    :return: **pymongo.MongoClient** Client
+    """
+    global client
+
+    with clientLock:
+        if client is None:
+            options = {}
+
+            for key in clientOptions:
+                if settings.get(key) is not None:
+                    options[clientOptions[key]] = settings[key]
+
+            client = pymongo.MongoClient(settings.get("uri", "mongodb://localhost:27017"), **options)
+
+        return client
+
+
+def getDatabase():
+    """
+    Returns the Schedule Storm database
+
+    :return: **pymongo.database.Database** Database
+    """
+    return getClient()[settings.get("database", "ScheduleStorm")]
+
+
+def bootstrapIndexes(name, ensure):
+    """
+    Creates indexes in a background thread, once per name in this process
+
+    :param name: **string** Name of the set of indexes (ex. a collection name)
+    :param ensure: **function** Creates the indexes
+    :return:
+    """
+    with bootstrapLock:
+        if name in bootstrapped:
+            return
+
+        bootstrapped.add(name)
+
+    def run():
+        try:
+            ensure()
+            log.info("Ensured the " + name + " indexes")
+        except Exception:
+            log.exception("Failed to ensure the " + name + " indexes")
+
+    threading.Thread(target=run, name="indexes-" + name, daemon=True).start()
@@ -0,0 +1,140 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import json
+from generator import parseTime, parseDays, minutesPerDay, dayMask
+
+# Filters that are looked up in a secondary index, mapped to the class field they index
+indexedFields = {"status": "status", "location": "location", "type": "type", "teacher": "teachers",
+                 "subject": "subject"}
+
+
+def toBitset(positions, size):
+    """
+    Builds a bitset where the bits at the given positions are set
+
+    :param positions: **list** Bit positions
+    :param size: **int** Amount of bits in the set
+    :return: **int** Bitset
+    """
+    bits = bytearray((size + 7) // 8)
+
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+
+    return int.from_bytes(bytes(bits), "little")
+
+
+def fromBitset(bitset):
+    """
+    Returns the positions of the set bits of a bitset
+
+    :param bitset: **int** Bitset
+    :return: **list** Bit positions in ascending order
+    """
+    bits = bin(bitset)[:1:-1]
+
+    return [position for position, bit in enumerate(bits) if bit == "1"]
+
+
+class ClassIndex():
+    """
+        Secondary indexes of the classes of a term, used to answer filtered class queries
+
+        Every class gets a position and each indexed value maps to a bitset of the positions of its classes, so a
+        query with multiple filters is a handful of integer ANDs. Matching classes are pre-encoded as JSON.
+    """
+    def __init__(self, subjects):
+        """
+        Constructor for the class index
+
+        :param subjects: **dict** Flattened subjects of a getSubjectListAll response
+        :return:
+        """
+        self.encoded = []
+
+        positions = {field: {} for field in indexedFields}
+        dayPositions = [[] for _ in range(7)]
+
+        # Days of each distinct time string, most classes share a handful of them
+        timeDays = {}
+
+        for subject in sorted(subjects):
+            for coursenum in sorted(subjects[subject]):
+                if coursenum == "description":
+                    continue
+
+                for classv in subjects[subject][coursenum]["classes"]:
+                    position = len(self.encoded)
+
+                    self.encoded.append(json.dumps({"subject": subject, "coursenum": coursenum, "class": classv},
+                                                   sort_keys=True).encode('utf-8'))
+
+                    values = dict(classv)
+                    values["subject"] = subject
+
+                    for field in indexedFields:
+                        value = values.get(indexedFields[field])
+
+                        for item in (value if isinstance(value, list) else [value]):
+                            if isinstance(item, str):
+                                positions[field].setdefault(item.lower(), []).append(position)
+
+                    # Days that the class meets on, classes with no parsable times (ex. TBA) don't meet on any day
+                    days = set()
+
+                    for timestring in classv.get("times", []):
+                        if timestring not in timeDays:
+                            mask = parseTime(timestring) or 0
+                            timeDays[timestring] = [day for day in range(7)
+                                                    if (mask >> (day * minutesPerDay)) & dayMask]
+
+                        days.update(timeDays[timestring])
+
+                    for day in days:
+                        dayPositions[day].append(position)
+
+        size = len(self.encoded)
+
+        self.allClasses = (1 << size) - 1
+        self.indexes = {}
+
+        for field in positions:
+            self.indexes[field] = {value: toBitset(positions[field][value], size) for value in positions[field]}
+
+        self.days = [toBitset(dayPositions[day], size) for day in range(7)]
+
+        self.size = sum(len(body) for body in self.encoded) + sum(
+            len(index) * (size // 8 + 1) for index in self.indexes.values()) + 7 * (size // 8 + 1)
+
+    def query(self, filters, days=None):
+        """
+        Returns the classes that match every filter
+
+        :param filters: **dict** Indexed filter names mapped to a list of accepted values (any of them can match)
+        :param days: **string/None** Days that classes may meet on (ex. "MTWR" excludes classes that meet on Friday)
+        :return: **list** JSON encoded matching classes
+        """
+        matches = self.allClasses
+
+        for field in filters:
+            accepted = 0
+
+            for value in filters[field]:
+                accepted |= self.indexes[field].get(value.lower(), 0)
+
+            matches &= accepted
+
+        if days is not None:
+            allowed = parseDays(days) or []
+
+            for day in range(7):
+                if day not in allowed:
+                    matches &= ~self.days[day]
+
+        return [self.encoded[position] for position in fromBitset(matches)]
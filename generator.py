@@ -0,0 +1,417 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import re
+import heapq
+from time import time
+
+# Each day of the week gets its own range of minute bits in a schedule mask
+minutesPerDay = 24 * 60
+dayMask = (1 << minutesPerDay) - 1
+
+# Day abbreviations and their index in the mask, two letter forms are matched before one letter forms
+twoLetterDays = {"Mo": 0, "Tu": 1, "We": 2, "Th": 3, "Fr": 4, "Sa": 5, "Su": 6}
+oneLetterDays = {"M": 0, "T": 1, "W": 2, "R": 3, "F": 4, "S": 5, "U": 6}
+
+clockRegex = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*([AP]M)\s*$", re.IGNORECASE)
+timeRegex = re.compile(r"^\s*(\S+)\s+(\d{1,2}):(\d{2})\s*([AP]M)\s*-\s*(\d{1,2}):(\d{2})\s*([AP]M)\s*$", re.IGNORECASE)
+
+# Maximum amount of valid options of a single course that are considered
+maxCourseOptions = 5000
+
+
+def parseDays(days):
+    """
+    Parses the days of the week of a time string
+
+    :param days: **string** Concatenated days (ex. "MWF", "MoWeFr", "TR")
+    :return: **list/bool** Indexes of the days (Monday is 0), False if a day couldn't be parsed
+    """
+    parsed = []
+    index = 0
+
+    while index < len(days):
+        if days[index:index + 2] in twoLetterDays:
+            parsed.append(twoLetterDays[days[index:index + 2]])
+            index += 2
+        elif days[index] in oneLetterDays:
+            parsed.append(oneLetterDays[days[index]])
+            index += 1
+        else:
+            return False
+
+    return parsed
+
+
+def toMinutes(hour, minute, meridiem):
+    """
+    Converts a 12-hour time to minutes since midnight
+
+    :param hour: **string** Hour (1-12)
+    :param minute: **string** Minutes
+    :param meridiem: **string** AM or PM
+    :return: **int** Minutes since midnight
+    """
+    hour = int(hour) % 12
+
+    if meridiem.upper() == "PM":
+        hour += 12
+
+    return hour * 60 + int(minute)
+
+
+def parseClock(clock):
+    """
+    Parses a 12-hour clock time
+
+    :param clock: **string** Time (ex. "9:30AM")
+    :return: **int/bool** Minutes since midnight, False if it couldn't be parsed
+    """
+    match = clockRegex.match(clock)
+
+    if not match:
+        return False
+
+    return toMinutes(match.group(1), match.group(2), match.group(3))
+
+
+def parseTime(timestring):
+    """
+    Converts a class time into a mask of the minutes of the week it takes up
+
+    :param timestring: **string** Time in the documented format (ex. "MWF 9:50AM - 10:30AM")
+    :return: **int/bool** Mask of the minutes, False if it couldn't be parsed (ex. "TBA")
+    """
+    match = timeRegex.match(timestring)
+
+    if not match:
+        return False
+
+    days = parseDays(match.group(1))
+
+    if not days:
+        return False
+
+    start = toMinutes(match.group(2), match.group(3), match.group(4))
+    end = toMinutes(match.group(5), match.group(6), match.group(7))
+
+    if end <= start:
+        return False
+
+    # Bits [start, end) of the day
+    daybits = ((1 << (end - start)) - 1) << start
+
+    mask = 0
+
+    for day in days:
+        mask |= daybits << (day * minutesPerDay)
+
+    return mask
+
+
+class CompiledCourse():
+    """
+        Every conflict-free combination of classes (one per class type) that can be taken for a course
+    """
+    def __init__(self, subject, coursenum, course, rmp):
+        """
+        Constructor for a compiled course
+
+        :param subject: **string** Subject code of the course
+        :param coursenum: **string** Course number
+        :param course: **dict** Course dict of a getSubjectListAll response
+        :param rmp: **dict** RMP ratings of the teachers of the course
+        :return:
+        """
+        self.subject = subject
+        self.coursenum = coursenum
+
+        # Precompile the masks and ratings of each class
+        classes = []
+
+        for classv in course["classes"]:
+            mask = 0
+
+            for timestring in classv["times"]:
+                parsed = parseTime(timestring)
+
+                if parsed:
+                    mask |= parsed
+
+            ratings = [rmp[teacher]["rating"] for teacher in classv["teachers"]
+                       if teacher in rmp and "rating" in rmp[teacher]]
+
+            # Some universities store a single group as a string (ex. "12"), which is one group and not "1" and "2"
+            groups = classv["group"]
+
+            if not isinstance(groups, list):
+                groups = [groups]
+
+            classes.append({"id": classv["id"], "type": classv["type"], "group": set(str(group) for group in groups),
+                            "mask": mask, "ratingSum": sum(ratings), "ratingCount": len(ratings)})
+
+        types = sorted(set(classv["type"] for classv in classes))
+        candidates = [[classv for classv in classes if classv["type"] == classtype] for classtype in types]
+
+        # A valid option takes one class of every type, where every two of its classes share a group
+        self.options = []
+        self.addOptions(candidates, (), 0)
+
+        # Bounds over every option, used to prune partial schedules that can't score well enough
+        self.maxDayMinutes = [0] * 7
+        self.maxAverage = None
+        self.hasUnrated = False
+
+        for option in self.options:
+            for day in range(7):
+                minutes = bin((option["mask"] >> (day * minutesPerDay)) & dayMask).count("1")
+                self.maxDayMinutes[day] = max(self.maxDayMinutes[day], minutes)
+
+            if option["ratingCount"] > 0:
+                average = float(option["ratingSum"]) / option["ratingCount"]
+
+                if self.maxAverage is None or average > self.maxAverage:
+                    self.maxAverage = average
+            else:
+                self.hasUnrated = True
+
+    def addOptions(self, candidates, chosen, mask):
+        """
+        Adds every valid option that extends the chosen classes with one class of each remaining type
+
+        :param candidates: **list** Classes of each type, in the order the types are chosen
+        :param chosen: **tuple** Classes chosen for the previous types
+        :param mask: **int** Mask of the minutes taken up by the chosen classes
+        :return: **bool** False once maxCourseOptions options were found
+        """
+        if len(chosen) == len(candidates):
+            self.options.append({"ids": [classv["id"] for classv in chosen], "mask": mask,
+                                 "ratingSum": sum(classv["ratingSum"] for classv in chosen),
+                                 "ratingCount": sum(classv["ratingCount"] for classv in chosen)})
+
+            return len(self.options) < maxCourseOptions
+
+        for classv in candidates[len(chosen)]:
+            if mask & classv["mask"]:
+                continue
+
+            if not all(classv["group"] & other["group"] for other in chosen):
+                continue
+
+            if not self.addOptions(candidates, chosen + (classv,), mask | classv["mask"]):
+                return False
+
+        return True
+
+
+def scoreSchedule(mask, ratingSum, ratingCount, preferences):
+    """
+    Scores a complete schedule, higher is better
+
+    :param mask: **int** Mask of every minute that the schedule takes up
+    :param ratingSum: **float** Sum of the RMP ratings of the schedule's teachers
+    :param ratingCount: **int** Amount of ratings in ratingSum
+    :param preferences: **dict** Weights "rmp", "gaps" and "early", and "earliest" in minutes since midnight
+    :return: **float** Score of the schedule
+    """
+    score = 0.0
+
+    if preferences["rmp"] and ratingCount > 0:
+        score += preferences["rmp"] * (float(ratingSum) / ratingCount)
+
+    if preferences["gaps"] or preferences["early"]:
+        gapMinutes = 0
+        earlyMinutes = 0
+
+        for day in range(7):
+            daybits = (mask >> (day * minutesPerDay)) & dayMask
+
+            if not daybits:
+                continue
+
+            first = (daybits & -daybits).bit_length() - 1
+            last = daybits.bit_length() - 1
+
+            gapMinutes += (last - first + 1) - bin(daybits).count("1")
+
+            if first < preferences["earliest"]:
+                earlyMinutes += preferences["earliest"] - first
+
+        score -= preferences["gaps"] * gapMinutes / 60.0
+        score -= preferences["early"] * earlyMinutes / 60.0
+
+    return score
+
+
+def suffixBounds(courses):
+    """
+    Returns what the courses from each index onwards can add to a schedule at most
+
+    :param courses: **list** CompiledCourse objects in the order they're searched
+    :return: **list** For every index (and one past the end), "dayMinutes" is the most minutes they can take up on each
+             day, "maxAverage" the highest average rating of their options (None if none are rated) and "unrated"
+             whether every one of them can add no ratings
+    """
+    bounds = [{"dayMinutes": [0] * 7, "maxAverage": None, "unrated": True}]
+
+    for course in reversed(courses):
+        after = bounds[0]
+        averages = [average for average in (course.maxAverage, after["maxAverage"]) if average is not None]
+
+        bounds.insert(0, {"dayMinutes": [course.maxDayMinutes[day] + after["dayMinutes"][day] for day in range(7)],
+                          "maxAverage": max(averages) if averages else None,
+                          "unrated": course.hasUnrated and after["unrated"]})
+
+    return bounds
+
+
+def scoreBound(mask, ratingSum, ratingCount, bounds, preferences):
+    """
+    Returns the highest score that a partial schedule can reach once the remaining courses are added
+
+    Only valid when no weight is negative: classes that are added can only make the first class of a day earlier, can
+    only fill the gaps they fit in and the average rating can't exceed the best average of its parts
+
+    :param mask: **int** Mask of every minute that the partial schedule takes up
+    :param ratingSum: **float** Sum of the RMP ratings of the partial schedule's teachers
+    :param ratingCount: **int** Amount of ratings in ratingSum
+    :param bounds: **dict** suffixBounds entry of the first remaining course
+    :param preferences: **dict** Scoring preferences, see scoreSchedule
+    :return: **float** Upper bound of the score
+    """
+    score = 0.0
+
+    if preferences["rmp"]:
+        averages = []
+
+        if ratingCount > 0:
+            averages.append(float(ratingSum) / ratingCount)
+        elif bounds["unrated"]:
+            # The schedule might end up without ratings, which doesn't add to the score
+            averages.append(0.0)
+
+        if bounds["maxAverage"] is not None:
+            averages.append(bounds["maxAverage"])
+
+        score += preferences["rmp"] * max(averages)
+
+    if preferences["gaps"] or preferences["early"]:
+        gapMinutes = 0
+        earlyMinutes = 0
+
+        for day in range(7):
+            daybits = (mask >> (day * minutesPerDay)) & dayMask
+
+            if not daybits:
+                continue
+
+            first = (daybits & -daybits).bit_length() - 1
+            last = daybits.bit_length() - 1
+
+            gapMinutes += max(0, (last - first + 1) - bin(daybits).count("1") - bounds["dayMinutes"][day])
+
+            if first < preferences["earliest"]:
+                earlyMinutes += preferences["earliest"] - first
+
+        score -= preferences["gaps"] * gapMinutes / 60.0
+        score -= preferences["early"] * earlyMinutes / 60.0
+
+    return score
+
+
+def generateSchedules(courses, preferences, count, limit, timeout=None):
+    """
+    Searches for the best conflict-free schedules that take every given course
+
+    Courses with the fewest options are placed first and any partial schedule with a conflict is pruned, as are
+    partial schedules that can't score higher than the worst schedule that would be returned. The search is depth
+    first with one frame per course, so its memory doesn't grow with the amount of options.
+
+    :param courses: **list** CompiledCourse objects to take
+    :param preferences: **dict** Scoring preferences, see scoreSchedule
+    :param count: **int** Amount of schedules to return
+    :param limit: **int** Maximum amount of partial and complete schedules to visit
+    :param timeout: **float** Maximum amount of seconds to search for, None for no limit
+    :return: **dict** "schedules" sorted by descending score and whether every combination was searched ("complete")
+    """
+    courses = sorted(courses, key=lambda course: len(course.options))
+
+    best = []
+    visited = 0
+    found = 0
+
+    # Don't score anything if there are no preferences, the first schedules found are as good as any
+    scoring = preferences["rmp"] or preferences["gaps"] or preferences["early"]
+
+    # Negative weights turn the bounds around, those searches aren't pruned by score
+    bounding = scoring and min(preferences["rmp"], preferences["gaps"], preferences["early"]) >= 0
+    bounds = suffixBounds(courses) if bounding else None
+
+    deadline = time() + timeout if timeout is not None else None
+
+    # Frame of every course that has an option chosen: [mask, ratingSum, ratingCount, chosen options, next option]
+    frames = [[0, 0.0, 0, (), 0]]
+
+    while frames:
+        index = len(frames) - 1
+        frame = frames[-1]
+        mask, ratingSum, ratingCount, chosen, position = frame
+
+        if index == len(courses):
+            frames.pop()
+            found += 1
+            score = scoreSchedule(mask, ratingSum, ratingCount, preferences) if scoring else 0.0
+            entry = (score, -found, chosen)
+
+            if len(best) < count:
+                heapq.heappush(best, entry)
+            elif score > best[0][0]:
+                heapq.heapreplace(best, entry)
+
+            if not scoring and len(best) >= count:
+                break
+
+            continue
+
+        options = courses[index].options
+
+        while position < len(options) and mask & options[position]["mask"]:
+            position += 1
+
+        if position == len(options):
+            frames.pop()
+            continue
+
+        frame[4] = position + 1
+
+        visited += 1
+
+        if visited > limit or (deadline is not None and visited % 1024 == 0 and time() > deadline):
+            break
+
+        option = options[position]
+        child = [mask | option["mask"], ratingSum + option["ratingSum"], ratingCount + option["ratingCount"],
+                 chosen + (option["ids"],), 0]
+
+        if bounding and len(best) >= count and \
+                scoreBound(child[0], child[1], child[2], bounds[index + 1], preferences) <= best[0][0]:
+            continue
+
+        frames.append(child)
+
+    schedules = []
+
+    for score, order, chosen in sorted(best, reverse=True):
+        schedule = {"score": score, "courses": []}
+
+        for course, ids in zip(courses, chosen):
+            schedule["courses"].append({"subject": course.subject, "coursenum": course.coursenum, "classes": ids})
+
+        schedules.append(schedule)
+
+    return {"schedules": schedules, "complete": not frames}
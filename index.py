@@ -6,17 +6,27 @@ Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENS
 This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
 """
 
-import uni
-from rmp import RateMyProfessors
+from uni import getUniversityClass
+from supervisor import Supervisor
+from cache import ResponseCache, termETag, negotiateEncoding, compressStream, acceptsType
+from changes import ChangeLog
+from metrics import Metrics, MetricsMiddleware
+from generator import CompiledCourse, generateSchedules, parseClock, parseDays
+from search import SearchIndexes
+from teachers import TeacherIndex
+from filters import indexedFields
 import json
-import inspect
+import math
 import time
 import logging
 import sys
 import falcon
-from threading import Lock
-from wsgiref import simple_server
+from threading import Lock, Thread
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import server
+import termformat
+import database
 
 # Store the threads for each uni
 uniThreads = {}
@@ -34,45 +44,242 @@ def loadSettings():
 
 settings = loadSettings()
 
+# Every thread of this process shares one MongoDB client configured by the "mongodb" settings
+database.configure(settings.get("mongodb", {}))
+
+# Request metrics exposed on /metrics
+metrics = Metrics()
+
+# Changes of the last few scrape generations of every term
+changeLog = ChangeLog(settings.get("changeshistory", 24))
+
+# Typeahead search indexes of every published term
+searchIndexes = SearchIndexes()
+
+# Classes and ratings of every teacher, published along with each snapshot
+teacherIndex = TeacherIndex()
+
+# Cache of encoded term responses, the budget is set in MB
+responseCache = ResponseCache(settings.get("cachesize", 512) * 1024 * 1024, changeLog, searchIndexes)
+
+def etagMatches(req, etag):
+    """
+    Returns whether the If-None-Match header of the request matches the given ETag
+
+    :param req: **falcon.Request** Request to check
+    :param etag: **string** Current ETag of the resource
+    :return: **bool** True if the client already has the current representation
+    """
+    header = req.get_header("If-None-Match")
+
+    if not header:
+        return False
+
+    for tag in header.split(","):
+        if tag.strip() in (etag, "*"):
+            return True
+
+    return False
+
+def collectStateMetrics():
+    """
+    Metrics collector for the state of the universities and the response cache
+
+    :return: **list** (name, type, help, samples) tuples
+    """
+    scraping = []
+    sinceUpdate = []
+    generations = []
+    published = []
+    changes = []
+
+    for uni in sorted(uniThreads):
+        labels = {"uni": uni}
+        scraping.append((labels, 1 if uniThreads[uni].isScraping else 0))
+        published.append((labels, 1 if uniThreads[uni].isPublished else 0))
+        generations.append((labels, uniThreads[uni].snapshot["generation"]))
+
+        scrapeChanges = uniThreads[uni].scrapeChanges
+
+        for collection in sorted(scrapeChanges):
+            for kind in sorted(scrapeChanges[collection]):
+                changes.append(({"uni": uni, "collection": collection, "kind": kind},
+                                scrapeChanges[collection][kind]))
+
+        if "lastUpdated" in uniThreads[uni].settings:
+            sinceUpdate.append((labels, int(time.time()) - uniThreads[uni].settings["lastUpdated"]))
+
+    with responseCache.lock:
+        hits = responseCache.hits
+        misses = responseCache.misses
+        cacheSize = responseCache.size
+        cacheEntries = len(responseCache.entries)
+
+    return [
+        ("scraping", "gauge", "Whether the university is currently scraping", scraping),
+        ("seconds_since_last_update", "gauge", "Seconds since the last successful scrape of the university",
+         sinceUpdate),
+        ("published_generation", "gauge", "Newest scrape generation published for the university", generations),
+        ("warm", "gauge", "Whether the university has published its terms since startup", published),
+        ("scrape_documents", "gauge", "Documents that the last scrape inserted, updated or left unchanged", changes),
+        ("cache_hits_total", "counter", "Response cache lookups that found the term", [({}, hits)]),
+        ("cache_misses_total", "counter", "Response cache lookups that didn't find the term", [({}, misses)]),
+        ("cache_hit_ratio", "gauge", "Ratio of response cache lookups that found the term",
+         [({}, float(hits) / (hits + misses) if hits + misses > 0 else 0.0)]),
+        ("cache_size_bytes", "gauge", "Bytes used by the cached responses", [({}, cacheSize)]),
+        ("cache_terms", "gauge", "Amount of terms in the response cache", [({}, cacheEntries)])
+    ]
+
+class metricsResource():
+    """
+        Exposes the metrics in the Prometheus text format
+    """
+    def on_get(self, req, resp):
+        resp.content_type = "text/plain; version=0.0.4"
+        resp.body = metrics.render().encode('utf-8')
+
+class readyResource():
+    """
+        Readiness check for load balancers, only succeeds once every university has published its terms
+    """
+    def on_get(self, req, resp):
+        warming = sorted(uni for uni in uniThreads if not uniThreads[uni].isPublished)
+
+        if warming:
+            resp.status = falcon.HTTP_503
+            resp.body = json.dumps({"ready": False, "warming": warming}).encode('utf-8')
+        else:
+            resp.body = json.dumps({"ready": True}).encode('utf-8')
+
 class v1Unis():
     """
         Retrieves list of Unis
     """
-    def on_get(self, req, resp):
+    def __init__(self):
+        # (snapshots and scraping flags it was built from, body, etag)
+        self.cached = ((), b"", "")
+
+    def build(self, key):
+        """
+        Encodes the list of unis from their published snapshots
+
+        :param key: **tuple** (uni, snapshot, isScraping) for each uni
+        :return: **tuple** (key, body, etag)
+        """
         responsedict = {}
 
-        for uni in list(uniThreads.keys()):
-            responsedict[uni] = {"terms": uniThreads[uni].getTerms(),
-                                 "locations": uniThreads[uni].getLocations(),
+        for uni, snapshot, isScraping in key:
+            responsedict[uni] = {"terms": snapshot["terms"],
+                                 "generations": snapshot["generations"],
+                                 "locations": snapshot["locations"],
                                  "name": settings["Universities"][uni]["fullname"],
                                  "rmp": settings["Universities"][uni]["rmpid"],
-                                 "scraping": uniThreads[uni].isScraping}
+                                 "scraping": isScraping}
         str_response = json.dumps(responsedict).encode('utf-8')
 
+        return key, str_response, "W/" + hashlib.sha1(str_response).hexdigest()
+
+    def on_get(self, req, resp):
+        key = tuple((uni, uniThreads[uni].snapshot, uniThreads[uni].isScraping) for uni in sorted(uniThreads))
+
+        cached = self.cached
+
+        # Only rebuild if a snapshot was published or a scrape started/finished (tuples compare by identity first)
+        if cached[0] != key:
+            cached = self.build(key)
+            self.cached = cached
+
+        if etagMatches(req, cached[2]):
+            resp.status = falcon.HTTP_304
+            resp.etag = cached[2]
+            return
+
         # set the etag and body
-        resp.etag = "W/" + hashlib.sha1(str_response).hexdigest()
-        resp.body = str_response
+        resp.etag = cached[2]
+        resp.body = cached[1]
 
-class v1GetAllUniTermSubjects():
+class TermResource():
     """
-        Retrieves all subjects and classes for a given Uni
+        Base for the routes that serve a cached response of a term's published snapshot
     """
-    def on_get(self, req, resp, uni, term):
+    def serveTermResource(self, req, resp, uni, term, path):
+        """
+        Sets the response to the cached resource at path below the given term
+
+        :param req: **falcon.Request** Request to respond to
+        :param resp: **falcon.Response** Response to set
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :param path: **tuple** Path of the resource below the term, () for /all
+        :return:
+        """
+        snapshot = uniThreads[uni].snapshot if uni in uniThreads else False
+
         # The term must be a string since the threads represent them as such
-        if uni in uniThreads and term in uniThreads[uni].getTerms():
-            if uniThreads[uni].isScraping:
-                # we don't want to return data while scraping, send error (configure nginx to send stale data if it can)
-                resp.status = falcon.HTTP_500
+        if snapshot and term in snapshot["terms"]:
+            # Clients can ask for /all in the binary term format instead of JSON
+            binary = path == () and acceptsType(req.get_header("Accept"), termformat.mediaType)
+
+            # The body depends on the content coding (and for /all, the media type) that the client accepts
+            resp.set_header("Vary", "Accept, Accept-Encoding" if path == () else "Accept-Encoding")
+
+            if path == ():
+                etag = termETag(uni, term, snapshot["generations"][term], ("binary",) if binary else ())
+
+                # The ETag of /all only depends on the generation, so repeat visitors don't require any DB work
+                if etagMatches(req, etag):
+                    resp.status = falcon.HTTP_304
+                    resp.etag = etag
+                    return
+
+            # Get the responses of the published snapshot, a JSON /all is streamed instead of being built on a miss
+            # unless another request is already building the term, in which case we wait for it
+            cachedterm = responseCache.getTerm(uniThreads[uni], term, snapshot, build=(path != () or binary))
+
+            if not cachedterm and path == () and not binary and uniThreads[uni].canReadDB():
+                # Stream the term from the DB so only one subject is in memory per request, then cache it once
+                responseCache.fill(uniThreads[uni], term, snapshot)
+
+                encoding = negotiateEncoding(req.get_header("Accept-Encoding"), ["gzip"])
+
+                if encoding != "identity":
+                    resp.set_header("Content-Encoding", encoding)
+
+                resp.etag = etag
+                resp.stream = compressStream(uniThreads[uni].streamSubjectListAll(term, snapshot=snapshot), encoding)
+            elif not cachedterm:
+                # The snapshot isn't cached and the DB is being scraped into, ask the client to retry shortly
+                resp.status = falcon.HTTP_503
+                resp.set_header("Retry-After", "60")
                 resp.body = json.dumps(
                     {"error": "We're currently scraping this university, please check back in a couple minutes!"}
                 ).encode('utf-8')
+            elif path not in cachedterm.resources:
+                resp.status = falcon.HTTP_404
+                resp.body = json.dumps(
+                    {"error": "The specified subject or course was not found"}
+                ).encode('utf-8')
             else:
-                # Get course/subject list
-                subject_list = json.dumps(uniThreads[uni].getSubjectListAll(term), sort_keys=True).encode('utf-8')
+                response = cachedterm.binary if binary else cachedterm.resources[path]
+
+                # The ETags of the sub-resources are hashes of their bodies, which are known once the term is built
+                if path != () and etagMatches(req, response.etag):
+                    resp.status = falcon.HTTP_304
+                    resp.etag = response.etag
+                    return
+
+                if binary:
+                    resp.content_type = termformat.mediaType
+
+                # Send the pre-compressed variant that the client accepts
+                encoding = negotiateEncoding(req.get_header("Accept-Encoding"), response.variants)
+
+                if encoding != "identity":
+                    resp.set_header("Content-Encoding", encoding)
 
                 # set the etag and body
-                resp.etag = "W/" + hashlib.sha1(subject_list).hexdigest()
-                resp.body = subject_list
+                resp.etag = response.etag
+                resp.body = response.variants[encoding]
         else:
             # Couldn't find the uni or term, send error
             resp.status = falcon.HTTP_400
@@ -80,12 +287,394 @@ class v1GetAllUniTermSubjects():
                 {"error": "The specified university or term was not found"}
             ).encode('utf-8')
 
-if __name__ == '__main__':
+class v1GetAllUniTermSubjects(TermResource):
+    """
+        Retrieves all subjects and classes for a given Uni
+    """
+    def on_get(self, req, resp, uni, term):
+        self.serveTermResource(req, resp, uni, term, ())
 
-    # Instantiate the unis
+class v1GetUniTermSubjects(TermResource):
+    """
+        Retrieves the subjects of a term along with their descriptions and course numbers
+    """
+    def on_get(self, req, resp, uni, term):
+        self.serveTermResource(req, resp, uni, term, ("subjects",))
+
+class v1GetUniTermSubject(TermResource):
+    """
+        Retrieves the courses and classes of a subject in a term
+    """
+    def on_get(self, req, resp, uni, term, subject):
+        self.serveTermResource(req, resp, uni, term, ("subjects", subject))
+
+class v1GetUniTermCourse(TermResource):
+    """
+        Retrieves the classes and description of a course in a term
+    """
+    def on_get(self, req, resp, uni, term, subject, coursenum):
+        self.serveTermResource(req, resp, uni, term, ("subjects", subject, coursenum))
+
+class v1GetUniTermChanges():
+    """
+        Retrieves the classes that were inserted, updated or removed in a term since a given scrape generation
+    """
+    def on_get(self, req, resp, uni, term):
+        snapshot = uniThreads[uni].snapshot if uni in uniThreads else False
+        since = req.get_param_as_int("since")
+
+        if not snapshot or term not in snapshot["terms"]:
+            # Couldn't find the uni or term, send error
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps(
+                {"error": "The specified university or term was not found"}
+            ).encode('utf-8')
+        elif since is None:
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps(
+                {"error": "The since parameter must be the scrape generation you have"}
+            ).encode('utf-8')
+        else:
+            generation = snapshot["generations"][term]
+            etag = termETag(uni, term, generation, ("changes", str(since)))
+
+            if etagMatches(req, etag):
+                resp.status = falcon.HTTP_304
+                resp.etag = etag
+                return
+
+            changes = changeLog.getChanges(uni, term, since)
+
+            if not changes or changes["generation"] != generation:
+                # We don't have the changes since that generation, the client has to fetch the whole term again
+                changes = {"since": since, "generation": generation, "refetch": True}
+            else:
+                changes["refetch"] = False
+
+            resp.etag = etag
+            resp.body = json.dumps(changes).encode('utf-8')
+
+class v1GetUniTeacher():
+    """
+        Retrieves the classes that a teacher teaches in every enabled term of a uni along with their RMP rating
+    """
+    def on_get(self, req, resp, uni, name):
+        if uni not in uniThreads:
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps({"error": "The specified university was not found"}).encode('utf-8')
+            return
+
+        teacher = teacherIndex.get(uni, name)
+
+        if teacher is None:
+            resp.status = falcon.HTTP_503
+            resp.set_header("Retry-After", "60")
+            resp.body = json.dumps(
+                {"error": "The teachers of this university are being indexed, please check back soon!"}
+            ).encode('utf-8')
+        elif not teacher:
+            resp.status = falcon.HTTP_404
+            resp.body = json.dumps({"error": "The specified teacher was not found"}).encode('utf-8')
+        else:
+            resp.body = json.dumps(teacher, sort_keys=True).encode('utf-8')
+
+class v1GetUniTermClasses():
+    """
+        Retrieves the classes of a term that match every given filter
+
+        Query parameters (comma separated values match any of them):
+            status, location, type, teacher, subject: Values of the class fields (case insensitive)
+            days: Days that the classes may meet on (ex. MTWR excludes classes that meet on Friday)
+    """
+    def on_get(self, req, resp, uni, term):
+        snapshot = uniThreads[uni].snapshot if uni in uniThreads else False
+
+        if not snapshot or term not in snapshot["terms"]:
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps({"error": "The specified university or term was not found"}).encode('utf-8')
+            return
+
+        days = req.get_param("days")
+
+        if days is not None and parseDays(days) is False:
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps({"error": "The days must be concatenated day abbreviations (ex. MTWR)"}
+                                   ).encode('utf-8')
+            return
+
+        filters = {}
+
+        for field in indexedFields:
+            values = req.get_param_as_list(field)
+
+            if values:
+                filters[field] = values
+
+        generation = snapshot["generations"][term]
+        etag = termETag(uni, term, generation, ("classes", req.query_string))
+
+        if etagMatches(req, etag):
+            resp.status = falcon.HTTP_304
+            resp.etag = etag
+            return
+
+        cachedterm = responseCache.getTerm(uniThreads[uni], term, snapshot)
+
+        if not cachedterm:
+            resp.status = falcon.HTTP_503
+            resp.set_header("Retry-After", "60")
+            resp.body = json.dumps(
+                {"error": "We're currently scraping this university, please check back in a couple minutes!"}
+            ).encode('utf-8')
+            return
+
+        # The matching classes are already encoded, so only join them
+        classes = cachedterm.classIndex.query(filters, days)
+
+        resp.etag = etag
+        resp.body = b'{"classes": [' + b', '.join(classes) + b'], "count": ' + str(len(classes)).encode('utf-8') + \
+                    b', "generation": ' + str(generation).encode('utf-8') + b'}'
+
+class v1GenerateSchedules():
+    """
+        Generates the best conflict-free schedules for a list of courses in a term
+
+        Query parameters:
+            courses: Comma separated courses (ex. CPSC-231,MATH-211)
+            count: Amount of schedules to return (default 10, max 50)
+            rmp, gaps, early: Weights of the average RMP rating, hours of gaps and hours before "earliest"
+            earliest: Preferred earliest start time (default 8:00AM)
+    """
+    maxCount = 50
+
+    # Partial and complete schedules visited, and seconds spent, before the best schedules so far are returned
+    searchLimit = 200000
+    searchTime = 2.0
+
+    def getWeight(self, req, name):
+        """
+        Returns a float query parameter, 0 if it isn't set or invalid
+
+        :param req: **falcon.Request** Request to get the parameter from
+        :param name: **string** Name of the parameter
+        :return: **float**
+        """
+        try:
+            weight = float(req.get_param(name) or 0)
+        except ValueError:
+            return 0.0
+
+        # nan and inf would break the comparisons of scores
+        return weight if math.isfinite(weight) else 0.0
+
+    def getEarliest(self, req):
+        """
+        Returns the preferred earliest start time, 8:00AM if it isn't set or invalid
+
+        :param req: **falcon.Request** Request to get the parameter from
+        :return: **int** Minutes since midnight
+        """
+        earliest = parseClock(req.get_param("earliest") or "8:00AM")
+
+        # Midnight is 0 minutes, which is valid
+        if earliest is False:
+            return 8 * 60
+
+        return earliest
+
+    def compileCourse(self, cachedterm, subject, coursenum):
+        """
+        Returns the compiled course from a cached term, compiling it on its first use
+
+        :param cachedterm: **CachedTerm** Term that the course is in
+        :param subject: **string** Subject code
+        :param coursenum: **string** Course number
+        :return: **CompiledCourse/bool** Compiled course, False if it isn't in the term
+        """
+        key = (subject, coursenum)
+
+        if key not in cachedterm.compiled:
+            response = cachedterm.resources.get(("subjects", subject, coursenum))
+
+            if not response:
+                return False
+
+            course = json.loads(response.body.decode('utf-8'))
+            cachedterm.compiled[key] = CompiledCourse(subject, coursenum, course["course"], course["rmp"])
+
+        return cachedterm.compiled[key]
+
+    def on_get(self, req, resp, uni, term):
+        snapshot = uniThreads[uni].snapshot if uni in uniThreads else False
+        courses = req.get_param_as_list("courses") or []
+
+        if not snapshot or term not in snapshot["terms"]:
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps({"error": "The specified university or term was not found"}).encode('utf-8')
+            return
+
+        if len(courses) == 0:
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps({"error": "Specify the courses to take (ex. courses=CPSC-231,MATH-211)"}
+                                   ).encode('utf-8')
+            return
+
+        cachedterm = responseCache.getTerm(uniThreads[uni], term, snapshot)
+
+        if not cachedterm:
+            resp.status = falcon.HTTP_503
+            resp.set_header("Retry-After", "60")
+            resp.body = json.dumps(
+                {"error": "We're currently scraping this university, please check back in a couple minutes!"}
+            ).encode('utf-8')
+            return
+
+        compiled = []
+        missing = []
+
+        for course in courses:
+            subject, _, coursenum = course.partition("-")
+            compiledCourse = self.compileCourse(cachedterm, subject, coursenum)
+
+            if compiledCourse:
+                compiled.append(compiledCourse)
+            else:
+                missing.append(course)
+
+        if len(missing) > 0:
+            resp.status = falcon.HTTP_404
+            resp.body = json.dumps({"error": "The following courses were not found", "courses": missing}
+                                   ).encode('utf-8')
+            return
+
+        preferences = {"rmp": self.getWeight(req, "rmp"),
+                       "gaps": self.getWeight(req, "gaps"),
+                       "early": self.getWeight(req, "early"),
+                       "earliest": self.getEarliest(req)}
+
+        count = min(max(req.get_param_as_int("count") or 10, 1), self.maxCount)
+
+        result = generateSchedules(compiled, preferences, count, self.searchLimit, self.searchTime)
+        result["generation"] = snapshot["generations"][term]
+
+        resp.body = json.dumps(result).encode('utf-8')
+
+class v1SearchUniTerm():
+    """
+        Searches the subjects, courses and teachers of a term
+
+        Query parameters:
+            q: Search query, the tokens are matched as prefixes (ex. "cpsc 23", "intro prog")
+            limit: Maximum amount of results (default 10, max 50)
+    """
+    maxLimit = 50
+
+    def on_get(self, req, resp, uni, term):
+        snapshot = uniThreads[uni].snapshot if uni in uniThreads else False
+
+        if not snapshot or term not in snapshot["terms"]:
+            resp.status = falcon.HTTP_400
+            resp.body = json.dumps({"error": "The specified university or term was not found"}).encode('utf-8')
+            return
+
+        index = searchIndexes.get(uni, term)
+
+        if not index:
+            # The term hasn't been published yet
+            resp.status = falcon.HTTP_503
+            resp.set_header("Retry-After", "60")
+            resp.body = json.dumps({"error": "The search index of this term is being built, please check back soon!"}
+                                   ).encode('utf-8')
+            return
+
+        query = req.get_param("q") or ""
+        limit = min(max(req.get_param_as_int("limit") or 10, 1), self.maxLimit)
+
+        resp.body = json.dumps({"query": query, "generation": snapshot["generations"][term],
+                                "results": index.search(query, limit)}).encode('utf-8')
+
+def publishUni(university):
+    """
+    Publishes what is in the DB for a university that isn't scraping in this process
+
+    :param university: **University** University to publish
+    :return: **bool** Whether the university is published
+    """
+    # It may have been published by a refresh or a scraper process in the meantime
+    if university.isPublished:
+        return True
+
+    try:
+        university.publish(newGeneration=False)
+        log.info("Warmed up " + university.settings["uniID"])
+        return True
+    except Exception:
+        log.exception("Failed to warm up " + university.settings["uniID"])
+        return False
+
+def warmUp(universities, delay=5, maxDelay=300):
+    """
+    Publishes the DB's contents for the given universities on a pool of "warmupthreads" threads
+
+    The universities that failed are retried with a doubling delay until every one of them is published, so /ready
+    eventually succeeds once the DB is reachable again. This runs in the background of every API process once it has
+    been forked, since the threads wouldn't survive the fork
+
+    :param universities: **list** Universities that don't scrape in this process
+    :param delay: **int** Seconds to wait before the first retry
+    :param maxDelay: **int** Most seconds to wait between retries
+    :return:
+    """
+    def warm():
+        pending = universities
+        wait = delay
+
+        with ThreadPoolExecutor(max_workers=settings.get("warmupthreads", 4)) as warmup:
+            while True:
+                published = list(warmup.map(publishUni, pending))
+                pending = [university for university, done in zip(pending, published) if not done]
+
+                if not pending:
+                    return
+
+                failed = ", ".join(university.settings["uniID"] for university in pending)
+                log.warning("Retrying the warmup of " + failed + " in " + str(wait) + "s")
+                time.sleep(wait)
+                wait = min(wait * 2, maxDelay)
+
+    Thread(target=warm, name="warmup", daemon=True).start()
+
+def refreshUniversities(universities, interval):
+    """
+    Publishes the universities again whenever another instance published new data for them, forever
+
+    :param universities: **list** Universities whose data is written by another instance
+    :param interval: **int** Seconds between checks of the published generations
+    :return:
+    """
+    while True:
+        time.sleep(interval)
+
+        for university in universities:
+            try:
+                if university.hasNewPublication():
+                    university.reload()
+                    log.info("Published " + university.settings["uniID"] + "'s new data from the DB")
+            except Exception:
+                log.exception("Failed to refresh " + university.settings["uniID"])
+
+def startUniversities(supervisor, apiOnly):
+    """
+    Instantiates the enabled universities, starts the scrapers that run in this process and warms up the rest
 
-    # Get the modules of uni
-    unimemebers = inspect.getmembers(uni)
+    Universities use the MongoDB client, which isn't fork safe, so this runs in every API process once it has been
+    forked
+
+    :param supervisor: **Supervisor/None** Supervisor of the scraper processes, if scrapers run in child processes
+    :param apiOnly: **bool** Whether this node never scrapes
+    :return:
+    """
+    # Instantiate the unis
     rmpids = []
 
     # lock for file synchronization
@@ -102,6 +691,8 @@ if __name__ == '__main__':
         # Set the key and lock
         unisettings["uniID"] = university
         unisettings["lock"] = lock
+        unisettings["cache"] = responseCache
+        unisettings["teacherindex"] = teacherIndex
 
         # Only instantiate if they have it enabled in settings
         if "enabled" in unisettings and unisettings["enabled"]:
@@ -110,52 +701,117 @@ if __name__ == '__main__':
             if "rmpid" in unisettings:
                 rmpids.append(unisettings["rmpid"])
 
-            foundClass = False
+            # Only import the scraper of universities that scrape in this process
+            scrape = unisettings.get("scrape") is True and not apiOnly and not supervisor
 
-            # Find the module of this uni
-            for member in unimemebers:
-                if member[0] == university:
+            try:
+                # The class must be the same name as the key for this Uni (ex. UCalgary) unless "class" is set
+                uniThreads[university] = getUniversityClass(university, unisettings, scrape)(unisettings)
 
-                    # Now find the class in the module
-                    uniclasses = inspect.getmembers(member[1])
+                log.info("Instantiated " + university + "'s thread")
+            except (ImportError, AttributeError):
+                log.exception("We couldn't find the class to instantiate for " + university)
 
-                    # Iterate the classes
-                    for uniclass in uniclasses:
-                        if uniclass[0] == university:
-                            # Found the class, it must be the same name as the key for this Uni (ex. UCalgary)
-                            uniThreads[university] = uniclass[1](unisettings)
+    log.info("Starting University Threads")
 
-                            log.info("Instantiated " + university + "'s thread")
-                            foundClass = True
+    # Universities whose terms are precomputed by warmUp(), scraping threads publish when they start
+    warming = []
 
-            if not foundClass:
-                log.error("We couldn't find the class to instantiate for", university)
+    # Universities that are scraped by another instance, their new generations are polled for
+    refreshing = []
 
-    log.info("Starting University Threads")
     # Start each Uni thread
     for uniThread in uniThreads:
         if "scrape" not in settings["Universities"][uniThread]:
             log.error(uniThread + " must have a scrape attribute!")
         else:
-            if settings["Universities"][uniThread]["scrape"] is True:
+            if settings["Universities"][uniThread]["scrape"] is True and supervisor:
+                # The scraper process publishes to the DB and notifies us, serve what is in the DB until then
+                supervisor.addUniversity(uniThread, settings["Universities"][uniThread])
+                warming.append(uniThreads[uniThread])
+            elif settings["Universities"][uniThread]["scrape"] is True and not apiOnly:
                 # scraping is enabled
                 log.info("Starting " + uniThread + "'s thread")
                 uniThreads[uniThread].start()
+            else:
+                # Publish the DB's contents once so the terms and the indexes that are built on publish exist
+                warming.append(uniThreads[uniThread])
+
+                # API only nodes serve what the scraping nodes publish, whatever the university's "scrape" setting
+                if apiOnly or settings["Universities"][uniThread]["scrape"] is not True:
+                    refreshing.append(uniThreads[uniThread])
 
     # Start up the RateMyProfessors scraper if there is at least one rmp id
-    if len(rmpids) > 0 and "rmpinterval" in settings:
+    if len(rmpids) > 0 and "rmpinterval" in settings and supervisor:
+        supervisor.addRMP(rmpids, settings["rmpinterval"])
+    elif len(rmpids) > 0 and "rmpinterval" in settings and not apiOnly:
         log.info("Starting RMP scraper")
+
+        # Imported here since it requires the scraper dependencies
+        from rmp import RateMyProfessors
+
         rmpthread = RateMyProfessors(rmpids, settings["rmpinterval"])
         rmpthread.start()
 
+    if supervisor:
+        log.info("Starting the scraper processes")
+        supervisor.start()
+
+    warmUp(warming)
+
+    if refreshing and settings.get("refreshinterval", 60) > 0:
+        Thread(target=refreshUniversities, args=(refreshing, settings.get("refreshinterval", 60)),
+               name="refresh", daemon=True).start()
+
+def scrapesInProcess(apiOnly):
+    """
+    Returns whether any scraper runs in this process or in scraper processes that it supervises
+
+    :param apiOnly: **bool** Whether this node never scrapes
+    :return: **bool** True if the API can't fork worker processes
+    """
+    if apiOnly:
+        return False
+
+    for university in settings["Universities"]:
+        unisettings = settings["Universities"][university]
+
+        if unisettings.get("enabled") and unisettings.get("scrape") is True:
+            return True
+
+        if unisettings.get("enabled") and "rmpid" in unisettings and "rmpinterval" in settings:
+            return True
+
+    return False
+
+if __name__ == '__main__':
+
+    # API only nodes never scrape, so they don't import any scraper or its dependencies
+    apiOnly = settings.get("apionly", False)
+
+    # Scrapers can run in child processes so their CPU usage doesn't hold up the API
+    supervisor = Supervisor(uniThreads, dbsettings=settings.get("mongodb", {})) \
+        if settings.get("scraperprocesses", False) and not apiOnly else None
+
     # Run the Falcon API server
-    app = falcon.API()
+    metrics.addCollector(collectStateMetrics)
+    app = falcon.API(middleware=[MetricsMiddleware(metrics)])
 
     # Add the routes
+    app.add_route('/metrics', metricsResource())
+    app.add_route('/ready', readyResource())
     app.add_route('/v1/unis', v1Unis())
+    app.add_route('/v1/unis/{uni}/teachers/{name}', v1GetUniTeacher())
     app.add_route('/v1/unis/{uni}/{term}/all', v1GetAllUniTermSubjects())
+    app.add_route('/v1/unis/{uni}/{term}/changes', v1GetUniTermChanges())
+    app.add_route('/v1/unis/{uni}/{term}/classes', v1GetUniTermClasses())
+    app.add_route('/v1/unis/{uni}/{term}/generate', v1GenerateSchedules())
+    app.add_route('/v1/unis/{uni}/{term}/search', v1SearchUniTerm())
+    app.add_route('/v1/unis/{uni}/{term}/subjects', v1GetUniTermSubjects())
+    app.add_route('/v1/unis/{uni}/{term}/subjects/{subject}', v1GetUniTermSubject())
+    app.add_route('/v1/unis/{uni}/{term}/subjects/{subject}/{coursenum}', v1GetUniTermCourse())
 
     # It is highly recommended to put this API behind a proxy such as nginx with heavy caching
-    log.info("Setting up API server on port " + str(settings["port"]))
-    httpd = simple_server.make_server('0.0.0.0', settings["port"], app)
-    httpd.serve_forever()
+    # Worker processes would lose the scraper threads and their snapshot updates, so only fork without them
+    server.serve(app, settings["port"], settings.get("server", {}), canFork=not scrapesInProcess(apiOnly),
+                 startWorker=lambda: startUniversities(supervisor, apiOnly))
@@ -0,0 +1,255 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from time import time
+
+# Upper bounds of the latency buckets in seconds
+latencyBuckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+# Upper bounds of the response size buckets in bytes
+sizeBuckets = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
+
+def formatLabels(labels):
+    """
+    Formats a dict of labels in the Prometheus text format
+
+    :param labels: **dict** Label names and values
+    :return: **string** ex. {route="v1Unis",status="200"}
+    """
+    if not labels:
+        return ""
+
+    pairs = []
+
+    for name in sorted(labels):
+        value = str(labels[name]).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(name + '="' + value + '"')
+
+    return "{" + ",".join(pairs) + "}"
+
+
+def formatValue(value):
+    """
+    Formats a sample value in the Prometheus text format
+
+    :param value: **int/float** Sample value
+    :return: **string**
+    """
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram():
+    """
+        Cumulative histogram with fixed buckets, the owner must serialize observations
+    """
+    def __init__(self, buckets):
+        """
+        Constructor for a histogram
+
+        :param buckets: **list** Sorted upper bounds of the buckets
+        :return:
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Adds an observation to the histogram
+
+        :param value: **int/float** Observed value
+        :return:
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        """
+        Returns the samples of the histogram in the Prometheus text format
+
+        :param name: **string** Metric name
+        :param labels: **dict** Labels of this histogram
+        :return: **list** Sample lines
+        """
+        lines = []
+        cumulative = 0
+
+        for index in range(len(self.buckets) + 1):
+            cumulative += self.counts[index]
+            bound = self.buckets[index] if index < len(self.buckets) else float("inf")
+
+            bucketLabels = dict(labels)
+            bucketLabels["le"] = formatValue(float(bound))
+
+            lines.append(name + "_bucket" + formatLabels(bucketLabels) + " " + str(cumulative))
+
+        lines.append(name + "_sum" + formatLabels(labels) + " " + formatValue(self.sum))
+        lines.append(name + "_count" + formatLabels(labels) + " " + str(self.count))
+
+        return lines
+
+
+class Metrics():
+    """
+        Request metrics of the API along with collectors for gauges that are computed when scraped
+
+        Observations only hold a lock for a few dict/list updates, so collection can stay on in production
+    """
+    def __init__(self, prefix="schedulestorm"):
+        """
+        Constructor for the metrics registry
+
+        :param prefix: **string** Prefix of every metric name
+        :return:
+        """
+        self.prefix = prefix
+        self.lock = Lock()
+        self.latency = {}
+        self.sizes = {}
+        self.statuses = {}
+        self.collectors = []
+
+    def observeRequest(self, route, status, seconds):
+        """
+        Records the latency and status of a request
+
+        :param route: **string** Name of the route that handled the request
+        :param status: **string** HTTP status code (ex. "200")
+        :param seconds: **float** Time the handler took
+        :return:
+        """
+        with self.lock:
+            if route not in self.latency:
+                self.latency[route] = Histogram(latencyBuckets)
+
+            self.latency[route].observe(seconds)
+
+            key = (route, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def observeSize(self, route, size):
+        """
+        Records the size of a response body
+
+        :param route: **string** Name of the route that handled the request
+        :param size: **int** Bytes sent in the body
+        :return:
+        """
+        with self.lock:
+            if route not in self.sizes:
+                self.sizes[route] = Histogram(sizeBuckets)
+
+            self.sizes[route].observe(size)
+
+    def addCollector(self, collector):
+        """
+        Adds a function that is called whenever the metrics are rendered
+
+        :param collector: **function** Returns a list of (name, type, help, samples) where samples is a list of
+                          (labels dict, value)
+        :return:
+        """
+        self.collectors.append(collector)
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format
+
+        :return: **string**
+        """
+        lines = []
+
+        with self.lock:
+            name = self.prefix + "_request_duration_seconds"
+            lines.append("# HELP " + name + " Time spent handling requests")
+            lines.append("# TYPE " + name + " histogram")
+
+            for route in sorted(self.latency):
+                lines.extend(self.latency[route].render(name, {"route": route}))
+
+            name = self.prefix + "_response_size_bytes"
+            lines.append("# HELP " + name + " Size of response bodies")
+            lines.append("# TYPE " + name + " histogram")
+
+            for route in sorted(self.sizes):
+                lines.extend(self.sizes[route].render(name, {"route": route}))
+
+            name = self.prefix + "_requests_total"
+            lines.append("# HELP " + name + " Requests by route and status code")
+            lines.append("# TYPE " + name + " counter")
+
+            for route, status in sorted(self.statuses):
+                lines.append(name + formatLabels({"route": route, "status": status}) + " " +
+                             str(self.statuses[(route, status)]))
+
+        for collector in self.collectors:
+            for name, metricType, description, samples in collector():
+                name = self.prefix + "_" + name
+                lines.append("# HELP " + name + " " + description)
+                lines.append("# TYPE " + name + " " + metricType)
+
+                for labels, value in samples:
+                    lines.append(name + formatLabels(labels) + " " + formatValue(value))
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware():
+    """
+        Falcon middleware that records the latency, status and body size of every request
+    """
+    def __init__(self, metrics):
+        """
+        Constructor for the middleware
+
+        :param metrics: **Metrics** Registry to record into
+        :return:
+        """
+        self.metrics = metrics
+
+    def process_request(self, req, resp):
+        req.context["metricsStart"] = time()
+
+    def process_response(self, req, resp, resource):
+        route = type(resource).__name__ if resource is not None else "none"
+        status = str(resp.status).split(" ", 1)[0]
+
+        self.metrics.observeRequest(route, status, time() - req.context.get("metricsStart", time()))
+
+        if resp.stream is not None and not hasattr(resp.stream, "read"):
+            # Streamed bodies are counted as they're sent
+            resp.stream = self.countStream(route, resp.stream)
+        elif resp.body is not None:
+            self.metrics.observeSize(route, len(resp.body))
+        else:
+            self.metrics.observeSize(route, 0)
+
+    def countStream(self, route, chunks):
+        """
+        Passes through a streamed body and records its size once it has been sent
+
+        :param route: **string** Name of the route that handled the request
+        :param chunks: **iterator** Chunks of the body
+        :return: **iterator** The same chunks
+        """
+        size = 0
+
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.metrics.observeSize(route, size)
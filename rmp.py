@@ -11,6 +11,7 @@ import requests
 import pymongo
 import time
 import logging
+from database import getDatabase, bootstrapIndexes
 
 log = logging.getLogger("RMP")
 
@@ -30,10 +31,17 @@ class RateMyProfessors(threading.Thread):
         # The amount of seconds to wait before scraping RMP again
         self.interval = interval
 
-        # Establish db connection
-        self.db = pymongo.MongoClient().ScheduleStorm
+        # Use the shared db connection
+        self.db = getDatabase()
 
-        log.info("Ensuring MongoDB indexes exist")
+        bootstrapIndexes("RateMyProfessors", self.ensureIndexes)
+
+    def ensureIndexes(self):
+        """
+        Ensures the indexes exist for the RMP table
+
+        :return:
+        """
         self.db.RateMyProfessors.create_index(
             [("school", pymongo.ASCENDING)]
         )
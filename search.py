@@ -0,0 +1,369 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import re
+import json
+import heapq
+import hashlib
+from bisect import bisect_left
+from threading import Lock
+from cache import flattenSubjects
+
+tokenRegex = re.compile(r"[a-z0-9]+")
+
+# Weights of a token depending on the field it was found in
+weights = {"code": 10, "name": 5, "teacher": 6, "desc": 1}
+
+# Bonus multiplier when a query token matches an indexed token exactly rather than as a prefix
+exactBonus = 2
+
+# Maximum amount of indexed tokens a prefix is expanded to, prefixes are matched in lexicographical order
+maxExpansions = 256
+
+# Ranking of the result types when their scores are tied
+typeOrder = {"subject": 0, "course": 1, "teacher": 2}
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase alphanumeric tokens
+
+    :param text: **string** Text to tokenize
+    :return: **list** Tokens in the order they appear
+    """
+    if not isinstance(text, str):
+        return []
+
+    return tokenRegex.findall(text.lower())
+
+
+def addTokens(tokens, text, weight):
+    """
+    Adds the tokens of the text to a token weight dict, keeping the highest weight of each token
+
+    :param tokens: **dict** Tokens mapped to their weight
+    :param text: **string** Text to tokenize
+    :param weight: **int** Weight of the field the text is from
+    :return:
+    """
+    for token in tokenize(text):
+        if tokens.get(token, 0) < weight:
+            tokens[token] = weight
+
+
+class TermSearchIndex():
+    """
+        Inverted index with prefix lookups over the subjects, courses and teachers of a term
+
+        The documents are grouped into segments (one per subject and one for the teachers) so that a new generation
+        only has to re-tokenize the subjects that changed. Indexes are immutable once built, a new generation gets a
+        new index that shares the postings of the tokens that didn't change.
+    """
+    def __init__(self, termdata, previous=None):
+        """
+        Constructor for a term index
+
+        :param termdata: **dict** Response of getSubjectListAll
+        :param previous: **TermSearchIndex** Index of the previous generation of the term to reuse segments from
+        :return:
+        """
+        # Segment key -> (fingerprint, {docid: (result, {token: weight})})
+        self.segments = {}
+
+        subjects = flattenSubjects(termdata["classes"])
+
+        for subject in subjects:
+            self.addSegment(("subject", subject), self.subjectFingerprint(subjects[subject]),
+                            lambda: self.subjectDocuments(subject, subjects[subject]), previous)
+
+        teachers = self.teacherCourses(subjects)
+        fingerprint = hashlib.sha1(json.dumps(teachers, sort_keys=True).encode('utf-8')).digest()
+        self.addSegment(("teachers",), fingerprint, lambda: self.teacherDocuments(teachers), previous)
+
+        if previous:
+            self.updatePostings(previous)
+        else:
+            self.postings = {}
+
+            for key in self.segments:
+                self.addPostings(self.postings, self.segments[key][1], set())
+
+        self.tokens = sorted(self.postings)
+
+        self.documents = {}
+
+        for fingerprint, documents in self.segments.values():
+            for docid in documents:
+                self.documents[docid] = documents[docid][0]
+
+    def addSegment(self, key, fingerprint, build, previous):
+        """
+        Adds a segment, reusing the previous generation's documents if its fingerprint didn't change
+
+        :param key: **tuple** Key of the segment
+        :param fingerprint: **bytes** Hash of the data the segment is built from
+        :param build: **function** Returns the documents of the segment
+        :param previous: **TermSearchIndex/None** Index of the previous generation
+        :return:
+        """
+        if previous and key in previous.segments and previous.segments[key][0] == fingerprint:
+            self.segments[key] = previous.segments[key]
+        else:
+            self.segments[key] = (fingerprint, build())
+
+    def subjectFingerprint(self, subjectdict):
+        """
+        Returns a hash of the fields of a subject that are indexed (the classes are indexed in the teachers segment)
+
+        :param subjectdict: **dict** Subject of a getSubjectListAll response
+        :return: **bytes** Fingerprint of the subject
+        """
+        fields = {}
+
+        for key in subjectdict:
+            if key == "description":
+                fields[key] = subjectdict[key]
+            else:
+                fields[key] = subjectdict[key].get("description")
+
+        return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).digest()
+
+    def subjectDocuments(self, subject, subjectdict):
+        """
+        Returns the documents of a subject and its courses
+
+        :param subject: **string** Subject code
+        :param subjectdict: **dict** Subject of a getSubjectListAll response
+        :return: **dict** docid -> (result, {token: weight})
+        """
+        documents = {}
+
+        description = subjectdict.get("description") or {}
+        name = description.get("name", "") if isinstance(description, dict) else description
+
+        tokens = {}
+        addTokens(tokens, subject, weights["code"])
+        addTokens(tokens, name, weights["name"])
+        documents["subject:" + subject] = ({"type": "subject", "subject": subject, "name": name}, tokens)
+
+        for coursenum in subjectdict:
+            if coursenum == "description":
+                continue
+
+            description = subjectdict[coursenum].get("description") or {}
+
+            tokens = {}
+            addTokens(tokens, description.get("desc", ""), weights["desc"])
+            addTokens(tokens, description.get("name", ""), weights["name"])
+            addTokens(tokens, subject + " " + coursenum + " " + subject + coursenum, weights["code"])
+
+            result = {"type": "course", "subject": subject, "coursenum": coursenum,
+                      "name": description.get("name", "")}
+
+            documents["course:" + subject + ":" + coursenum] = (result, tokens)
+
+        return documents
+
+    def teacherCourses(self, subjects):
+        """
+        Returns the courses that each teacher teaches
+
+        :param subjects: **dict** Flattened subjects of a getSubjectListAll response
+        :return: **dict** Teacher name -> sorted list of "SUBJECT COURSENUM"
+        """
+        teachers = {}
+
+        for subject in subjects:
+            for coursenum in subjects[subject]:
+                if coursenum == "description":
+                    continue
+
+                for classv in subjects[subject][coursenum]["classes"]:
+                    for teacher in classv["teachers"]:
+                        if teacher != "Staff":
+                            teachers.setdefault(teacher, set()).add(subject + " " + coursenum)
+
+        return {teacher: sorted(teachers[teacher]) for teacher in teachers}
+
+    def teacherDocuments(self, teachers):
+        """
+        Returns the documents of the teachers
+
+        :param teachers: **dict** Teacher name -> courses
+        :return: **dict** docid -> (result, {token: weight})
+        """
+        documents = {}
+
+        for teacher in teachers:
+            tokens = {}
+            addTokens(tokens, teacher, weights["teacher"])
+            documents["teacher:" + teacher] = ({"type": "teacher", "name": teacher, "courses": teachers[teacher]},
+                                               tokens)
+
+        return documents
+
+    def addPostings(self, postings, documents, copied):
+        """
+        Adds the tokens of documents to the postings
+
+        :param postings: **dict** token -> {docid: weight}
+        :param documents: **dict** docid -> (result, {token: weight})
+        :param copied: **set** Tokens whose posting dicts belong to this index (the rest are shared and copied first)
+        :return:
+        """
+        for docid in documents:
+            for token, weight in documents[docid][1].items():
+                if token not in copied:
+                    postings[token] = dict(postings.get(token, {}))
+                    copied.add(token)
+
+                postings[token][docid] = weight
+
+    def updatePostings(self, previous):
+        """
+        Derives the postings from the previous generation's by only removing and adding the changed segments
+
+        :param previous: **TermSearchIndex** Index of the previous generation
+        :return:
+        """
+        removed = [previous.segments[key][1] for key in previous.segments
+                   if self.segments.get(key) is not previous.segments[key]]
+        added = [self.segments[key][1] for key in self.segments
+                 if previous.segments.get(key) is not self.segments[key]]
+
+        if not removed and not added:
+            self.postings = previous.postings
+            return
+
+        self.postings = dict(previous.postings)
+        copied = set()
+
+        for documents in removed:
+            for docid in documents:
+                for token in documents[docid][1]:
+                    if token not in copied:
+                        self.postings[token] = dict(self.postings[token])
+                        copied.add(token)
+
+                    self.postings[token].pop(docid, None)
+
+        for documents in added:
+            self.addPostings(self.postings, documents, copied)
+
+        for token in copied:
+            if not self.postings[token]:
+                del self.postings[token]
+
+    def matchToken(self, token):
+        """
+        Returns the documents that have an indexed token starting with the given token
+
+        :param token: **string** Query token
+        :return: **dict** docid -> best weight of the matching tokens
+        """
+        matches = {}
+        index = bisect_left(self.tokens, token)
+        end = min(index + maxExpansions, len(self.tokens))
+
+        while index < end and self.tokens[index].startswith(token):
+            indexed = self.tokens[index]
+            bonus = exactBonus if indexed == token else 1
+
+            for docid, weight in self.postings[indexed].items():
+                if matches.get(docid, 0) < weight * bonus:
+                    matches[docid] = weight * bonus
+
+            index += 1
+
+        return matches
+
+    def search(self, query, limit):
+        """
+        Returns the documents that match every token of the query, ranked by their scores
+
+        :param query: **string** Search query (ex. "cpsc 23", "intro prog")
+        :param limit: **int** Maximum amount of results
+        :return: **list** Result dicts with their "score"
+        """
+        tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+
+        if not tokens:
+            return []
+
+        # Start with the most selective (longest) token and intersect
+        scores = self.matchToken(tokens[0])
+
+        for token in tokens[1:]:
+            if not scores:
+                break
+
+            matches = self.matchToken(token)
+            scores = {docid: scores[docid] + matches[docid] for docid in scores if docid in matches}
+
+        ranked = heapq.nsmallest(limit, scores,
+                                 key=lambda docid: (-scores[docid], typeOrder[self.documents[docid]["type"]], docid))
+
+        results = []
+
+        for docid in ranked:
+            result = dict(self.documents[docid])
+            result["score"] = scores[docid]
+            results.append(result)
+
+        return results
+
+
+class SearchIndexes():
+    """
+        Search indexes of the published generation of every term
+    """
+    def __init__(self):
+        """
+        Constructor for the search indexes
+
+        :return:
+        """
+        self.indexes = {}
+        self.lock = Lock()
+
+    def build(self, uni, term, termdata):
+        """
+        Builds the index of a term that is about to be published, reusing the unchanged subjects of the current one
+
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :param termdata: **dict** Response of getSubjectListAll for the new generation
+        :return: **TermSearchIndex** Index to pass to commit()
+        """
+        with self.lock:
+            previous = self.indexes.get((uni, term))
+
+        return TermSearchIndex(termdata, previous)
+
+    def commit(self, uni, term, index):
+        """
+        Makes a built index visible, this should happen when its snapshot is published
+
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :param index: **TermSearchIndex** Index from build()
+        :return:
+        """
+        with self.lock:
+            self.indexes[(uni, term)] = index
+
+    def get(self, uni, term):
+        """
+        Returns the published index of a term
+
+        :param uni: **string** uniID of the term
+        :param term: **string** ID of the term
+        :return: **TermSearchIndex/bool** Index of the term, False if it hasn't been built yet
+        """
+        with self.lock:
+            return self.indexes.get((uni, term), False)
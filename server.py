@@ -0,0 +1,252 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import os
+import socket
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref import simple_server
+
+log = logging.getLogger("server")
+
+# Production defaults, any of these can be overridden in the "server" block of settings.json
+defaultSettings = {
+    "mode": "threaded",
+    "threads": 32,
+    "processes": 1,
+    "backlog": 256,
+    "keepalive": 5,
+    "timeout": 120
+}
+
+
+class KeepAliveServerHandler(simple_server.ServerHandler):
+    """
+        WSGI handler that responds with HTTP/1.1 so that connections can be reused
+    """
+    http_version = "1.1"
+    hasLength = False
+
+    def close(self):
+        # Without a Content-Length, the client can only find the end of the body by the connection closing
+        self.hasLength = bool(self.headers) and "Content-Length" in self.headers
+        super().close()
+
+
+class KeepAliveRequestHandler(simple_server.WSGIRequestHandler):
+    """
+        Request handler that serves multiple requests on a connection until the client closes it or it goes idle
+    """
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        self.close_connection = True
+        self.handleOne()
+
+        while not self.close_connection:
+            self.handleOne()
+
+    def handleOne(self):
+        """
+        Reads and responds to a single request on the connection
+
+        :return:
+        """
+        # Idle connections are closed after the keep-alive timeout
+        self.connection.settimeout(self.server.keepalive)
+
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except socket.timeout:
+            self.close_connection = True
+            return
+
+        # Slow clients get longer to send the rest of the request and download the response
+        self.connection.settimeout(self.server.requestTimeout)
+
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            self.close_connection = True
+            return
+
+        # parse_request decides whether the client wants to keep the connection open
+        if not self.parse_request():
+            return
+
+        if self.request_version != "HTTP/1.1":
+            self.close_connection = True
+
+        handler = KeepAliveServerHandler(
+            self.rfile, self.wfile, self.get_stderr(), self.get_environ(),
+            multithread=True,
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+        if not handler.hasLength:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+class PooledWSGIServer(simple_server.WSGIServer):
+    """
+        WSGI server that hands each connection to a fixed pool of worker threads
+    """
+    def __init__(self, address, threads, backlog, keepalive, timeout, bind_and_activate=True):
+        """
+        Constructor for the pooled server
+
+        :param address: **tuple** (host, port) to listen on
+        :param threads: **int** Amount of worker threads
+        :param backlog: **int** Amount of pending connections the kernel queues before refusing new ones
+        :param keepalive: **int/float** Seconds an idle connection is kept open
+        :param timeout: **int/float** Seconds a socket operation can take while a request is being served
+        :return:
+        """
+        self.request_queue_size = backlog
+        self.keepalive = keepalive
+        self.requestTimeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        super().__init__(address, KeepAliveRequestHandler, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.processRequestThread, request, client_address)
+
+    def processRequestThread(self, request, client_address):
+        """
+        Serves the connection on a worker thread
+
+        :param request: **socket** Connection to serve
+        :param client_address: **tuple** Address of the client
+        :return:
+        """
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def prefork(serveForever, processes, startWorker=None):
+    """
+    Forks the given amount of worker processes that all run serveForever on the inherited listening socket
+
+    The parent process waits on the workers and restarts any that die
+
+    :param serveForever: **function** Serves on the listening socket forever
+    :param processes: **int** Amount of worker processes
+    :param startWorker: **function** If given, called in every worker process before it serves
+    :return:
+    """
+    workers = set()
+
+    while True:
+        while len(workers) < processes:
+            pid = os.fork()
+
+            if pid == 0:
+                # Worker process
+                try:
+                    if startWorker:
+                        startWorker()
+
+                    serveForever()
+                finally:
+                    os._exit(1)
+
+            workers.add(pid)
+            log.info("Started API worker process " + str(pid))
+
+        pid, status = os.wait()
+
+        if pid in workers:
+            workers.remove(pid)
+            log.error("API worker process " + str(pid) + " exited with status " + str(status) + ", restarting it")
+
+
+def serve(app, port, serversettings, canFork=True, startWorker=None):
+    """
+    Serves the WSGI app forever using the mode specified in the settings
+
+    Modes:
+        simple: wsgiref's single threaded server, one request at a time
+        threaded: Pool of worker threads with keep-alive
+        asyncio: Event loop that writes responses while the app is called on a pool of executor threads
+
+    The threaded and asyncio modes can also run in several prefork processes
+
+    :param app: **falcon.API** WSGI app to serve
+    :param port: **int** Port to listen on
+    :param serversettings: **dict** "server" block of the settings file
+    :param canFork: **bool** Whether it is safe to fork worker processes (no scrapers running in this process)
+    :param startWorker: **function** If given, called in every process that serves before it accepts requests, after
+                        it was forked (threads don't survive a fork, so this is where they should be started)
+    :return:
+    """
+    config = dict(defaultSettings)
+    config.update(serversettings)
+
+    processes = config["processes"]
+
+    if processes > 1 and not canFork:
+        log.error("Can't fork API worker processes while universities are scraping in this process, "
+                  "using a single process")
+        processes = 1
+
+    if config["mode"] == "simple":
+        log.info("Setting up simple API server on port " + str(port))
+        httpd = simple_server.make_server('0.0.0.0', port, app)
+
+        if startWorker:
+            startWorker()
+
+        httpd.serve_forever()
+        return
+    elif config["mode"] == "threaded":
+        httpd = PooledWSGIServer(('0.0.0.0', port), config["threads"], config["backlog"], config["keepalive"],
+                                 config["timeout"])
+        httpd.set_app(app)
+
+        serveForever = httpd.serve_forever
+    elif config["mode"] == "asyncio":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('0.0.0.0', port))
+
+        # Imported here since the asyncio server requires Python 3.7+, the other modes run on Python 3.4+
+        from asyncserver import AsyncWSGIServer
+
+        httpd = AsyncWSGIServer(app, config["threads"], config["keepalive"], config["timeout"])
+
+        def serveForever():
+            httpd.serve_forever(sock, config["backlog"])
+    else:
+        log.critical("Unknown server mode " + str(config["mode"]))
+        return
+
+    log.info("Setting up " + config["mode"] + " API server on port " + str(port) + " with " + str(processes) +
+             " process(es) of " + str(config["threads"]) + " threads")
+
+    if processes > 1:
+        prefork(serveForever, processes, startWorker)
+    else:
+        if startWorker:
+            startWorker()
+
+        serveForever()
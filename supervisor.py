@@ -0,0 +1,226 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import sys
+import queue
+import logging
+import threading
+import multiprocessing
+import database
+from time import time
+
+log = logging.getLogger("supervisor")
+
+# Settings that only make sense in the API process and can't be sent to a scraper process
+processLocalSettings = ["lock", "cache", "teacherindex"]
+
+
+def runUniversity(uniID, unisettings, dbsettings):
+    """
+    Entry point of a university scraper process
+
+    :param uniID: **string** ID of the university
+    :param unisettings: **dict** Settings of the university, including the "lock" and "notify" queue
+    :param dbsettings: **dict** "mongodb" settings of the connection
+    :return:
+    """
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    # Spawned children don't inherit the configured connection
+    database.configure(dbsettings)
+
+    # Imported in the child so the API process never needs the scraper's dependencies
+    from uni import getUniversityClass
+
+    university = getUniversityClass(uniID, unisettings)(unisettings)
+    university.run()
+
+
+def runRMP(rmpids, interval, dbsettings):
+    """
+    Entry point of the RateMyProfessors scraper process
+
+    :param rmpids: **list** RMP school ids to scrape
+    :param interval: **int** Seconds between scrapes
+    :param dbsettings: **dict** "mongodb" settings of the connection
+    :return:
+    """
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    database.configure(dbsettings)
+
+    from rmp import RateMyProfessors
+
+    RateMyProfessors(rmpids, interval).run()
+
+
+class Supervisor(threading.Thread):
+    """
+        Runs every scraper in its own process and restarts the ones that crash
+
+        The API process keeps serving its published snapshots. Scraper processes report when they start scraping and
+        when they've published a new generation to the DB, at which point the API process publishes it as well.
+    """
+    def __init__(self, universities, restartdelay=5, maxrestartdelay=300, dbsettings=None):
+        """
+        Constructor for the supervisor
+
+        :param universities: **dict** uniID -> University that serves it in the API process
+        :param restartdelay: **int** Seconds to wait before restarting a crashed scraper, doubled on every crash
+        :param maxrestartdelay: **int** Maximum seconds to wait before restarting a crashed scraper
+        :param dbsettings: **dict** "mongodb" settings that the scraper processes connect with
+        :return:
+        """
+        super().__init__(daemon=True)
+        self.universities = universities
+        self.restartdelay = restartdelay
+        self.maxrestartdelay = maxrestartdelay
+        self.dbsettings = dbsettings or {}
+
+        # Spawn rather than fork so the children don't inherit the API's threads and sockets
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.lock = self.context.Lock()
+
+        # name -> {"target", "args", "process", "crashes", "restartAt"}
+        self.children = {}
+
+    def addUniversity(self, uniID, unisettings):
+        """
+        Adds a university scraper process
+
+        :param uniID: **string** ID of the university
+        :param unisettings: **dict** Settings of the university
+        :return:
+        """
+        childsettings = {key: unisettings[key] for key in unisettings if key not in processLocalSettings}
+        childsettings["lock"] = self.lock
+        childsettings["notify"] = self.events
+
+        self.children[uniID] = {"target": runUniversity, "args": (uniID, childsettings, self.dbsettings),
+                                "process": None, "crashes": 0, "restartAt": 0}
+
+    def addRMP(self, rmpids, interval):
+        """
+        Adds the RateMyProfessors scraper process
+
+        :param rmpids: **list** RMP school ids to scrape
+        :param interval: **int** Seconds between scrapes
+        :return:
+        """
+        self.children["RateMyProfessors"] = {"target": runRMP, "args": (rmpids, interval, self.dbsettings),
+                                             "process": None, "crashes": 0, "restartAt": 0}
+
+    def startChild(self, name):
+        """
+        Starts the process of a child
+
+        :param name: **string** Name of the child
+        :return:
+        """
+        child = self.children[name]
+        child["process"] = self.context.Process(target=child["target"], args=child["args"], name=name, daemon=True)
+        child["process"].start()
+        child["startedAt"] = time()
+
+        log.info("Started " + name + "'s scraper process (pid " + str(child["process"].pid) + ")")
+
+    def checkChildren(self):
+        """
+        Schedules crashed children to be restarted and restarts the ones whose delay has passed
+
+        :return:
+        """
+        for name in self.children:
+            child = self.children[name]
+
+            if child["process"] is not None and not child["process"].is_alive():
+                # Scrapers are infinite loops, so any exit is a crash
+                if time() - child["startedAt"] > self.maxrestartdelay:
+                    child["crashes"] = 0
+
+                delay = min(self.restartdelay * 2 ** child["crashes"], self.maxrestartdelay)
+                child["crashes"] += 1
+                child["restartAt"] = time() + delay
+
+                log.error(name + "'s scraper process exited with code " + str(child["process"].exitcode) +
+                          ", restarting in " + str(delay) + "s")
+
+                child["process"] = None
+
+                # Whatever it was scraping won't be published, let readers build from the DB again
+                if name in self.universities:
+                    self.finishScraping(self.universities[name])
+
+            if child["process"] is None and time() >= child["restartAt"]:
+                self.startChild(name)
+
+    def startScraping(self, university):
+        """
+        Marks a university as scraping in the API process
+
+        :param university: **University** University that started scraping
+        :return:
+        """
+        university.isScraping = True
+
+        if "cache" in university.settings:
+            university.settings["cache"].pin(university.settings["uniID"])
+
+    def finishScraping(self, university):
+        """
+        Marks a university as done scraping in the API process
+
+        :param university: **University** University that finished scraping
+        :return:
+        """
+        university.isScraping = False
+
+        if "cache" in university.settings:
+            university.settings["cache"].unpin(university.settings["uniID"])
+
+    def handleEvent(self, uniID, event, lastUpdated=None):
+        """
+        Handles a notification from a university scraper process
+
+        :param uniID: **string** ID of the university
+        :param event: **string** "scraping" when it starts scraping, "published" when a generation is in the DB
+        :param lastUpdated: **int** UNIX timestamp of the university's last successful scrape, None if it never had one
+        :return:
+        """
+        if uniID not in self.universities:
+            return
+
+        university = self.universities[uniID]
+
+        if event == "scraping":
+            self.startScraping(university)
+        elif event == "published":
+            if lastUpdated is not None:
+                university.settings["lastUpdated"] = lastUpdated
+
+            try:
+                # The classes were written and the new generation was stored by the scraper process
+                university.reload()
+            except Exception:
+                log.exception("Failed to publish " + uniID + "'s new generation")
+
+            self.finishScraping(university)
+
+    def run(self):
+        for name in self.children:
+            self.startChild(name)
+
+        while True:
+            try:
+                uniID, event, lastUpdated = self.events.get(timeout=1)
+                self.handleEvent(uniID, event, lastUpdated)
+            except queue.Empty:
+                pass
+
+            self.checkChildren()
@@ -0,0 +1,179 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+from threading import Lock
+
+# Class fields that aren't part of the class entries of a teacher
+omittedFields = ["_id", "uni", "term", "subject", "coursenum", "lastModified"]
+
+
+class TeacherIndex():
+    """
+        Classes taught by every teacher of a university across its enabled terms, along with their RMP rating
+
+        The working index is updated as scrapers write classes, a copy of it is published with each snapshot so the
+        API never serves a half-scraped term
+    """
+    def __init__(self):
+        """
+        Constructor for the teacher index
+
+        :return:
+        """
+        # uni -> {"classes": {(term, id): entry}, "teachers": {teacher: set of (term, id)},
+        #         "terms": set of the terms that were loaded from the DB}
+        self.working = {}
+
+        # uni -> {lowercase teacher name: {"name", "rmp", "terms": {term: [entries]}}}
+        self.published = {}
+
+        self.lock = Lock()
+
+    def updateClass(self, uni, classobj):
+        """
+        Records a class that was written to the DB in the working index of its uni
+
+        :param uni: **string** uniID of the class
+        :param classobj: **dict** Class as written to ClassList
+        :return:
+        """
+        with self.lock:
+            if uni in self.working:
+                self.addClass(self.working[uni], classobj)
+
+    def addClass(self, working, classobj):
+        """
+        Adds or replaces a class in a working index, the caller must hold the lock
+
+        :param working: **dict** Working index of a uni
+        :param classobj: **dict** Class as written to ClassList
+        :return:
+        """
+        key = (str(classobj["term"]), str(classobj["id"]))
+
+        # The teachers of a class can change between scrapes
+        if key in working["classes"]:
+            self.removeClass(working, key)
+
+        entry = {"subject": classobj["subject"], "coursenum": classobj["coursenum"],
+                 "class": {field: classobj[field] for field in classobj if field not in omittedFields}}
+
+        working["classes"][key] = entry
+
+        for teacher in classobj["teachers"]:
+            if teacher != "Staff":
+                working["teachers"].setdefault(teacher, set()).add(key)
+
+    def removeClass(self, working, key):
+        """
+        Removes a class from a working index, the caller must hold the lock
+
+        :param working: **dict** Working index of a uni
+        :param key: **tuple** (term, id) of the class
+        :return:
+        """
+        for teacher in working["classes"].pop(key)["class"]["teachers"]:
+            if teacher in working["teachers"]:
+                working["teachers"][teacher].discard(key)
+
+                if not working["teachers"][teacher]:
+                    del working["teachers"][teacher]
+
+    def stage(self, university, snapshot):
+        """
+        Builds the teacher index of a snapshot that is about to be published
+
+        The classes of the snapshot's terms are loaded from the DB the first time they're published, classes of terms
+        that are no longer enabled are dropped from the working index
+
+        :param university: **University** University that is publishing
+        :param snapshot: **dict** Snapshot with the enabled "terms"
+        :return: **dict** Index to pass to commit()
+        """
+        uni = university.settings["uniID"]
+        terms = set(snapshot["terms"])
+
+        with self.lock:
+            working = self.working.setdefault(uni, {"classes": {}, "teachers": {}, "terms": set()})
+            missing = terms - working["terms"]
+
+            for key in [key for key in working["classes"] if key[0] not in terms]:
+                self.removeClass(working, key)
+
+            working["terms"] &= terms
+
+        if missing:
+            classes = list(university.getClasses(snapshot, sorted(missing)))
+
+            with self.lock:
+                for classobj in classes:
+                    self.addClass(working, classobj)
+
+                working["terms"] |= missing
+
+        staged = {}
+
+        with self.lock:
+            for teacher in working["teachers"]:
+                teacherTerms = {}
+
+                for term, classid in working["teachers"][teacher]:
+                    if term in terms:
+                        teacherTerms.setdefault(term, []).append(working["classes"][(term, classid)])
+
+                if teacherTerms:
+                    staged[teacher] = teacherTerms
+
+        ratings = university.matchRMPNames(list(staged)) if "rmpid" in university.settings else {}
+
+        index = {}
+
+        for teacher in staged:
+            for term in staged[teacher]:
+                staged[teacher][term].sort(key=lambda entry: (entry["subject"], entry["coursenum"],
+                                                              str(entry["class"]["id"])))
+
+            index[teacher.lower()] = {"name": teacher, "rmp": ratings.get(teacher, False), "terms": staged[teacher]}
+
+        return index
+
+    def invalidate(self, uni):
+        """
+        Drops the working index of a uni so that it is loaded from the DB again on its next publish (ex. when its
+        classes were written by another process)
+
+        :param uni: **string** uniID of the index
+        :return:
+        """
+        with self.lock:
+            self.working.pop(uni, None)
+
+    def commit(self, uni, index):
+        """
+        Makes a staged index visible, this should happen when its snapshot is published
+
+        :param uni: **string** uniID of the index
+        :param index: **dict** Index from stage()
+        :return:
+        """
+        with self.lock:
+            self.published[uni] = index
+
+    def get(self, uni, name):
+        """
+        Returns the classes and RMP rating of a teacher
+
+        :param uni: **string** uniID of the teacher
+        :param name: **string** Name of the teacher (case insensitive)
+        :return: **dict/bool/None** Teacher, False if the teacher wasn't found, None if the uni hasn't been published
+        """
+        with self.lock:
+            if uni not in self.published:
+                return None
+
+            return self.published[uni].get(name.lower(), False)
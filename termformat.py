@@ -0,0 +1,440 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import sys
+import json
+import gzip
+import struct
+from time import time
+from array import array
+
+# Media type of the binary representation of a term, clients opt in to it with the Accept header
+mediaType = "application/vnd.schedulestorm.term"
+
+magic = b"SSTB"
+version = 1
+
+# Value tags
+tagMissing = 0
+tagNone = 1
+tagFalse = 2
+tagTrue = 3
+tagInt = 4
+tagFloat = 5
+tagString = 6
+tagList = 7
+tagDict = 8
+tagClasses = 9
+
+# Column kinds, the common ones are stored as fixed-width arrays so they can be decoded in bulk
+columnTagged = 0
+columnString = 1
+columnStringList = 2
+columnInt = 3
+
+doubleStruct = struct.Struct("<d")
+
+# Array typecodes by their item size in bytes
+arrayTypes = {array(code).itemsize: code for code in "BHILQ"}
+
+# Layout of an encoded term (every integer is an unsigned LEB128 varint):
+#
+#     magic, version
+#     string table: count, the byte length of each string, then the concatenated UTF-8 strings
+#     class columns: column count, class count, then for each column the string index of its key, its kind and the
+#                    value of every class:
+#                        columnString: array of string indexes + 1
+#                        columnStringList: array of list lengths + 1, then an array of every list's string indexes
+#                        columnInt: array of zigzagged integers + 1
+#                        columnTagged: a tagged value per class, tagMissing if the class doesn't have the key
+#                    0 marks a missing key in the array columns
+#     arrays: item width in bytes (1, 2, 4 or 8), item count, then the little endian items
+#     skeleton: the tagged getSubjectListAll dict where each course's class list is replaced by tagClasses and the
+#               amount of classes, which are taken in order from the columns
+#
+# Strings are only stored once in the table, every other occurrence (keys included) is an index into it
+
+
+class TermEncoder():
+    """
+        Encodes a getSubjectListAll response into the columnar binary format
+    """
+    def __init__(self):
+        """
+        Constructor for an encoder, an encoder should only be used for one term
+
+        :return:
+        """
+        self.strings = []
+        self.stringIndexes = {}
+        self.classes = []
+
+    def writeVarint(self, out, value):
+        """
+        Appends an unsigned varint
+
+        :param out: **bytearray** Buffer to append to
+        :param value: **int** Non-negative value
+        :return:
+        """
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+
+        out.append(value)
+
+    def writeArray(self, out, values):
+        """
+        Appends unsigned integers as a fixed-width array, the width is the smallest that fits every value
+
+        :param out: **bytearray** Buffer to append to
+        :param values: **list** Non-negative integers below 2^64
+        :return:
+        """
+        width = 1
+        largest = max(values) if values else 0
+
+        while largest >= 1 << (width * 8):
+            width *= 2
+
+        items = array(arrayTypes[width], values)
+
+        if sys.byteorder == "big":
+            items.byteswap()
+
+        out.append(width)
+        self.writeVarint(out, len(values))
+        out += items.tobytes()
+
+    def getStringIndex(self, string):
+        """
+        Returns the string table index of a string, adding it to the table if it is new
+
+        :param string: **string** String to look up
+        :return: **int** Index in the string table
+        """
+        index = self.stringIndexes.get(string)
+
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(string)
+            self.stringIndexes[string] = index
+
+        return index
+
+    def writeString(self, out, string):
+        """
+        Appends the string table index of a string
+
+        :param out: **bytearray** Buffer to append to
+        :param string: **string** String to reference
+        :return:
+        """
+        self.writeVarint(out, self.getStringIndex(string))
+
+    def writeColumn(self, out, key):
+        """
+        Appends the column of a key of the classes, using the most compact kind that fits its values
+
+        :param out: **bytearray** Buffer to append to
+        :param key: **string** Key of the column
+        :return:
+        """
+        self.writeString(out, key)
+
+        present = [classv[key] for classv in self.classes if key in classv]
+
+        if all(isinstance(value, str) for value in present):
+            out.append(columnString)
+            self.writeArray(out, [self.getStringIndex(classv[key]) + 1 if key in classv else 0
+                                  for classv in self.classes])
+        elif all(isinstance(value, list) and all(isinstance(item, str) for item in value) for value in present):
+            out.append(columnStringList)
+            self.writeArray(out, [len(classv[key]) + 1 if key in classv else 0 for classv in self.classes])
+            self.writeArray(out, [self.getStringIndex(item) for value in present for item in value])
+        elif all(isinstance(value, int) and not isinstance(value, bool) and -2 ** 62 <= value < 2 ** 62
+                 for value in present):
+            out.append(columnInt)
+            self.writeArray(out, [(classv[key] * 2 if classv[key] >= 0 else -classv[key] * 2 - 1) + 1
+                                  if key in classv else 0 for classv in self.classes])
+        else:
+            out.append(columnTagged)
+
+            for classv in self.classes:
+                if key in classv:
+                    self.writeValue(out, classv[key])
+                else:
+                    out.append(tagMissing)
+
+    def writeValue(self, out, value, skeleton=False):
+        """
+        Appends a tagged value
+
+        :param out: **bytearray** Buffer to append to
+        :param value: JSON serializable value
+        :param skeleton: **bool** Whether class lists should be moved to the columns
+        :return:
+        """
+        if value is None:
+            out.append(tagNone)
+        elif value is False:
+            out.append(tagFalse)
+        elif value is True:
+            out.append(tagTrue)
+        elif isinstance(value, int):
+            out.append(tagInt)
+            # Zigzag so small negative numbers stay small
+            self.writeVarint(out, value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            out.append(tagFloat)
+            out += doubleStruct.pack(value)
+        elif isinstance(value, str):
+            out.append(tagString)
+            self.writeString(out, value)
+        elif isinstance(value, (list, tuple)):
+            out.append(tagList)
+            self.writeVarint(out, len(value))
+
+            for item in value:
+                self.writeValue(out, item, skeleton)
+        elif isinstance(value, dict):
+            out.append(tagDict)
+            self.writeVarint(out, len(value))
+
+            for key in value:
+                self.writeString(out, key)
+
+                if skeleton and key == "classes" and isinstance(value[key], list):
+                    out.append(tagClasses)
+                    self.writeVarint(out, len(value[key]))
+                    self.classes.extend(value[key])
+                else:
+                    self.writeValue(out, value[key], skeleton)
+        else:
+            raise TypeError("Can't encode " + type(value).__name__)
+
+    def encode(self, termdata):
+        """
+        Encodes a term
+
+        :param termdata: **dict** Response of getSubjectListAll
+        :return: **bytes** Encoded term
+        """
+        skeleton = bytearray()
+        self.writeValue(skeleton, termdata, skeleton=True)
+
+        keys = []
+
+        for classv in self.classes:
+            for key in classv:
+                if key not in keys:
+                    keys.append(key)
+
+        columns = bytearray()
+        self.writeVarint(columns, len(keys))
+        self.writeVarint(columns, len(self.classes))
+
+        for key in keys:
+            self.writeColumn(columns, key)
+
+        # The string table is written last since the skeleton and columns add to it
+        encoded = [string.encode('utf-8') for string in self.strings]
+
+        out = bytearray(magic)
+        self.writeVarint(out, version)
+        self.writeVarint(out, len(encoded))
+
+        for string in encoded:
+            self.writeVarint(out, len(string))
+
+        for string in encoded:
+            out += string
+
+        return bytes(out + columns + skeleton)
+
+
+def encodeTerm(termdata):
+    """
+    Encodes a getSubjectListAll response into the columnar binary format
+
+    :param termdata: **dict** Response of getSubjectListAll
+    :return: **bytes** Encoded term
+    """
+    return TermEncoder().encode(termdata)
+
+
+def decodeTerm(data):
+    """
+    Reference decoder of the columnar binary format
+
+    :param data: **bytes** Encoded term
+    :return: **dict** The getSubjectListAll response that was encoded
+    """
+    if data[:4] != magic:
+        raise ValueError("Not an encoded term")
+
+    pos = 4
+
+    def readVarint():
+        nonlocal pos
+        value = 0
+        shift = 0
+
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+
+            if byte < 0x80:
+                return value
+
+            shift += 7
+
+    def readArray():
+        nonlocal pos
+        width = data[pos]
+        pos += 1
+        count = readVarint()
+
+        items = array(arrayTypes[width])
+        items.frombytes(data[pos:pos + width * count])
+        pos += width * count
+
+        if sys.byteorder == "big":
+            items.byteswap()
+
+        return items
+
+    def readValue():
+        nonlocal pos, classIndex
+        tag = data[pos]
+        pos += 1
+
+        if tag == tagString:
+            return strings[readVarint()]
+        elif tag == tagList:
+            return [readValue() for _ in range(readVarint())]
+        elif tag == tagDict:
+            value = {}
+
+            for _ in range(readVarint()):
+                key = strings[readVarint()]
+                value[key] = readValue()
+
+            return value
+        elif tag == tagInt:
+            value = readVarint()
+            return value >> 1 if not value & 1 else -((value + 1) >> 1)
+        elif tag == tagFloat:
+            pos += 8
+            return doubleStruct.unpack_from(data, pos - 8)[0]
+        elif tag == tagClasses:
+            count = readVarint()
+            classIndex += count
+            return classes[classIndex - count:classIndex]
+        elif tag == tagTrue:
+            return True
+        elif tag == tagFalse:
+            return False
+        elif tag == tagNone:
+            return None
+        elif tag == tagMissing:
+            return missing
+
+        raise ValueError("Unknown tag " + str(tag))
+
+    if readVarint() != version:
+        raise ValueError("Unsupported version")
+
+    # String table
+    lengths = [readVarint() for _ in range(readVarint())]
+    strings = []
+
+    for length in lengths:
+        strings.append(data[pos:pos + length].decode('utf-8'))
+        pos += length
+
+    # Class columns
+    missing = object()
+    keyCount = readVarint()
+    classes = [{} for _ in range(readVarint())]
+    classIndex = 0
+
+    for _ in range(keyCount):
+        key = strings[readVarint()]
+        kind = data[pos]
+        pos += 1
+
+        if kind == columnString:
+            for classv, index in zip(classes, readArray()):
+                if index:
+                    classv[key] = strings[index - 1]
+        elif kind == columnStringList:
+            lengths = readArray()
+            items = [strings[index] for index in readArray()]
+            start = 0
+
+            for classv, length in zip(classes, lengths):
+                if length:
+                    classv[key] = items[start:start + length - 1]
+                    start += length - 1
+        elif kind == columnInt:
+            for classv, value in zip(classes, readArray()):
+                if value:
+                    value -= 1
+                    classv[key] = value >> 1 if not value & 1 else -((value + 1) >> 1)
+        elif kind == columnTagged:
+            for classv in classes:
+                value = readValue()
+
+                if value is not missing:
+                    classv[key] = value
+        else:
+            raise ValueError("Unknown column kind " + str(kind))
+
+    return readValue()
+
+
+def compare(termdata, rounds=5):
+    """
+    Compares the size and decode time of the JSON and binary representations of a term
+
+    :param termdata: **dict** Response of getSubjectListAll
+    :param rounds: **int** Amount of times to decode each representation, the fastest time is kept
+    :return: **dict** Sizes in bytes (raw and gzipped) and decode times in seconds of each representation
+    """
+    jsonBody = json.dumps(termdata, sort_keys=True).encode('utf-8')
+    binaryBody = encodeTerm(termdata)
+
+    if decodeTerm(binaryBody) != json.loads(jsonBody.decode('utf-8')):
+        raise ValueError("The binary representation doesn't decode to the same term")
+
+    results = {}
+
+    for name, body, decode in [("json", jsonBody, lambda body: json.loads(body.decode('utf-8'))),
+                               ("binary", binaryBody, decodeTerm)]:
+        fastest = float("inf")
+
+        for _ in range(rounds):
+            start = time()
+            decode(body)
+            fastest = min(fastest, time() - start)
+
+        results[name] = {"size": len(body), "gzip": len(gzip.compress(body, 9)), "decode": fastest}
+
+    return results
+
+
+if __name__ == '__main__':
+    # Compare the formats for a saved /all response (ex. python termformat.py all.json)
+    with open(sys.argv[1], encoding='utf-8') as termfile:
+        results = compare(json.load(termfile))
+
+    for name in results:
+        print("%-6s %10d bytes %10d gzipped %8.1f ms to decode" %
+              (name, results[name]["size"], results[name]["gzip"], results[name]["decode"] * 1000))
@@ -0,0 +1,235 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import gzip
+import unittest
+from threading import Event, Thread
+from cache import ResponseCache, CachedTerm, CachedResponse, termETag, negotiateEncoding, compressStream, \
+    minCompressSize, flattenSubjects, filterRMP
+
+
+def makeTerm(status="Open"):
+    return {"classes": {"CPSC": {"231": {"classes": [{"id": 1, "type": "LEC", "group": ["1"], "status": status,
+                                                      "teachers": ["Jane Doe"], "times": ["MWF 9:00AM - 9:50AM"]}]},
+                                 "description": {"name": "Computer Science"}}},
+            "rmp": {"Jane Doe": {"rating": 4.0}}}
+
+
+class FakeUniversity():
+    """
+        University that serves fixed term data and counts how often it was read
+    """
+    def __init__(self, uni="X", terms=None):
+        self.settings = {"uniID": uni}
+        self.terms = terms if terms is not None else {"1": makeTerm()}
+        self.reads = 0
+        self.readable = True
+        self.release = None
+        self.snapshot = self.makeSnapshot(1)
+
+    def makeSnapshot(self, generation):
+        return {"terms": sorted(self.terms), "generations": {term: generation for term in self.terms}}
+
+    def getSubjectListAll(self, term, snapshot=None):
+        self.reads += 1
+
+        if self.release:
+            self.release.wait(5)
+
+        return self.terms[term]
+
+    def termGeneration(self, term, snapshot, digest):
+        return snapshot["generations"][term]
+
+    def canReadDB(self):
+        return self.readable
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """
+        Terms are built once per generation and swapped in atomically on publish
+    """
+    def testETagDependsOnGeneration(self):
+        self.assertEqual(termETag("X", "1", 5), termETag("X", "1", 5))
+        self.assertNotEqual(termETag("X", "1", 5), termETag("X", "1", 6))
+        self.assertNotEqual(termETag("X", "1", 5), termETag("X", "1", 5, ("subjects",)))
+
+    def testTermIsBuiltOnce(self):
+        cache = ResponseCache(10 ** 9)
+        university = FakeUniversity()
+
+        first = cache.getTerm(university, "1", university.snapshot)
+        second = cache.getTerm(university, "1", university.snapshot)
+
+        self.assertIs(first, second)
+        self.assertEqual(university.reads, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def testConcurrentMissesAreCoalesced(self):
+        cache = ResponseCache(10 ** 9)
+        university = FakeUniversity()
+        university.release = Event()
+        results = []
+
+        threads = [Thread(target=lambda: results.append(cache.getTerm(university, "1", university.snapshot)))
+                   for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        university.release.set()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(university.reads, 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def testNothingIsBuiltWhileTheDBIsUnreadable(self):
+        cache = ResponseCache(10 ** 9)
+        university = FakeUniversity()
+        university.readable = False
+
+        self.assertFalse(cache.getTerm(university, "1", university.snapshot))
+        self.assertEqual(university.reads, 0)
+
+    def testLeastRecentlyUsedTermsAreEvicted(self):
+        terms = {term: makeTerm() for term in ["1", "2", "3"]}
+        size = CachedTerm("X", "1", 1, terms["1"]).size
+        cache = ResponseCache(size * 2)
+
+        for term in ["1", "2"]:
+            cache.put(("X", term, 1), CachedTerm("X", term, 1, terms[term]))
+
+        # Using term 1 makes term 2 the least recently used one
+        cache.get(("X", "1", 1))
+        cache.put(("X", "3", 1), CachedTerm("X", "3", 1, terms["3"]))
+
+        self.assertEqual(sorted(key[1] for key in cache.entries), ["1", "3"])
+        self.assertEqual(cache.size, size * 2)
+
+    def testPinnedAndRetainedTermsAreKept(self):
+        term = makeTerm()
+        size = CachedTerm("X", "1", 1, term).size
+        cache = ResponseCache(size)
+
+        cache.pin("X")
+        cache.retain("Y")
+        cache.put(("X", "1", 1), CachedTerm("X", "1", 1, term))
+        cache.put(("Y", "1", 1), CachedTerm("Y", "1", 1, term))
+        cache.put(("Z", "1", 1), CachedTerm("Z", "1", 1, term))
+
+        self.assertEqual(sorted(key[0] for key in cache.entries), ["X", "Y", "Z"])
+
+        # Once unpinned, the term can be evicted again
+        cache.unpin("X")
+
+        self.assertEqual(sorted(key[0] for key in cache.entries), ["Y", "Z"])
+
+    def testPublishSwapsTheSnapshot(self):
+        cache = ResponseCache(10 ** 9)
+        university = FakeUniversity()
+        old = university.snapshot
+
+        cache.getTerm(university, "1", old)
+
+        university.terms["1"] = makeTerm("Closed")
+        snapshot = university.makeSnapshot(2)
+        staging = cache.stage(university, snapshot)
+
+        # Readers keep getting the old generation until it is published
+        self.assertIs(university.snapshot, old)
+        self.assertIn(("X", "1", 1), cache.entries)
+
+        cache.publish(university, snapshot, staging)
+
+        self.assertIs(university.snapshot, snapshot)
+        self.assertEqual(list(cache.entries), [("X", "1", 2)])
+        self.assertIs(cache.getTerm(university, "1", snapshot), staging["terms"]["1"])
+
+
+class EncodingTest(unittest.TestCase):
+    """
+        Responses are pre-compressed and the variant is picked from the Accept-Encoding header
+    """
+    def testNoHeaderGetsIdentity(self):
+        self.assertEqual(negotiateEncoding(None, ["identity", "gzip"]), "identity")
+        self.assertEqual(negotiateEncoding("", ["identity", "gzip"]), "identity")
+
+    def testAcceptedCodingIsPicked(self):
+        self.assertEqual(negotiateEncoding("deflate, gzip", ["identity", "gzip"]), "gzip")
+        self.assertEqual(negotiateEncoding("*", ["identity", "gzip"]), "gzip")
+        self.assertEqual(negotiateEncoding("GZIP;q=0.5", ["identity", "gzip"]), "gzip")
+
+    def testRefusedOrUnavailableCodingIsNotPicked(self):
+        self.assertEqual(negotiateEncoding("gzip;q=0", ["identity", "gzip"]), "identity")
+        self.assertEqual(negotiateEncoding("*, gzip;q=0", ["identity", "gzip"]), "identity")
+        self.assertEqual(negotiateEncoding("gzip;q=bad", ["identity", "gzip"]), "identity")
+        self.assertEqual(negotiateEncoding("gzip", ["identity"]), "identity")
+
+    def testVariantsDecompressToTheBody(self):
+        body = b'{"classes": ' + b"0, " * minCompressSize + b"}"
+        response = CachedResponse(body, "W/etag")
+
+        self.assertIn("gzip", response.variants)
+        self.assertEqual(gzip.decompress(response.variants["gzip"]), body)
+        self.assertEqual(response.size, sum(len(variant) for variant in response.variants.values()))
+
+    def testSmallBodiesAreNotCompressed(self):
+        response = CachedResponse(b"{}", "W/etag")
+
+        self.assertEqual(response.variants, {"identity": b"{}"})
+
+    def testStreamIsCompressed(self):
+        chunks = [b"a" * 100, b"b" * 100, b"c"]
+
+        self.assertEqual(gzip.decompress(b"".join(compressStream(iter(chunks), "gzip"))), b"".join(chunks))
+        self.assertEqual(list(compressStream(iter(chunks), "identity")), chunks)
+
+
+
+class SubResourceTest(unittest.TestCase):
+    """
+        Every subject and course of a term is served as its own response
+    """
+    def testResourcesOfEverySubjectAndCourse(self):
+        term = CachedTerm("X", "1", 1, makeTerm())
+
+        self.assertEqual(sorted(term.resources), [(), ("subjects",), ("subjects", "CPSC"),
+                                                  ("subjects", "CPSC", "231")])
+
+    def testFacultiesAreFlattened(self):
+        course = makeTerm()["classes"]["CPSC"]
+        subjects = flattenSubjects({"Science": {"CPSC": course, "MATH": course}, "Arts": {"ART": course}})
+
+        self.assertEqual(sorted(subjects), ["ART", "CPSC", "MATH"])
+        self.assertEqual(flattenSubjects({"CPSC": course}), {"CPSC": course})
+
+    def testRatingsAreFilteredToTheTeachers(self):
+        course = {"classes": [{"teachers": ["Jane Doe", "Staff"]}]}
+
+        self.assertEqual(filterRMP({"Jane Doe": 1, "John Roe": 2}, [course]), {"Jane Doe": 1})
+
+    def testUnchangedSubResourcesKeepTheirETags(self):
+        old = CachedTerm("X", "1", 1, makeTerm())
+        same = CachedTerm("X", "1", 2, makeTerm())
+        changed = CachedTerm("X", "1", 2, makeTerm("Closed"))
+
+        for path in [("subjects",), ("subjects", "CPSC"), ("subjects", "CPSC", "231")]:
+            self.assertEqual(old.resources[path].etag, same.resources[path].etag)
+
+        self.assertNotEqual(old.resources[("subjects", "CPSC")].etag, changed.resources[("subjects", "CPSC")].etag)
+        self.assertEqual(old.resources[("subjects",)].etag, changed.resources[("subjects",)].etag)
+
+        # /all is checked before the term is built, so it keeps the generation based ETag
+        self.assertEqual(same.resources[()].etag, termETag("X", "1", 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
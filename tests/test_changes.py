@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import unittest
+from changes import ChangeLog
+
+
+# classes maps class ids to their status
+def makeTerm(classes):
+    return {"classes": {"CPSC": {"231": {"classes": [{"id": classid, "status": classes[classid], "teachers": []}
+                                                     for classid in sorted(classes)]},
+                                 "description": False}},
+            "rmp": {}}
+
+
+class ChangeLogTest(unittest.TestCase):
+    """
+        The changes of consecutive generations are merged into the changes since a client's generation
+    """
+    def setUp(self):
+        self.changelog = ChangeLog(3)
+
+    def publish(self, generation, classes):
+        self.changelog.commit("X", "1", self.changelog.diff("X", "1", generation, makeTerm(classes)))
+
+    def ids(self, changes, kind):
+        return sorted(entry["class"]["id"] for entry in changes[kind])
+
+    def testUnknownTermMustBeRefetched(self):
+        self.assertFalse(self.changelog.getChanges("X", "1", 1))
+
+    def testCurrentGenerationHasNoChanges(self):
+        self.publish(1, {1: "Open"})
+
+        self.assertEqual(self.changelog.getChanges("X", "1", 1),
+                         {"since": 1, "generation": 1, "inserted": [], "updated": [], "removed": []})
+
+    def testSingleGeneration(self):
+        self.publish(1, {1: "Open", 2: "Open"})
+        self.publish(2, {2: "Closed", 3: "Open"})
+
+        changes = self.changelog.getChanges("X", "1", 1)
+
+        self.assertEqual(changes["generation"], 2)
+        self.assertEqual(self.ids(changes, "inserted"), [3])
+        self.assertEqual(self.ids(changes, "updated"), [2])
+        self.assertEqual(changes["removed"], ["1"])
+        self.assertEqual(changes["updated"][0], {"subject": "CPSC", "coursenum": "231",
+                                                 "class": {"id": 2, "status": "Closed", "teachers": []}})
+
+    def testChangesAreMerged(self):
+        self.publish(1, {1: "Open", 2: "Open"})
+        self.publish(2, {1: "Closed", 3: "Open", 4: "Open"})
+        self.publish(3, {1: "Closed", 2: "Open", 3: "Closed"})
+
+        changes = self.changelog.getChanges("X", "1", 1)
+
+        # 3 was inserted then updated, 4 inserted then removed, 2 removed then inserted again
+        self.assertEqual(self.ids(changes, "inserted"), [3])
+        self.assertEqual(changes["inserted"][0]["class"]["status"], "Closed")
+        self.assertEqual(self.ids(changes, "updated"), [1, 2])
+        self.assertEqual(changes["removed"], [])
+
+        changes = self.changelog.getChanges("X", "1", 2)
+
+        self.assertEqual(self.ids(changes, "inserted"), [2])
+        self.assertEqual(self.ids(changes, "updated"), [3])
+        self.assertEqual(changes["removed"], ["4"])
+
+    def testUpdatedThenRemovedIsRemoved(self):
+        self.publish(1, {1: "Open"})
+        self.publish(2, {1: "Closed"})
+        self.publish(3, {})
+
+        changes = self.changelog.getChanges("X", "1", 1)
+
+        self.assertEqual(changes["updated"], [])
+        self.assertEqual(changes["removed"], ["1"])
+
+    def testOldGenerationsMustBeRefetched(self):
+        for generation in range(1, 6):
+            self.publish(generation, {1: str(generation)})
+
+        # Only the last 3 changes are kept
+        self.assertFalse(self.changelog.getChanges("X", "1", 1))
+        self.assertFalse(self.changelog.getChanges("X", "1", 7))
+        self.assertEqual(self.ids(self.changelog.getChanges("X", "1", 2), "updated"), [1])
+
+    def testRepublishingKeepsTheHistory(self):
+        self.publish(1, {1: "Open"})
+        self.publish(2, {1: "Closed"})
+        self.publish(2, {1: "Closed"})
+
+        self.assertEqual(self.ids(self.changelog.getChanges("X", "1", 1), "updated"), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import json
+import unittest
+from filters import ClassIndex, toBitset, fromBitset
+
+
+def makeClass(id, status, type, teachers, times, location="Main"):
+    return {"id": id, "status": status, "type": type, "teachers": teachers, "times": times, "location": location}
+
+
+subjects = {
+    "CPSC": {
+        "231": {"classes": [makeClass(1, "Open", "LEC", ["Jane Doe"], ["MWF 9:00AM - 9:50AM"]),
+                            makeClass(2, "Full", "TUT", ["Staff"], ["TR 2:00PM - 2:50PM"])]},
+        "description": {"name": "Computer Science"}
+    },
+    "MATH": {
+        "211": {"classes": [makeClass(3, "Open", "LEC", ["Jane Doe", "John Roe"], ["TR 9:00AM - 10:15AM"],
+                                      "Online"),
+                            makeClass(4, "Wait List", "LAB", ["John Roe"], ["TBA"])]}
+    }
+}
+
+
+class ClassIndexTest(unittest.TestCase):
+    """
+        Filtered class queries answered from the bitset indexes
+    """
+    def setUp(self):
+        self.index = ClassIndex(subjects)
+
+    def ids(self, matches):
+        return sorted(json.loads(match.decode('utf-8'))["class"]["id"] for match in matches)
+
+    def testBitsetRoundTrip(self):
+        self.assertEqual(fromBitset(toBitset([0, 3, 9, 64], 70)), [0, 3, 9, 64])
+        self.assertEqual(fromBitset(0), [])
+
+    def testNoFiltersMatchEveryClass(self):
+        self.assertEqual(self.ids(self.index.query({})), [1, 2, 3, 4])
+
+    def testMatchesAreEncodedWithTheirCourse(self):
+        match = json.loads(self.index.query({"type": ["TUT"]})[0].decode('utf-8'))
+
+        self.assertEqual(match, {"subject": "CPSC", "coursenum": "231", "class": subjects["CPSC"]["231"]["classes"][1]})
+
+    def testValuesOfAFilterAreAlternatives(self):
+        self.assertEqual(self.ids(self.index.query({"status": ["open", "WAIT LIST"]})), [1, 3, 4])
+
+    def testFiltersAreCombined(self):
+        self.assertEqual(self.ids(self.index.query({"teacher": ["jane doe"], "subject": ["math"]})), [3])
+        self.assertEqual(self.ids(self.index.query({"location": ["online"], "type": ["LAB"]})), [])
+
+    def testUnknownValuesMatchNothing(self):
+        self.assertEqual(self.index.query({"status": ["Cancelled"]}), [])
+
+    def testDaysExcludeClassesMeetingOnOtherDays(self):
+        self.assertEqual(self.ids(self.index.query({}, "TR")), [2, 3, 4])
+        self.assertEqual(self.ids(self.index.query({"type": ["LEC"]}, "MTWRF")), [1, 3])
+
+        # Classes without parsable times don't meet on any day
+        self.assertEqual(self.ids(self.index.query({}, "")), [4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import unittest
+from itertools import product
+from time import time
+from generator import CompiledCourse, generateSchedules, scoreSchedule, parseClock, parseTime, minutesPerDay
+
+
+def makeClass(id, type, group, times, teachers=()):
+    return {"id": id, "type": type, "group": group, "times": times, "teachers": list(teachers)}
+
+
+# The group example of the README: LEC and TUT are compatible, LEC2 is compatible with TUT and TUT2
+cpsc301 = {"classes": [
+    makeClass("LEC", "LEC", ["1", "2"], ["MWF 9:00AM - 9:50AM"], ["Jane Doe"]),
+    makeClass("LEC2", "LEC", ["2", "3"], ["MWF 11:00AM - 11:50AM"], ["John Roe"]),
+    makeClass("TUT", "TUT", ["2"], ["TR 9:00AM - 9:50AM"]),
+    makeClass("TUT2", "TUT", ["3"], ["TR 2:00PM - 2:50PM"])
+]}
+
+rmp = {"Jane Doe": {"rating": 2.0}, "John Roe": {"rating": 5.0}}
+
+noPreferences = {"rmp": 0, "gaps": 0, "early": 0, "earliest": 8 * 60}
+
+
+class GeneratorTest(unittest.TestCase):
+    """
+        Schedule generation for small known courses
+    """
+    def testParseTime(self):
+        mask = parseTime("TR 9:00AM - 9:50AM")
+
+        # 50 minutes on both Tuesday and Thursday
+        self.assertEqual(bin(mask).count("1"), 100)
+        self.assertTrue(mask >> (1 * minutesPerDay + 9 * 60) & 1)
+        self.assertFalse(parseTime("TBA"))
+
+    def testParseClock(self):
+        self.assertEqual(parseClock("12:00AM"), 0)
+        self.assertEqual(parseClock("12:30PM"), 12 * 60 + 30)
+        self.assertFalse(parseClock("noon"))
+
+    def testCompatibleOptions(self):
+        course = CompiledCourse("CPSC", "301", cpsc301, rmp)
+        options = sorted(sorted(option["ids"]) for option in course.options)
+
+        self.assertEqual(options, [["LEC", "TUT"], ["LEC2", "TUT"], ["LEC2", "TUT2"]])
+
+    def testGroupsArePairwise(self):
+        # Every two classes share a group, but no group is shared by all three
+        course = CompiledCourse("MATH", "211", {"classes": [
+            makeClass(1, "LEC", ["1", "2"], []),
+            makeClass(2, "TUT", ["2", "3"], []),
+            makeClass(3, "LAB", ["1", "3"], [])
+        ]}, {})
+
+        self.assertEqual([sorted(option["ids"]) for option in course.options], [[1, 2, 3]])
+
+    def testStringGroups(self):
+        # Group "12" is a single group, it isn't compatible with groups "1" or "2"
+        course = CompiledCourse("CPSC", "231", {"classes": [
+            makeClass("LEC12", "LEC", "12", []),
+            makeClass("LEC1", "LEC", "1", []),
+            makeClass("TUT1", "TUT", "1", []),
+            makeClass("TUT2", "TUT", ["2"], []),
+            makeClass("TUT12", "TUT", ["12"], [])
+        ]}, {})
+
+        self.assertEqual(sorted(sorted(option["ids"]) for option in course.options),
+                         [["LEC1", "TUT1"], ["LEC12", "TUT12"]])
+
+    def testConflictingClassesAreSkipped(self):
+        course = CompiledCourse("MATH", "211", {"classes": [
+            makeClass(1, "LEC", ["1"], ["MWF 9:00AM - 9:50AM"]),
+            makeClass(2, "TUT", ["1"], ["M 9:30AM - 10:20AM"]),
+            makeClass(3, "TUT", ["1"], ["T 9:30AM - 10:20AM"])
+        ]}, {})
+
+        self.assertEqual([sorted(option["ids"]) for option in course.options], [[1, 3]])
+
+    def testSchedulesAvoidConflicts(self):
+        cpsc = CompiledCourse("CPSC", "301", cpsc301, rmp)
+
+        # Only fits next to LEC2 and TUT2
+        math = CompiledCourse("MATH", "211", {"classes": [
+            makeClass("M1", "LEC", ["1"], ["MWF 9:00AM - 9:50AM", "TR 9:00AM - 9:50AM"])
+        ]}, {})
+
+        result = generateSchedules([cpsc, math], noPreferences, 10, 1000)
+
+        self.assertTrue(result["complete"])
+        self.assertEqual(len(result["schedules"]), 1)
+
+        classes = {course["subject"]: sorted(course["classes"]) for course in result["schedules"][0]["courses"]}
+        self.assertEqual(classes, {"CPSC": ["LEC2", "TUT2"], "MATH": ["M1"]})
+
+    def testRatingsRankSchedules(self):
+        cpsc = CompiledCourse("CPSC", "301", cpsc301, rmp)
+        preferences = dict(noPreferences, rmp=1)
+
+        result = generateSchedules([cpsc], preferences, 3, 1000)
+        scores = [schedule["score"] for schedule in result["schedules"]]
+
+        self.assertEqual(len(scores), 3)
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertIn("LEC2", result["schedules"][0]["courses"][0]["classes"])
+
+    def testEarlyClassesArePenalized(self):
+        course = CompiledCourse("CPSC", "231", {"classes": [
+            makeClass("EARLY", "LEC", ["1"], ["M 7:00AM - 7:50AM"]),
+            makeClass("LATE", "LEC", ["1"], ["M 10:00AM - 10:50AM"])
+        ]}, {})
+
+        result = generateSchedules([course], dict(noPreferences, early=1), 1, 1000)
+
+        self.assertEqual(result["schedules"][0]["courses"][0]["classes"], ["LATE"])
+
+    def testSearchLimit(self):
+        course = CompiledCourse("CPSC", "301", cpsc301, rmp)
+
+        self.assertFalse(generateSchedules([course], noPreferences, 10, 0)["complete"])
+
+    def manyOptions(self, subject, hours):
+        # One lecture and many tutorials, every combination that doesn't conflict is an option
+        classes = [makeClass(subject + "-LEC", "LEC", ["1"], ["MWF " + hours[0] + " - " + hours[1]], ["Jane Doe"])]
+
+        for hour in range(8, 20):
+            for days in ["M", "T", "W", "R", "F"]:
+                meridiem = "AM" if hour < 12 else "PM"
+                clock = str((hour - 1) % 12 + 1)
+                classes.append(makeClass(subject + "-" + days + str(hour), "TUT", ["1"],
+                                         [days + " " + clock + ":00" + meridiem + " - " + clock + ":50" + meridiem]))
+
+        return CompiledCourse(subject, "100", {"classes": classes}, rmp)
+
+    def testPruningKeepsTheBestSchedules(self):
+        courses = [self.manyOptions("A", ("9:00AM", "9:50AM")), self.manyOptions("B", ("1:00PM", "1:50PM"))]
+        preferences = {"rmp": 1, "gaps": 1, "early": 0.5, "earliest": 10 * 60}
+
+        # Score every combination
+        scores = []
+
+        for first, second in product(courses[0].options, courses[1].options):
+            if not first["mask"] & second["mask"]:
+                scores.append(scoreSchedule(first["mask"] | second["mask"], first["ratingSum"] + second["ratingSum"],
+                                            first["ratingCount"] + second["ratingCount"], preferences))
+
+        result = generateSchedules(courses, preferences, 5, 10 ** 6)
+
+        self.assertTrue(result["complete"])
+        self.assertEqual([schedule["score"] for schedule in result["schedules"]], sorted(scores, reverse=True)[:5])
+
+    def testSearchTimeout(self):
+        hours = [("8:00AM", "8:50AM"), ("9:00AM", "9:50AM"), ("10:00AM", "10:50AM"), ("11:00AM", "11:50AM"),
+                 ("1:00PM", "1:50PM"), ("2:00PM", "2:50PM")]
+        courses = [self.manyOptions(subject, hour) for subject, hour in zip("ABCDEF", hours)]
+        preferences = {"rmp": 0, "gaps": -1, "early": 1, "earliest": 10 * 60}
+
+        start = time()
+        result = generateSchedules(courses, preferences, 10, 10 ** 9, 0.2)
+
+        self.assertLess(time() - start, 2)
+        self.assertFalse(result["complete"])
+        self.assertEqual(len(result["schedules"]), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import copy
+import unittest
+from search import TermSearchIndex, SearchIndexes, tokenize
+
+
+def makeTerm():
+    return {"classes": {
+        "CPSC": {
+            "231": {"classes": [{"id": 1, "teachers": ["Jane Doe"]}],
+                    "description": {"name": "Introduction to Computer Science I", "desc": "Programming in Python"}},
+            "331": {"classes": [{"id": 2, "teachers": ["Staff"]}],
+                    "description": {"name": "Data Structures", "desc": "Introduction to algorithm analysis"}},
+            "description": {"name": "Computer Science"}
+        },
+        "MATH": {
+            "211": {"classes": [{"id": 3, "teachers": ["John Roe", "Jane Doe"]}],
+                    "description": {"name": "Linear Methods I"}},
+            "description": {"name": "Mathematics"}
+        }
+    }, "rmp": {}}
+
+
+class SearchTest(unittest.TestCase):
+    """
+        Prefix search over the subjects, courses and teachers of a term
+    """
+    def setUp(self):
+        self.index = TermSearchIndex(makeTerm())
+
+    def names(self, query, limit=10):
+        return [(result["type"], result.get("subject", ""), result.get("coursenum", result.get("name")))
+                for result in self.index.search(query, limit)]
+
+    def testTokenize(self):
+        self.assertEqual(tokenize("CPSC 231: Intro-Programming"), ["cpsc", "231", "intro", "programming"])
+        self.assertEqual(tokenize(None), [])
+
+    def testCourseCodePrefix(self):
+        self.assertEqual(self.names("cpsc 23"), [("course", "CPSC", "231")])
+        self.assertEqual(self.names("CPSC231"), [("course", "CPSC", "231")])
+
+    def testEveryTokenMustMatch(self):
+        self.assertEqual(self.names("intro zzz"), [])
+        self.assertEqual(self.names(""), [])
+
+    def testCodesRankAboveDescriptions(self):
+        # "introduction" is in the name of CPSC 231 but only in the description of CPSC 331
+        self.assertEqual(self.names("introduction"), [("course", "CPSC", "231"), ("course", "CPSC", "331")])
+
+    def testSubjectsRankAboveTheirCoursesOnTies(self):
+        self.assertEqual(self.names("math")[0], ("subject", "MATH", "Mathematics"))
+
+    def testTeachers(self):
+        results = self.index.search("jane", 10)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["name"], "Jane Doe")
+        self.assertEqual(results[0]["courses"], ["CPSC 231", "MATH 211"])
+        self.assertEqual(self.index.search("staff", 10), [])
+
+    def testLimit(self):
+        self.assertEqual(len(self.index.search("i", 2)), 2)
+
+    def testUnchangedSubjectsAreReused(self):
+        termdata = makeTerm()
+        termdata["classes"]["MATH"]["211"]["description"]["name"] = "Calculus"
+
+        index = TermSearchIndex(termdata, self.index)
+
+        self.assertIs(index.segments[("subject", "CPSC")], self.index.segments[("subject", "CPSC")])
+        self.assertIsNot(index.segments[("subject", "MATH")], self.index.segments[("subject", "MATH")])
+
+        # The derived postings equal those of an index built from scratch, and the previous index is unchanged
+        self.assertEqual(index.postings, TermSearchIndex(copy.deepcopy(termdata)).postings)
+        self.assertEqual([result["coursenum"] for result in index.search("calculus", 10)], ["211"])
+        self.assertEqual(self.index.search("calculus", 10), [])
+        self.assertEqual([result["coursenum"] for result in self.index.search("linear", 10)], ["211"])
+
+    def testIndexesArePublishedOnCommit(self):
+        indexes = SearchIndexes()
+        index = indexes.build("X", "1", makeTerm())
+
+        self.assertFalse(indexes.get("X", "1"))
+
+        indexes.commit("X", "1", index)
+
+        self.assertIs(indexes.get("X", "1"), index)
+        self.assertIs(indexes.build("X", "1", makeTerm()).postings, index.postings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import sys
+import socket
+import unittest
+from http.client import HTTPConnection
+from threading import Thread
+from server import PooledWSGIServer
+
+# The asyncio server requires Python 3.7+
+if sys.version_info >= (3, 7):
+    from asyncserver import AsyncWSGIServer
+else:
+    AsyncWSGIServer = None
+
+
+def app(environ, start_response):
+    path = environ["PATH_INFO"]
+
+    if path == "/stream":
+        # Streamed bodies don't have a Content-Length
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return (chunk for chunk in [b"first ", b"second"])
+
+    if path == "/cached":
+        start_response("304 Not Modified", [("ETag", "W/1")])
+        return []
+
+    if path == "/echo":
+        body = environ["wsgi.input"].read(int(environ.get("CONTENT_LENGTH") or 0))
+    else:
+        body = path.encode("utf-8")
+
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+class ServerTests():
+    """
+        Behaviour that every server mode must have, the subclasses start a server on self.port
+    """
+    def request(self, connection, method, path, body=None):
+        connection.request(method, path, body)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def testConnectionsAreReused(self):
+        connection = HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        self.assertEqual(self.request(connection, "GET", "/first"), (200, b"/first"))
+        socket = connection.sock
+
+        self.assertEqual(self.request(connection, "GET", "/second"), (200, b"/second"))
+        self.assertIs(connection.sock, socket)
+
+        connection.close()
+
+    def testStreamedBodiesCloseTheConnection(self):
+        connection = HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        self.assertEqual(self.request(connection, "GET", "/stream"), (200, b"first second"))
+        self.assertIsNone(connection.sock)
+
+        connection.close()
+
+    def testResponsesWithoutBodies(self):
+        connection = HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        self.assertEqual(self.request(connection, "GET", "/cached"), (304, b""))
+        self.assertEqual(self.request(connection, "HEAD", "/head"), (200, b""))
+
+        # The connection is still usable after responses that have no body
+        self.assertEqual(self.request(connection, "GET", "/after"), (200, b"/after"))
+
+        connection.close()
+
+    def testRequestBody(self):
+        connection = HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        self.assertEqual(self.request(connection, "POST", "/echo", b'{"courses": []}'), (200, b'{"courses": []}'))
+
+        connection.close()
+
+    def testConnectionCloseIsHonoured(self):
+        connection = HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+        connection.request("GET", "/close", headers={"Connection": "close"})
+        response = connection.getresponse()
+
+        self.assertEqual(response.read(), b"/close")
+
+        # The server closes its end once the response was sent
+        self.assertEqual(connection.sock.recv(1) if connection.sock else b"", b"")
+
+        connection.close()
+
+
+class PooledServerTest(ServerTests, unittest.TestCase):
+    """
+        Pool of worker threads with keep-alive
+    """
+    def setUp(self):
+        self.httpd = PooledWSGIServer(("127.0.0.1", 0), 4, 16, 5, 5)
+        self.httpd.set_app(app)
+        self.port = self.httpd.server_address[1]
+
+        self.thread = Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd.pool.shutdown()
+
+
+
+@unittest.skipIf(AsyncWSGIServer is None, "the asyncio server requires Python 3.7+")
+class AsyncServerTest(ServerTests, unittest.TestCase):
+    """
+        Event loop that writes the responses while the app runs on executor threads
+    """
+    def setUp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+
+        # Listen right away so the tests can connect before the event loop has started
+        sock.listen(16)
+
+        # The event loop runs until the process exits
+        httpd = AsyncWSGIServer(app, 4, 5, 5)
+        Thread(target=httpd.serve_forever, args=(sock, 16), daemon=True).start()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import unittest
+from teachers import TeacherIndex
+
+
+def makeClass(id, term, teachers, subject="CPSC", coursenum="231"):
+    return {"id": id, "term": term, "teachers": teachers, "subject": subject, "coursenum": coursenum, "uni": "X",
+            "type": "LEC", "_id": "a", "lastModified": "yesterday"}
+
+
+class FakeUniversity():
+    """
+        University that serves fixed classes and records which terms were loaded
+    """
+    def __init__(self, classes, rmpid=True):
+        self.settings = {"uniID": "X"}
+        self.classes = classes
+        self.loaded = []
+
+        if rmpid:
+            self.settings["rmpid"] = 1
+
+    def getClasses(self, snapshot=None, terms=None):
+        self.loaded.append(terms)
+        return [classobj for classobj in self.classes if classobj["term"] in terms]
+
+    def matchRMPNames(self, teachers):
+        return {teacher: {"rating": 4.5} for teacher in teachers if teacher == "Jane Doe"}
+
+
+class TeacherIndexTest(unittest.TestCase):
+    """
+        Classes of every teacher across the enabled terms of a university
+    """
+    def setUp(self):
+        self.university = FakeUniversity([makeClass(1, "1", ["Jane Doe"]),
+                                          makeClass(2, "1", ["Jane Doe", "John Roe"], "MATH", "211"),
+                                          makeClass(3, "2", ["Jane Doe", "Staff"]),
+                                          makeClass(4, "3", ["John Roe"])])
+        self.index = TeacherIndex()
+
+    def publish(self, terms):
+        self.index.commit("X", self.index.stage(self.university, {"terms": terms}))
+
+    def testUnpublishedUniversity(self):
+        self.assertIsNone(self.index.get("X", "Jane Doe"))
+
+        self.publish(["1"])
+
+        self.assertFalse(self.index.get("X", "Nobody"))
+
+    def testClassesAreGroupedByTerm(self):
+        self.publish(["1", "2"])
+
+        teacher = self.index.get("X", "jane DOE")
+
+        self.assertEqual(teacher["name"], "Jane Doe")
+        self.assertEqual(teacher["rmp"], {"rating": 4.5})
+        self.assertEqual(sorted(teacher["terms"]), ["1", "2"])
+        self.assertEqual([(entry["subject"], entry["class"]["id"]) for entry in teacher["terms"]["1"]],
+                         [("CPSC", 1), ("MATH", 2)])
+        self.assertEqual(teacher["terms"]["2"][0], {"subject": "CPSC", "coursenum": "231",
+                                                    "class": {"id": 3, "teachers": ["Jane Doe", "Staff"],
+                                                              "type": "LEC"}})
+
+        self.assertFalse(self.index.get("X", "Staff"))
+        self.assertFalse(self.index.get("X", "John Roe")["rmp"])
+
+    def testTermsAreLoadedOnce(self):
+        self.publish(["1"])
+        self.publish(["1", "3"])
+
+        self.assertEqual(self.university.loaded, [["1"], ["3"]])
+        self.assertEqual(sorted(self.index.get("X", "John Roe")["terms"]), ["1", "3"])
+
+    def testDisabledTermsAreDropped(self):
+        self.publish(["1", "3"])
+        self.publish(["3"])
+
+        self.assertFalse(self.index.get("X", "Jane Doe"))
+        self.assertEqual(sorted(self.index.get("X", "John Roe")["terms"]), ["3"])
+
+    def testScrapedClassesArePublishedOnCommit(self):
+        self.publish(["1"])
+
+        # The scrape moved class 1 to another teacher
+        self.index.updateClass("X", makeClass(1, "1", ["John Roe"]))
+
+        self.assertEqual(len(self.index.get("X", "Jane Doe")["terms"]["1"]), 2)
+
+        self.publish(["1"])
+
+        self.assertEqual([entry["class"]["id"] for entry in self.index.get("X", "Jane Doe")["terms"]["1"]], [2])
+        self.assertEqual([entry["class"]["id"] for entry in self.index.get("X", "John Roe")["terms"]["1"]], [1, 2])
+
+    def testInvalidatedUniversityIsLoadedAgain(self):
+        self.publish(["1"])
+        self.index.invalidate("X")
+        self.publish(["1"])
+
+        self.assertEqual(self.university.loaded, [["1"], ["1"]])
+
+    def testRatingsNeedAnRMPID(self):
+        self.university = FakeUniversity(self.university.classes, rmpid=False)
+        self.publish(["1"])
+
+        self.assertFalse(self.index.get("X", "Jane Doe")["rmp"])
+
+
+if __name__ == '__main__':
+    unittest.main()
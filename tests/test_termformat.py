@@ -0,0 +1,73 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import unittest
+from termformat import encodeTerm, decodeTerm
+
+
+class TermFormatTest(unittest.TestCase):
+    """
+        Round trips of getSubjectListAll responses through the columnar binary format
+    """
+    def roundTrip(self, termdata):
+        self.assertEqual(decodeTerm(encodeTerm(termdata)), termdata)
+
+    def testEmptyTerm(self):
+        self.roundTrip({"classes": {}, "rmp": {}})
+
+    def testMixedAndMissingKeys(self):
+        classes = [
+            {"id": 10001, "group": ["1"], "location": "Main", "rooms": ["ST 140"], "status": "Open",
+             "teachers": ["Jane Doe"], "times": ["MWF 9:00AM - 9:50AM"], "type": "LEC"},
+            # No location and an extra key
+            {"id": "10002", "group": ["1", "2"], "rooms": [], "status": "Closed", "teachers": [],
+             "times": [], "type": "TUT", "section": "T01"},
+            # Keys whose type differs from the other classes
+            {"id": -3, "group": [], "location": None, "rooms": "TBA", "status": True, "teachers": ["Staff"],
+             "times": ["TBA"], "type": "LAB", "section": 2}
+        ]
+
+        self.roundTrip({
+            "classes": {
+                "CPSC": {
+                    "231": {"classes": classes, "description": {"name": "Intro", "units": 3.0}},
+                    "233": {"classes": classes[:1], "description": False},
+                    "description": {"name": "Computer Science"}
+                }
+            },
+            "rmp": {"Jane Doe": {"id": 42, "rating": 4.5, "difficulty": -0.25}}
+        })
+
+    def testFacultyGroupedTerm(self):
+        self.roundTrip({
+            "classes": {
+                "Science": {
+                    "MATH": {
+                        "211": {"classes": [{"id": 1, "group": ["1"], "teachers": [], "times": [], "type": "LEC",
+                                             "enrolled": 120, "waitlist": -1, "credits": 0.5}],
+                                "description": False},
+                        "description": {"faculty": "Science"}
+                    }
+                }
+            },
+            "rmp": {}
+        })
+
+    def testLargeIntegers(self):
+        classes = [{"id": value, "group": ["1"], "teachers": [], "times": [], "type": "LEC"}
+                   for value in [0, 1, -1, 127, 128, -129, 2 ** 31, -2 ** 40, 2 ** 62]]
+
+        self.roundTrip({"classes": {"A": {"1": {"classes": classes, "description": False}}}, "rmp": {}})
+
+    def testRejectsOtherData(self):
+        with self.assertRaises(ValueError):
+            decodeTerm(b"{}")
+
+
+if __name__ == '__main__':
+    unittest.main()
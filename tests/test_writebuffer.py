@@ -0,0 +1,101 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import logging
+import unittest
+
+try:
+    from uni.WriteBuffer import WriteBuffer
+except ImportError:
+    WriteBuffer = None
+
+
+class FakeCollection():
+    """
+        Collection that serves stored documents and records the bulk writes made to it
+    """
+    name = "ClassList"
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.finds = 0
+        self.writes = []
+
+    def find(self, query, projection=None):
+        self.finds += 1
+
+        return [dict(document) for document in self.documents
+                if all(document.get(field) == query[field] for field in query)]
+
+    def bulk_write(self, requests, ordered=True):
+        self.writes.append(len(requests))
+
+
+@unittest.skipIf(WriteBuffer is None, "pymongo isn't installed")
+class WriteBufferTest(unittest.TestCase):
+    """
+        Upserts that wouldn't change the stored documents are skipped
+    """
+    def setUp(self):
+        self.stored = {"id": 1, "term": "1", "uni": "X", "status": "Open", "_id": "a", "lastModified": "yesterday"}
+        self.collection = FakeCollection([dict(self.stored)])
+        self.buffer = WriteBuffer(self.collection, ["id", "term", "uni"], ["uni", "term"], 100,
+                                  logging.getLogger("test"))
+
+    def document(self, **fields):
+        document = {"id": 1, "term": "1", "uni": "X", "status": "Open"}
+        document.update(fields)
+        return document
+
+    def testUnchangedDocumentIsSkipped(self):
+        self.buffer.upsert(self.document())
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.collection.writes, [])
+        self.assertEqual(self.buffer.resetStats(), {"inserted": 0, "updated": 0, "unchanged": 1, "deleted": 0})
+
+    def testChangedAndNewDocumentsAreWritten(self):
+        self.buffer.upsert(self.document(status="Closed"))
+        self.buffer.upsert(self.document(id=2))
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.collection.writes, [2])
+        self.assertEqual(self.buffer.resetStats(), {"inserted": 1, "updated": 1, "unchanged": 0, "deleted": 0})
+
+        # The written content is remembered, so the next scrape of the same documents writes nothing
+        self.buffer.upsert(self.document(status="Closed"))
+        self.buffer.upsert(self.document(id=2))
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.resetStats()["unchanged"], 2)
+
+    def testFingerprintsAreLoadedOncePerScope(self):
+        self.buffer.upsert(self.document())
+        self.buffer.upsert(self.document(id=2))
+        self.buffer.upsert(self.document(term="2"))
+
+        self.assertEqual(self.collection.finds, 2)
+
+    def testPendingUpsertsAreMerged(self):
+        self.buffer.upsert(self.document(status="Closed"))
+        self.buffer.upsert(self.document(status="Open", rooms=["ST 140"]))
+
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def testForgottenFingerprintsAreWrittenAgain(self):
+        self.buffer.upsert(self.document())
+
+        # ex. the document's last write failed
+        self.buffer.forgetFingerprints([(1, "1", "X")])
+        self.buffer.upsert(self.document())
+
+        self.assertEqual(self.buffer.flush(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,14 +15,15 @@ import re
 from ldap3 import Server, Connection, SUBTREE, ALL, LEVEL
 from queue import Queue
 from .University import University
+from database import bootstrapIndexes
 
 
 class UAlberta(University):
     def __init__(self, settings):
         super().__init__(settings)
-        self.db = pymongo.MongoClient().ScheduleStorm
 
-        self.db.UAlbertaProfessor.create_index([("uid", pymongo.ASCENDING)], unique=True)
+        bootstrapIndexes("UAlbertaProfessor",
+                         lambda: self.db.UAlbertaProfessor.create_index([("uid", pymongo.ASCENDING)], unique=True))
 
 
     def parseCourseDescription(self, req):
@@ -13,6 +13,8 @@ import json
 from time import time, sleep
 from collections import OrderedDict
 from traceback import print_exc
+from .WriteBuffer import WriteBuffer
+from database import getDatabase, bootstrapIndexes
 
 
 class University(threading.Thread):
@@ -39,10 +41,52 @@ class University(threading.Thread):
     def __init__(self, settings):
         super().__init__()
         self.settings = settings
-        self.db = pymongo.MongoClient().ScheduleStorm
+        self.db = getDatabase()
         self.log = logging.getLogger(self.settings["uniID"])
         self.isScraping = False
-        self.ensureIndexes()
+
+        # Whether a snapshot has been published (and its terms precomputed) since startup
+        self.isPublished = False
+
+        # Every university shares the same collections, so their indexes are only ensured once per process
+        bootstrapIndexes("University", self.ensureIndexes)
+
+        # Class, course description and subject upserts are buffered and written in bulk
+        batchsize = self.settings.get("writebatchsize", 1000)
+        self.writeBuffers = {
+            "ClassList": WriteBuffer(self.db.ClassList, ["id", "term", "uni"], ["uni", "term"], batchsize, self.log),
+            "CourseDesc": WriteBuffer(self.db.CourseDesc, ["coursenum", "subject", "uni"], ["uni"], batchsize,
+                                      self.log),
+            "Subjects": WriteBuffer(self.db.Subjects, ["subject", "uni"], ["uni"], batchsize, self.log)
+        }
+
+        # Amount of inserted, updated, unchanged and deleted documents of each collection in the last scrape
+        self.scrapeChanges = {}
+
+        # With staged publishing, every scrape writes its classes to a new collection that readers switch to once
+        # the scrape has been validated, the rest write to ClassList in place
+        self.stagedPublish = self.settings.get("stagedpublish", False)
+        self.batchsize = batchsize
+
+        # Scrape generation being staged (None when classes are written in place), the ids of the classes it
+        # scraped in each term and the terms it enables
+        self.stagingGeneration = None
+        self.stagedIds = {}
+        self.stagedTerms = None
+
+        # Term -> amount of consecutive scrapes whose staged classes failed validation
+        self.rejections = {}
+
+        # Distinct locations of this university, kept up to date as classes are written
+        self.snapshot = None
+        self.locations = set(self.getLocations())
+
+        # Snapshot of the terms and generations that the API is serving, swapped in whole whenever a scrape finishes
+        self.snapshot = self.loadSnapshot()
+
+        # Terms that are evicted from the cache couldn't be rebuilt while a scrape writes into the published classes
+        if "cache" in self.settings and self.settings.get("scrape") is True and not self.stagedPublish:
+            self.settings["cache"].retain(self.settings["uniID"])
 
     def ensureIndexes(self):
         """
@@ -66,25 +110,47 @@ class University(threading.Thread):
             ("uni", pymongo.ASCENDING)],
             unique=True)
 
-        self.db.ClassList.create_index([
+        self.ensureClassIndexes(self.db.ClassList)
+
+        self.db.Publications.create_index([("uni", pymongo.ASCENDING)], unique=True)
+
+    def ensureClassIndexes(self, collection):
+        """
+        Ensures the indexes exist for a collection of classes (ClassList or the collection of a staged scrape)
+
+        :param collection: **pymongo.collection.Collection** Class collection
+        :return:
+        """
+        collection.create_index([
             ("id", pymongo.ASCENDING),
             ("term", pymongo.ASCENDING),
             ("uni", pymongo.ASCENDING)],
             unique=True)
 
-        self.db.ClassList.create_index([
+        collection.create_index([
             ("term", pymongo.ASCENDING),
             ("uni", pymongo.ASCENDING)])
 
-    def getLocations(self):
+        # Allows a term to be streamed in subject order without an in-memory sort
+        collection.create_index([
+            ("term", pymongo.ASCENDING),
+            ("uni", pymongo.ASCENDING),
+            ("subject", pymongo.ASCENDING),
+            ("coursenum", pymongo.ASCENDING)])
+
+    def getLocations(self, collection=None):
         """
         API Handler
 
         Returns a list of all distinct locations at this university
 
+        :param collection: **pymongo.collection.Collection** Class collection to read, the published one if not given
         :return: **list** Distinct locations for this university
         """
-        locations = self.db.ClassList.distinct("location", {"uni": self.settings["uniID"]})
+        if collection is None:
+            collection = self.classCollection()
+
+        locations = collection.distinct("location", {"uni": self.settings["uniID"]})
         response = []
 
         for location in locations:
@@ -112,6 +178,194 @@ class University(threading.Thread):
 
         return responsedict
 
+    def loadPublication(self):
+        """
+        Returns the published class collection and terms of this university
+
+        With staged publishing, both are switched in a single update of the university's Publications document
+
+        :return: **dict** "collection" is the name of the class collection, "terms" maps the enabled term ids to their
+                          names (None if the enabled terms are the ones flagged in Terms)
+        """
+        publication = None
+
+        if self.stagedPublish:
+            publication = self.db.Publications.find_one({"uni": self.settings["uniID"]})
+
+        return publication or {"collection": "ClassList", "terms": None}
+
+    def classCollection(self, snapshot=None):
+        """
+        Returns the collection that the classes of a snapshot are read from
+
+        :param snapshot: **dict** Snapshot to read, the published one if not given
+        :return: **pymongo.collection.Collection** Class collection
+        """
+        if snapshot is None:
+            snapshot = self.snapshot
+
+        if snapshot is None:
+            return self.db[self.loadPublication()["collection"]]
+
+        return self.db[snapshot["collection"]]
+
+    def canReadDB(self):
+        """
+        Returns whether the classes of the published snapshot can be read from the DB right now
+
+        Scrapes write into the published classes in place unless they're staged
+
+        :return: **bool** False if a scrape might have half-written the published classes
+        """
+        return self.stagedPublish or not self.isScraping
+
+    def loadSnapshot(self):
+        """
+        Returns the enabled terms in the database along with their stored scrape generations
+
+        Terms that were never published get the generation of the last successful scrape
+
+        :return: **dict** "terms" maps ids to names, "generations" maps ids to generations, "generation" is the newest,
+                          "locations" is the sorted list of distinct locations, "collection" is the name of the
+                          class collection and "digests" maps ids to the stored id, body digest and the generation
+                          that the digest was taken at
+        """
+        publication = self.loadPublication()
+
+        if self.stagedPublish:
+            # The published collection is only written by the scrape that staged it
+            self.locations = set(self.getLocations(self.db[publication["collection"]]))
+
+        snapshot = self.loadTerms(publication)
+        snapshot["locations"] = sorted(self.locations)
+
+        return snapshot
+
+    def loadTerms(self, publication):
+        """
+        Returns the published class collection and enabled terms of a snapshot, see loadSnapshot()
+
+        :param publication: **dict** Result of loadPublication()
+        :return: **dict** Snapshot without its "locations"
+        """
+        defaultGeneration = self.settings.get("lastUpdated", 0)
+
+        snapshot = {"generation": defaultGeneration, "terms": {}, "generations": {},
+                    "collection": publication["collection"], "digests": {}}
+
+        if publication["terms"] is not None:
+            termlist = self.db.Terms.find({"uni": self.settings["uniID"]})
+        else:
+            termlist = self.db.Terms.find({"uni": self.settings["uniID"], "enabled": True})
+
+        for term in termlist:
+            termid = str(term["id"])
+
+            if publication["terms"] is not None:
+                if termid not in publication["terms"]:
+                    continue
+
+                snapshot["terms"][termid] = publication["terms"][termid]
+            else:
+                snapshot["terms"][termid] = term["name"]
+
+            snapshot["generations"][termid] = term.get("generation", defaultGeneration)
+            snapshot["digests"][termid] = {"id": term["id"], "digest": term.get("digest"),
+                                           "generation": term.get("digestgeneration")}
+
+        if len(snapshot["generations"]) > 0:
+            snapshot["generation"] = max(snapshot["generations"].values())
+
+        return snapshot
+
+    def hasNewPublication(self):
+        """
+        Returns whether the DB has other terms, generations or classes than the published snapshot (ex. because another
+        instance scraped this university)
+
+        :return: **bool** True if the snapshot should be published again
+        """
+        snapshot = self.snapshot
+        published = self.loadTerms(self.loadPublication())
+
+        return not self.isPublished or snapshot["collection"] != published["collection"] or \
+            snapshot["terms"] != published["terms"] or snapshot["generations"] != published["generations"]
+
+    def reload(self):
+        """
+        Publishes the DB's contents after they were written by another process or instance
+
+        Everything this process derives from the classes as they're written is loaded again
+
+        :return:
+        """
+        if not self.stagedPublish:
+            self.locations = set(self.getLocations())
+
+        if "teacherindex" in self.settings:
+            self.settings["teacherindex"].invalidate(self.settings["uniID"])
+
+        self.publish(newGeneration=False)
+
+    def storeGeneration(self, generation):
+        """
+        Sets the scrape generation of every enabled term for this university
+
+        :param generation: **int** Scrape generation to store
+        :return:
+        """
+        self.db.Terms.update({"uni": self.settings["uniID"], "enabled": True}, {"$set": {"generation": generation}},
+                             upsert=False, multi=True)
+
+    def termGeneration(self, term, snapshot, digest):
+        """
+        Returns the generation that a term's rebuilt body is published at
+
+        Bodies can change without a new scrape generation (ex. new RMP ratings), since ETags only depend on the
+        generation, the term then gets a new one. The digest is stored with the generation it was taken at, so every
+        process that publishes the same body agrees on the generation.
+
+        :param term: **string** ID of the term
+        :param snapshot: **dict** Snapshot that is being published, its generations are updated
+        :param digest: **string** Digest of the term's /all body
+        :return: **int** Generation of the term
+        """
+        generation = snapshot["generations"][term]
+        stored = snapshot["digests"][term]
+
+        if stored["digest"] == digest and stored["generation"] == generation:
+            return generation
+
+        query = {"uni": self.settings["uniID"], "id": stored["id"], "generation": generation}
+
+        if stored["digest"] is None or stored["generation"] != generation:
+            # First body of this generation
+            newGeneration = generation
+        else:
+            # Generations must always increase, even if the body changes twice within the same second
+            newGeneration = max(int(time()), snapshot["generation"] + 1)
+            query["digest"] = stored["digest"]
+
+        result = self.db.Terms.update(query, {"$set": {"generation": newGeneration, "digest": digest,
+                                                       "digestgeneration": newGeneration}}, upsert=False)
+
+        if not result["n"]:
+            # Another process stored a digest first, use its generation if it published the same body
+            current = self.db.Terms.find_one({"uni": self.settings["uniID"], "id": stored["id"]})
+
+            if current and current.get("digest") == digest and "generation" in current:
+                newGeneration = current["generation"]
+
+        if newGeneration != generation:
+            self.log.info("Term " + term + " changed without a new scrape, publishing it as generation " +
+                          str(newGeneration))
+
+        snapshot["generations"][term] = newGeneration
+        snapshot["generation"] = max(snapshot["generation"], newGeneration)
+        stored.update({"digest": digest, "generation": newGeneration})
+
+        return newGeneration
+
     def typeNameToAcronym(self, name):
         """
         Returns the type acronym given the name
@@ -133,15 +387,23 @@ class University(threading.Thread):
         """
         Given a list of term objects, sets them as the only enabled terms in the DB and updates their objects
 
+        When a scrape is being staged, the terms are only set once the scrape is promoted
+
         :param terms: **list** Contains a list of all enabled term objects
         :return:
         """
-        # Set every term to disabled (we don't display them to the user)
-        self.resetEnabledTerms()
+        if self.stagingGeneration is not None:
+            self.stagedTerms = terms
+            return
 
         for term in terms:
             self.updateTerm(term)
 
+        # Disable the other terms (we don't display them to the user) after the new ones are enabled, so there's
+        # never a moment without enabled terms
+        self.db.Terms.update({"uni": self.settings["uniID"], "id": {"$nin": [term["id"] for term in terms]}},
+                             {"$set": {"enabled": False}}, upsert=False, multi=True)
+
     def resetEnabledTerms(self):
         """
         Sets all the terms for this university to not be enabled
@@ -194,18 +456,7 @@ class University(threading.Thread):
             self.log.critical("Course description doesn't have both subject and coursenum keys")
         else:
             coursedesc["uni"] = self.settings["uniID"]
-            self.db.CourseDesc.update(
-                {
-                    "coursenum": coursedesc["coursenum"],
-                    "subject": coursedesc["subject"],
-                    "uni": coursedesc["uni"]
-                },
-                {
-                    "$set": coursedesc,
-                    "$currentDate": {"lastModified": True}
-                },
-                upsert=True
-            )
+            self.writeBuffers["CourseDesc"].upsert(coursedesc)
 
     def getCourseDescription(self, coursenum, subject):
         """
@@ -215,13 +466,16 @@ class University(threading.Thread):
         :param subject: **string** Subject code (ex. CPSC)
         :return: **obj/boolean** Description obj if the course has a description, False is not
         """
-        return self.db.CourseDesc.find_one(
-            {
-                "coursenum": coursenum,
-                "subject": subject,
-                "uni": self.settings["uniID"]
-            }
-        )
+        query = {
+            "coursenum": coursenum,
+            "subject": subject,
+            "uni": self.settings["uniID"]
+        }
+
+        # Make sure a pending write of this description is visible
+        self.writeBuffers["CourseDesc"].flushIfPending(query)
+
+        return self.db.CourseDesc.find_one(query)
 
     def updateSubject(self, subject):
         """
@@ -236,17 +490,7 @@ class University(threading.Thread):
             subject["uni"] = self.settings["uniID"]
 
             # Update the subject data in the DB
-            self.db.Subjects.update(
-                {
-                    "subject": subject["subject"],
-                    "uni": subject["uni"]
-                },
-                {
-                    "$set": subject,
-                    "$currentDate": {"lastModified": True}
-                },
-                upsert=True
-            )
+            self.writeBuffers["Subjects"].upsert(subject)
 
     def updateSubjects(self, subjects):
         """
@@ -267,6 +511,8 @@ class University(threading.Thread):
         """
         query["uni"] = self.settings["uniID"]
 
+        self.writeBuffers["Subjects"].flushIfPending(query)
+
         return self.db.Subjects.find_one(query)
 
 
@@ -295,18 +541,266 @@ class University(threading.Thread):
             # force term to be a string
             classobj["term"] = str(classobj["term"])
 
-            self.db.ClassList.update(
-                {
-                    "id": classobj["id"],
-                    "term": classobj["term"],
-                    "uni": classobj["uni"]
-                },
-                {
-                    "$set": classobj,
-                    "$currentDate": {"lastModified": True}
-                },
-                upsert=True
-            )
+            if self.stagingGeneration is not None:
+                self.stagedIds.setdefault(classobj["term"], set()).add(classobj["id"])
+
+            self.writeClass(classobj)
+
+    def writeClass(self, classobj):
+        """
+        Upserts a validated class into the class collection being written and the indexes derived from it
+
+        :param classobj: **dict** Class to write
+        :return:
+        """
+        if classobj["location"] != "":
+            self.locations.add(classobj["location"])
+
+        self.writeBuffers["ClassList"].upsert(classobj)
+
+        # Staged classes might not be promoted, the teacher index is reloaded once they are
+        if "teacherindex" in self.settings and self.stagingGeneration is None:
+            self.settings["teacherindex"].updateClass(self.settings["uniID"], classobj)
+
+    def stagedCollectionName(self, generation):
+        """
+        Returns the name of the class collection of a staged scrape
+
+        :param generation: **int** Scrape generation that was staged
+        :return: **string** Collection name
+        """
+        return "ClassList_" + self.settings["uniID"] + "_" + str(generation)
+
+    def startStaging(self):
+        """
+        Starts staging a scrape into a new class collection, readers keep using the published one until
+        promoteStaging() switches them over
+
+        The new collection starts as a copy of the published classes, so classes that didn't change aren't written
+        again and terms that aren't scraped keep their classes
+
+        :return:
+        """
+        uni = self.settings["uniID"]
+
+        published = self.classCollection()
+
+        # Never reuse the name of the published collection, even if scrapes finish within the same second
+        generation = max(int(time()), self.snapshot["generation"] + 1)
+        prefix = "ClassList_" + uni + "_"
+
+        if published.name.startswith(prefix) and published.name[len(prefix):].isdigit():
+            generation = max(generation, int(published.name[len(prefix):]) + 1)
+
+        self.stagingGeneration = generation
+        self.stagedIds = {}
+        self.stagedTerms = None
+
+        name = self.stagedCollectionName(self.stagingGeneration)
+        self.db.drop_collection(name)
+
+        # Classes of terms that are no longer enabled are left behind
+        published.aggregate([{"$match": {"uni": uni, "term": {"$in": sorted(self.snapshot["terms"])}}},
+                             {"$out": name}])
+        self.ensureClassIndexes(self.db[name])
+
+        self.writeBuffers["ClassList"] = WriteBuffer(self.db[name], ["id", "term", "uni"], ["uni", "term"],
+                                                     self.batchsize, self.log)
+
+    def validateStagedTerm(self, term, staged, published, force=False):
+        """
+        Returns whether a staged term looks complete enough to replace the published one
+
+        The staged term must have at least "mintermratio" of the published term's classes, losing more than that is
+        most likely a scrape that failed part of the way through. Subjects that were dropped or shrank don't block the
+        term on their own. After "maxrejections" consecutive rejections the term is promoted anyway, since the source
+        has most likely changed for good.
+
+        :param term: **string** ID of the term
+        :param staged: **int** Amount of classes that the scrape found in the term
+        :param published: **pymongo.collection.Collection** Published class collection
+        :param force: **bool** Promote the term even if it fails validation (ex. "forcepromote" was set)
+        :return: **bool** True if the term can be promoted
+        """
+        ratio = self.settings.get("mintermratio", 0.5)
+        maxRejections = self.settings.get("maxrejections", 3)
+
+        minimum = int(published.find({"uni": self.settings["uniID"], "term": term}).count() * ratio)
+
+        if staged >= minimum:
+            self.rejections.pop(term, None)
+            return True
+
+        self.rejections[term] = self.rejections.get(term, 0) + 1
+
+        if force or (maxRejections > 0 and self.rejections[term] > maxRejections):
+            self.log.warning("Publishing term " + term + " with " + str(staged) + " classes instead of at least " +
+                             str(minimum) + " after " + str(self.rejections[term]) + " rejection(s)")
+            self.rejections.pop(term, None)
+            return True
+
+        self.log.error("Not publishing term " + term + ", it has " + str(staged) + " classes instead of at least " +
+                       str(minimum) + " (rejection " + str(self.rejections[term]) + ")")
+        return False
+
+    def takeForcePromote(self):
+        """
+        Returns whether "forcepromote" is set for this university in the settings file and clears it
+
+        :return: **bool** True if the next staged scrape should be promoted even if it fails validation
+        """
+        with self.settings["lock"]:
+            with open("settings.json") as settingFile:
+                settings = json.load(settingFile, object_pairs_hook=OrderedDict)
+
+            unisettings = settings["Universities"][self.settings["uniID"]]
+
+            if not unisettings.get("forcepromote", False):
+                return False
+
+            unisettings["forcepromote"] = False
+
+            with open('settings.json', 'wt') as out:
+                json.dump(settings, out, indent=4)
+
+        return True
+
+    def promoteStaging(self):
+        """
+        Validates the terms of the staged scrape and switches readers over to its class collection and terms
+
+        Classes of a valid term that weren't scraped again are deleted, terms that fail validation keep their published
+        classes and new terms that fail aren't enabled. Readers in every process switch over with a single update of
+        the Publications document, so they never see a mix of old and new classes.
+
+        :return:
+        """
+        uni = self.settings["uniID"]
+        buffer = self.writeBuffers["ClassList"]
+        staging = buffer.collection
+        published = self.classCollection()
+
+        buffer.flush()
+
+        failed = set()
+        force = self.takeForcePromote()
+
+        for term in sorted(self.stagedIds):
+            ids = self.stagedIds[term]
+
+            if self.validateStagedTerm(term, len(ids), published, force):
+                # Classes that weren't scraped again were removed from the source
+                buffer.delete([(classobj["id"], term, uni)
+                               for classobj in staging.find({"uni": uni, "term": term}, {"_id": False, "id": True})
+                               if classobj["id"] not in ids])
+            else:
+                staging.delete_many({"uni": uni, "term": term})
+
+                classes = list(published.find({"uni": uni, "term": term}))
+
+                if classes:
+                    staging.insert_many(classes)
+
+                if term not in self.snapshot["terms"]:
+                    failed.add(term)
+
+        terms = self.stagedTerms
+        self.stagingGeneration = None
+
+        if terms is not None:
+            terms = [term for term in terms if str(term["id"]) not in failed]
+
+            # Readers of staged universities take their terms from the publication, not the enabled flags
+            self.updateTerms(terms)
+            enabled = {str(term["id"]): term["name"] for term in terms}
+        else:
+            enabled = dict(self.snapshot["terms"])
+
+        # Processes that haven't published the new collection yet keep reading the previous ones
+        publication = self.loadPublication()
+        keep = max(2, self.settings.get("keepcollections", 3))
+        previous = ([publication["collection"]] + publication.get("previous", []))[:keep - 1]
+
+        self.db.Publications.update({"uni": uni},
+                                    {"$set": {"collection": staging.name, "terms": enabled, "previous": previous}},
+                                    upsert=True)
+
+        self.dropStagedCollections()
+
+        if "teacherindex" in self.settings:
+            self.settings["teacherindex"].invalidate(uni)
+
+    def dropStagedCollections(self):
+        """
+        Drops every class collection of this university that isn't the published one or one of the "previous"
+        collections of the Publications document (ex. older scrapes and scrapes that failed)
+
+        :return:
+        """
+        publication = self.loadPublication()
+        keep = set([publication["collection"]] + publication.get("previous", []))
+        prefix = "ClassList_" + self.settings["uniID"] + "_"
+
+        for name in self.db.collection_names():
+            if name.startswith(prefix) and name[len(prefix):].isdigit() and name not in keep:
+                self.db.drop_collection(name)
+
+    def abortStaging(self):
+        """
+        Discards a staged scrape that failed before it was promoted, the published classes and terms are kept
+
+        Classes are written to the published collection again and what the staged scrape wrote isn't counted as a
+        change
+
+        :return:
+        """
+        staging = self.writeBuffers["ClassList"].collection
+        published = self.db[self.loadPublication()["collection"]]
+
+        self.stagingGeneration = None
+        self.stagedIds = {}
+        self.stagedTerms = None
+
+        if staging.name == published.name:
+            # The scrape was already promoted
+            return
+
+        self.writeBuffers["ClassList"] = WriteBuffer(published, ["id", "term", "uni"], ["uni", "term"],
+                                                     self.batchsize, self.log)
+
+        self.dropStagedCollections()
+
+    def flushWrites(self):
+        """
+        Writes every buffered class, course description and subject upsert to the DB
+
+        :return:
+        """
+        for collection in self.writeBuffers:
+            self.writeBuffers[collection].flush()
+
+    def resetScrapeChanges(self):
+        """
+        Resets the amounts of changed documents and returns the amounts since the last reset
+
+        :return: **dict** Collection -> {"inserted", "updated", "unchanged"}
+        """
+        return {collection: self.writeBuffers[collection].resetStats() for collection in self.writeBuffers}
+
+    def getClasses(self, snapshot=None, terms=None):
+        """
+        Returns every class of this university in the given terms
+
+        :param snapshot: **dict** Snapshot to read the classes of, the published one if not given
+        :param terms: **list** IDs of the terms to return the classes of, None for every term
+        :return: **pymongo.cursor.Cursor** Class dicts
+        """
+        query = {"uni": self.settings["uniID"]}
+
+        if terms is not None:
+            query["term"] = {"$in": list(terms)}
+
+        return self.classCollection(snapshot).find(query, {"_id": False, "lastModified": False})
 
     def updateClasses(self, classes):
         """
@@ -401,36 +895,69 @@ class University(threading.Thread):
 
         return returnobj
 
-    def retrieveSubjectDesc(self, courses):
+    def getCourseDescriptions(self, subjects=None):
         """
-        Given a course list from an API handler, retrieves course descriptions and sorts by faculty if applicable
+        Returns the course descriptions of this university in one query
+
+        :param subjects: **list** Only return the descriptions of these subjects, None for every subject
+        :return: **dict** (subject, coursenum) -> description without its _id, subject, coursenum and lastModified
+        """
+        query = {"uni": self.settings["uniID"]}
+
+        if subjects is not None:
+            query["subject"] = {"$in": list(subjects)}
+
+        # Make sure pending writes of these descriptions are visible
+        self.writeBuffers["CourseDesc"].flushIfPending(query)
+
+        descriptions = {}
+
+        for result in self.db.CourseDesc.find(query, {"_id": False, "lastModified": False}):
+            descriptions[(result.pop("subject"), result.pop("coursenum"))] = result
+
+        return descriptions
+
+    def getSubjectDescriptions(self):
+        """
+        Returns the subject descriptions of this university in one query
+
+        :return: **dict** Subject -> description without its _id, subject and lastModified
+        """
+        query = {"uni": self.settings["uniID"]}
+
+        self.writeBuffers["Subjects"].flushIfPending(query)
 
-        Pure Function
+        descriptions = {}
+
+        for result in self.db.Subjects.find(query, {"_id": False, "lastModified": False}):
+            descriptions[result.pop("subject")] = result
+
+        return descriptions
+
+    def retrieveSubjectDesc(self, courses, subjectDescs=None):
+        """
+        Given a course list from an API handler, retrieves course descriptions and sorts by faculty if applicable
 
         :param courses: **dict** List of courses from API handler
+        :param subjectDescs: **dict** Result of getSubjectDescriptions, fetched if not given
         :return: **dict** Faculty (if applicable) sorted dict with course descriptions
         """
         response = {}
 
-        # Check if this Uni supports faculties
-        supportsFaculties = False
+        if subjectDescs is None:
+            subjectDescs = self.getSubjectDescriptions()
 
-        facultyCount = self.db.Subjects.find({"uni": self.settings["uniID"], "faculty": {"$exists": True}}).count()
+        # Check if this Uni supports faculties
+        supportsFaculties = any("faculty" in subjectDescs[subject] for subject in subjectDescs)
 
-        if facultyCount > 0:
-            supportsFaculties = True
-        else:
+        if not supportsFaculties:
             # response doesn't have faculties, so it has the same structure as courses
             response = courses
 
         # Get the descriptions for each subject
         for subject in courses:
-            result = self.db.Subjects.find_one({"subject": subject, "uni": self.settings["uniID"]})
-
-            if result:
-                del result["_id"]
-                del result["subject"]
-                del result["lastModified"]
+            if subject in subjectDescs:
+                result = dict(subjectDescs[subject])
 
                 if supportsFaculties:
                     if "faculty" not in result:
@@ -447,72 +974,260 @@ class University(threading.Thread):
 
         return response
 
-    def getSubjectListAll(self, term):
+    def queryTermCourses(self, term, snapshot=None):
         """
-        API Handler
-
-        Returns all data for a given term (classes, descriptions and RMP)
+        Groups the classes of a term by subject and course with one class and one CourseDesc query
 
         :param term: **string/int** ID of the term
-        :return: **dict** All data for the term
+        :param snapshot: **dict** Snapshot to read the classes of, the published one if not given
+        :return: **tuple** (subject -> coursenum -> {"classes", "description"}, set of distinct teachers)
         """
         responsedict = {}
+        distinctteachers = set()
 
-        classes = self.db.ClassList.find({"term": term, "uni": self.settings["uniID"]})
-
-        distinctteachers = []
+        classes = self.classCollection(snapshot).find({"term": term, "uni": self.settings["uniID"]},
+                                                      {"_id": False, "lastModified": False})
 
-        # Parse each class and get their descriptions
         for classv in classes:
-            del classv["_id"]
+            subj = classv.pop("subject")
+            coursen = classv.pop("coursenum")
 
-            if classv["subject"] not in responsedict:
-                responsedict[classv["subject"]] = {}
+            if subj not in responsedict:
+                responsedict[subj] = {}
 
-            if classv["coursenum"] not in responsedict[classv["subject"]]:
-                responsedict[classv["subject"]][classv["coursenum"]] = {"classes": []}
+            if coursen not in responsedict[subj]:
+                responsedict[subj][coursen] = {"classes": []}
 
-            subj = classv["subject"]
-            coursen = classv["coursenum"]
+            # Add this class to the course list
+            responsedict[subj][coursen]["classes"].append(classv)
 
-            # Get the class description
-            if "description" not in responsedict[subj][coursen]:
-                result = self.getCourseDescription(coursen, subj)
+            for teacher in classv["teachers"]:
+                if teacher != "Staff":
+                    distinctteachers.add(teacher)
 
-                if result:
-                    # Remove unneeded fields
-                    del result["_id"]
-                    del result["subject"]
-                    del result["coursenum"]
-                    del result["lastModified"]
+        descriptions = self.getCourseDescriptions(list(responsedict))
 
-                    responsedict[subj][coursen]["description"] = result
-                else:
-                    responsedict[subj][coursen]["description"] = False
+        for subj in responsedict:
+            for coursen in responsedict[subj]:
+                responsedict[subj][coursen]["description"] = descriptions.get((subj, coursen), False)
 
-            # Remove unneeded fields
-            del classv["subject"]
-            del classv["coursenum"]
-            del classv["lastModified"]
+        return responsedict, distinctteachers
 
-            # Add this class to the course list
-            responsedict[subj][coursen]["classes"].append(classv)
+    def aggregateTermCourses(self, term, snapshot=None):
+        """
+        Same as queryTermCourses, but the classes are grouped and joined with their descriptions by the DB server
 
-            # Find distinct teachers and append them to distinctteachers
-            for teacher in classv["teachers"]:
-                if teacher not in distinctteachers and teacher != "Staff":
-                    distinctteachers.append(teacher)
+        :param term: **string/int** ID of the term
+        :param snapshot: **dict** Snapshot to read the classes of, the published one if not given
+        :return: **tuple** (subject -> coursenum -> {"classes", "description"}, set of distinct teachers)
+        """
+        uni = self.settings["uniID"]
+
+        self.writeBuffers["CourseDesc"].flushIfPending({"uni": uni})
+
+        courses = self.classCollection(snapshot).aggregate([
+            {"$match": {"term": term, "uni": uni}},
+            {"$group": {"_id": {"subject": "$subject", "coursenum": "$coursenum"}, "classes": {"$push": "$$ROOT"}}},
+            {"$lookup": {"from": "CourseDesc", "localField": "_id.coursenum", "foreignField": "coursenum",
+                         "as": "descriptions"}},
+            {"$project": {"classes": True, "descriptions": {"$filter": {
+                "input": "$descriptions",
+                "as": "desc",
+                "cond": {"$and": [{"$eq": ["$$desc.subject", "$_id.subject"]}, {"$eq": ["$$desc.uni", uni]}]}
+            }}}}
+        ], allowDiskUse=True)
+
+        responsedict = {}
+        distinctteachers = set()
+
+        for course in courses:
+            subj = course["_id"]["subject"]
+            coursen = course["_id"]["coursenum"]
+
+            for classv in course["classes"]:
+                for field in ["_id", "subject", "coursenum", "lastModified"]:
+                    classv.pop(field, None)
+
+                for teacher in classv["teachers"]:
+                    if teacher != "Staff":
+                        distinctteachers.add(teacher)
+
+            description = False
+
+            if course["descriptions"]:
+                description = course["descriptions"][0]
+
+                for field in ["_id", "subject", "coursenum", "lastModified"]:
+                    description.pop(field, None)
 
+            responsedict.setdefault(subj, {})[coursen] = {"classes": course["classes"], "description": description}
+
+        return responsedict, distinctteachers
+
+    def getSubjectListAll(self, term, snapshot=None):
+        """
+        API Handler
+
+        Returns all data for a given term (classes, descriptions and RMP)
+
+        Built from one query per collection (or a server-side aggregation if "aggregatesubjectlist" is set)
+
+        :param term: **string/int** ID of the term
+        :param snapshot: **dict** Snapshot to read the classes of, the published one if not given
+        :return: **dict** All data for the term
+        """
+        if self.settings.get("aggregatesubjectlist", False):
+            responsedict, distinctteachers = self.aggregateTermCourses(term, snapshot)
+        else:
+            responsedict, distinctteachers = self.queryTermCourses(term, snapshot)
 
         # Add the faculty sorting and course descriptions
         responsedict = self.retrieveSubjectDesc(responsedict)
 
         # Match RMP data
-        rmpobj = self.matchRMPNames(distinctteachers)
+        rmpobj = self.matchRMPNames(sorted(distinctteachers))
 
         # Send over a list of all the professors with a RMP rating in the list
         return {"classes": responsedict, "rmp": rmpobj}
 
+    def streamSubjectListAll(self, term, chunksize=65536, snapshot=None):
+        """
+        API Handler
+
+        Streams the same JSON document as getSubjectListAll, but only one subject is held in memory at a time
+
+        :param term: **string/int** ID of the term
+        :param chunksize: **int** Amount of bytes to buffer before yielding
+        :param snapshot: **dict** Snapshot to read the classes of, the published one if not given
+        :return: **generator** Yields the encoded term in chunks of bytes
+        """
+        # Get the subject descriptions and check if this Uni supports faculties
+        subjectDescs = self.getSubjectDescriptions()
+        supportsFaculties = any("faculty" in subjectDescs[subject] for subject in subjectDescs)
+
+        # Determine the order in which the subjects are streamed
+        if supportsFaculties:
+            faculties = {}
+
+            for subject in subjectDescs:
+                if "faculty" not in subjectDescs[subject]:
+                    subjectDescs[subject]["faculty"] = "Other"
+
+                faculties.setdefault(subjectDescs[subject]["faculty"], []).append(subject)
+
+            groups = [(faculty, faculties[faculty]) for faculty in sorted(faculties)]
+        else:
+            groups = [(False, False)]
+
+        distinctteachers = set()
+        buffer = []
+        buffersize = 0
+
+        buffer.append('{"classes": {')
+
+        firstGroup = True
+
+        for faculty, subjects in groups:
+            query = {"term": term, "uni": self.settings["uniID"]}
+
+            if subjects:
+                query["subject"] = {"$in": subjects}
+
+            classes = self.classCollection(snapshot).find(query).sort([("subject", pymongo.ASCENDING),
+                                                                       ("coursenum", pymongo.ASCENDING)])
+
+            firstSubject = True
+            subjectdict = False
+            subject = False
+
+            # Classes are sorted by subject, so each subject is encoded once its last class has been read
+            for classv in classes:
+                if classv["subject"] != subject:
+                    if subjectdict is not False:
+                        encoded = self.encodeStreamSubject(subject, subjectdict, subjectDescs, supportsFaculties,
+                                                           faculty, firstGroup, firstSubject)
+                        buffer.append(encoded)
+                        buffersize += len(encoded)
+                        firstGroup = firstSubject = False
+
+                    subject = classv["subject"]
+                    subjectdict = {}
+
+                del classv["_id"]
+
+                coursen = classv["coursenum"]
+
+                if coursen not in subjectdict:
+                    subjectdict[coursen] = {"classes": []}
+
+                # Remove unneeded fields
+                del classv["subject"]
+                del classv["coursenum"]
+                del classv["lastModified"]
+
+                subjectdict[coursen]["classes"].append(classv)
+
+                for teacher in classv["teachers"]:
+                    if teacher != "Staff":
+                        distinctteachers.add(teacher)
+
+                if buffersize >= chunksize:
+                    yield "".join(buffer).encode('utf-8')
+                    buffer = []
+                    buffersize = 0
+
+            if subjectdict is not False:
+                encoded = self.encodeStreamSubject(subject, subjectdict, subjectDescs, supportsFaculties,
+                                                   faculty, firstGroup, firstSubject)
+                buffer.append(encoded)
+                firstGroup = False
+
+            if supportsFaculties and subjectdict is not False:
+                # Close the faculty
+                buffer.append("}")
+
+        # Match RMP data
+        buffer.append('}, "rmp": ' + json.dumps(self.matchRMPNames(distinctteachers), sort_keys=True) + '}')
+
+        yield "".join(buffer).encode('utf-8')
+
+    def encodeStreamSubject(self, subject, subjectdict, subjectDescs, supportsFaculties, faculty, firstGroup,
+                            firstSubject):
+        """
+        Encodes a subject of streamSubjectListAll along with the separators and faculty that precede it
+
+        The course descriptions are fetched per subject, so only those of one subject are held in memory
+
+        :param subject: **string** Subject code
+        :param subjectdict: **dict** Courses of the subject
+        :param subjectDescs: **dict** Subject descriptions keyed by subject code
+        :param supportsFaculties: **bool** Whether the subjects are grouped by faculty
+        :param faculty: **string/bool** Faculty that the subject is in, False if not supported
+        :param firstGroup: **bool** Whether this is the first subject of the document
+        :param firstSubject: **bool** Whether this is the first subject of the faculty
+        :return: **string** Encoded subject
+        """
+        encoded = ""
+
+        if supportsFaculties and firstSubject:
+            # Open the faculty
+            if not firstGroup:
+                encoded += ", "
+
+            encoded += json.dumps(faculty) + ": {"
+        elif not firstGroup:
+            encoded += ", "
+
+        courseDescs = self.getCourseDescriptions([subject])
+
+        for coursen in subjectdict:
+            subjectdict[coursen]["description"] = courseDescs.get((subject, coursen), False)
+
+        if subject in subjectDescs:
+            subjectdict["description"] = subjectDescs[subject]
+
+        return encoded + json.dumps(subject) + ": " + json.dumps(subjectdict, sort_keys=True)
+
     def scrape(self):
         self.log.critical("You must override the scrape method!")
 
@@ -522,19 +1237,92 @@ class University(threading.Thread):
 
         :return:
         """
+        self.settings["lastUpdated"] = int(time())
+
         with self.settings["lock"]:
             with open("settings.json") as settingFile:
                 settings = json.load(settingFile, object_pairs_hook=OrderedDict)
-                settings["Universities"][self.settings["uniID"]]["lastUpdated"] = int(time())
+                settings["Universities"][self.settings["uniID"]]["lastUpdated"] = self.settings["lastUpdated"]
 
                 with open('settings.json', 'wt') as out:
                     json.dump(settings, out, indent=4)
 
+    def publish(self, newGeneration=True):
+        """
+        Builds a snapshot of the data currently in the DB and atomically swaps it in for the API to serve
+
+        Readers keep getting the previously published snapshot until the new one is completely built
+
+        :param newGeneration: **bool** If true, starts a new scrape generation for every enabled term
+        :return:
+        """
+        # Anything the scrape wrote must be in the DB before it is read back
+        self.flushWrites()
+
+        snapshot = self.loadSnapshot()
+
+        if newGeneration:
+            # Generations must always increase, even if scrapes finish within the same second
+            generation = max(int(time()), self.snapshot["generation"] + 1)
+            self.storeGeneration(generation)
+
+            snapshot["generation"] = generation
+            for term in snapshot["generations"]:
+                snapshot["generations"][term] = generation
+
+        if "teacherindex" in self.settings:
+            teachers = self.settings["teacherindex"].stage(self, snapshot)
+
+        if "cache" in self.settings:
+            staging = self.settings["cache"].stage(self, snapshot)
+            self.settings["cache"].publish(self, snapshot, staging)
+        else:
+            self.snapshot = snapshot
+
+        if "teacherindex" in self.settings:
+            self.settings["teacherindex"].commit(self.settings["uniID"], teachers)
+
+        self.isPublished = True
+
+    def publishRetrying(self, delay=5, maxDelay=300):
+        """
+        Publishes what is in the DB, retrying with a doubling delay until it succeeds
+
+        :param delay: **int** Seconds to wait before the first retry
+        :param maxDelay: **int** Most seconds to wait between retries
+        :return:
+        """
+        while True:
+            try:
+                self.publish(newGeneration=False)
+                return
+            except Exception as e:
+                print_exc()
+
+            self.log.warning("Failed to publish, retrying in " + str(delay) + "s")
+            sleep(delay)
+            delay = min(delay * 2, maxDelay)
+
+    def notify(self, event):
+        """
+        Notifies the API process about the scraping state when this university scrapes in a separate process
+
+        The time of the last successful scrape is sent along, the API process doesn't read it from the settings file
+
+        :param event: **string** "scraping" or "published"
+        :return:
+        """
+        if "notify" in self.settings:
+            self.settings["notify"].put((self.settings["uniID"], event, self.settings.get("lastUpdated")))
+
     def run(self):
         if "scrapeinterval" not in self.settings or not isinstance(self.settings["scrapeinterval"], int) \
                 or self.settings["scrapeinterval"] < 0:
             self.log.critical("No 'scrapeinterval' set, aborting")
         else:
+            # Publish what is in the DB so that there is a complete snapshot to serve during the first scrape
+            self.publishRetrying()
+
             # check if we need to sleep given lastUpdated
             if "lastUpdated" in self.settings:
                 # amount of seconds since the last successful update
@@ -549,15 +1337,59 @@ class University(threading.Thread):
             while True:
                 self.log.info("Starting to scrape updated course info")
                 self.isScraping = True
+                self.notify("scraping")
+
+                # Keep the published snapshot in memory while the DB is being written to
+                if "cache" in self.settings:
+                    self.settings["cache"].pin(self.settings["uniID"])
+
+                self.resetScrapeChanges()
 
                 try:
+                    if self.stagedPublish:
+                        self.startStaging()
+
                     self.scrape()
+
+                    if self.stagedPublish:
+                        self.promoteStaging()
+
+                    self.flushWrites()
                     self.updateLastScraped()
                 except Exception as e:
                     print_exc()
 
+                    # Nothing of a staged scrape that failed is published
+                    if self.stagedPublish:
+                        try:
+                            self.abortStaging()
+                        except Exception as e:
+                            print_exc()
+
+                self.scrapeChanges = self.resetScrapeChanges()
+                changed = 0
+
+                for collection in sorted(self.scrapeChanges):
+                    stats = self.scrapeChanges[collection]
+                    changed += stats["inserted"] + stats["updated"] + stats["deleted"]
+
+                    self.log.info(collection + ": " + str(stats["inserted"]) + " inserted, " + str(stats["updated"]) +
+                                  " updated, " + str(stats["unchanged"]) + " unchanged, " + str(stats["deleted"]) +
+                                  " deleted")
+
+                # Swap in the new snapshot before readers are allowed to build from the DB again, if nothing changed
+                # the terms keep their generation so that clients don't have to download them again
+                try:
+                    self.publish(newGeneration=changed > 0)
+                except Exception as e:
+                    print_exc()
+
                 self.log.info("Done scraping, sleeping for " + str(self.settings["scrapeinterval"]) + "s")
                 self.isScraping = False
+                self.notify("published")
+
+                if "cache" in self.settings:
+                    self.settings["cache"].unpin(self.settings["uniID"])
 
                 # Sleep for the specified interval
                 sleep(self.settings["scrapeinterval"])
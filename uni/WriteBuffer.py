@@ -0,0 +1,244 @@
+"""
+Copyright (c) 2016 Stepan Fedorko-Bartos, Ceegan Hale
+
+Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENSE.md
+
+This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
+"""
+
+import json
+import hashlib
+from threading import Lock
+from collections import OrderedDict
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+
+class WriteBuffer():
+    """
+        Collects the upserts of a collection and writes them in unordered bulk writes
+
+        Upserts of the same document are merged while they're pending, so a batch never has two operations on the same
+        document and the order that the server applies a batch in doesn't matter. Scrapers write from many threads, so
+        every method is thread safe.
+
+        Upserts that wouldn't change the stored document are skipped. The fingerprints of the stored documents are
+        loaded once per scope (ex. a uni's term) and kept up to date with every write, which assumes this buffer is
+        the only writer of its documents.
+    """
+    def __init__(self, collection, keys, scope, batchsize, log):
+        """
+        Constructor for a write buffer
+
+        :param collection: **pymongo.collection.Collection** Collection to write to
+        :param keys: **list** Fields that identify a document (the upsert filter)
+        :param scope: **list** Key fields whose stored documents' fingerprints are loaded together (ex. uni and term)
+        :param batchsize: **int** Amount of pending documents that triggers a flush
+        :param log: **logging.Logger** Logger to report failed writes to
+        :return:
+        """
+        self.collection = collection
+        self.keys = keys
+        self.scope = scope
+        self.batchsize = batchsize
+        self.log = log
+
+        # Filter values -> fingerprint of the stored document
+        self.fingerprints = {}
+        self.loadedScopes = set()
+        self.loadLock = Lock()
+
+        # Amount of upserts by whether they inserted, updated or didn't change a document and amount of deleted
+        # documents since resetStats()
+        self.stats = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+
+        # Filter values -> fields to $set
+        self.pending = OrderedDict()
+        self.lock = Lock()
+
+        # Serializes flushes so that a document's upserts are applied in the order they were made
+        self.flushLock = Lock()
+
+    def fingerprint(self, document):
+        """
+        Returns a stable hash of the content of a document
+
+        :param document: **dict** Document fields, _id and lastModified are ignored
+        :return: **bytes** Fingerprint
+        """
+        content = {field: document[field] for field in document if field not in ("_id", "lastModified")}
+
+        return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).digest()
+
+    def loadFingerprints(self, scope):
+        """
+        Loads the fingerprints of the stored documents in a scope if they haven't been loaded yet
+
+        :param scope: **tuple** Values of the scope fields
+        :return:
+        """
+        with self.loadLock:
+            if scope in self.loadedScopes:
+                return
+
+            fingerprints = {}
+
+            for document in self.collection.find(dict(zip(self.scope, scope)), {"_id": False, "lastModified": False}):
+                if all(field in document for field in self.keys):
+                    fingerprints[tuple(document[field] for field in self.keys)] = self.fingerprint(document)
+
+            with self.lock:
+                # Writes made while loading are newer than what was read
+                for key in fingerprints:
+                    self.fingerprints.setdefault(key, fingerprints[key])
+
+                self.loadedScopes.add(scope)
+
+    def upsert(self, document):
+        """
+        Buffers an upsert of the document if it changes the stored document, flushing if the buffer is full
+
+        :param document: **dict** Fields to set, must contain every key field
+        :return:
+        """
+        key = tuple(document[field] for field in self.keys)
+        scope = tuple(document[field] for field in self.scope)
+
+        if scope not in self.loadedScopes:
+            self.loadFingerprints(scope)
+
+        fingerprint = self.fingerprint(document)
+
+        with self.lock:
+            if key in self.pending:
+                self.pending[key].update(document)
+                self.fingerprints[key] = self.fingerprint(self.pending[key])
+            elif self.fingerprints.get(key) == fingerprint:
+                self.stats["unchanged"] += 1
+                return
+            else:
+                self.stats["inserted" if key not in self.fingerprints else "updated"] += 1
+                self.pending[key] = dict(document)
+                self.fingerprints[key] = fingerprint
+
+            full = len(self.pending) >= self.batchsize
+
+        if full:
+            self.flush()
+
+    def flushIfPending(self, query):
+        """
+        Flushes the buffer if a document matching the query might still be pending, so reads see earlier writes
+
+        :param query: **dict** Query that is about to be run against the collection
+        :return:
+        """
+        with self.lock:
+            if len(self.pending) == 0:
+                return
+
+            if all(field in query for field in self.keys):
+                pending = tuple(query[field] for field in self.keys) in self.pending
+            else:
+                # We can't tell which documents the query matches
+                pending = True
+
+        if pending:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every pending upsert in one unordered bulk write
+
+        Failed operations are logged and the rest of the batch is still written
+
+        :return: **int** Amount of documents that were written
+        """
+        with self.flushLock:
+            with self.lock:
+                pending = self.pending
+                self.pending = OrderedDict()
+
+            if len(pending) == 0:
+                return 0
+
+            keys = list(pending)
+            requests = []
+
+            for key in keys:
+                requests.append(UpdateOne(dict(zip(self.keys, key)),
+                                          {"$set": pending[key], "$currentDate": {"lastModified": True}},
+                                          upsert=True))
+
+            try:
+                self.collection.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+
+                # Failed documents weren't stored, so their next upsert can't be skipped
+                self.forgetFingerprints([keys[error["index"]] for error in errors if "index" in error])
+
+                self.log.error(str(len(errors)) + " of " + str(len(requests)) + " writes to " + self.collection.name +
+                               " failed, first error: " + (errors[0].get("errmsg", "") if errors else ""))
+
+                for error in errors:
+                    self.log.debug("Failed write to " + self.collection.name + ": " + str(error))
+            except Exception:
+                self.forgetFingerprints(keys)
+                raise
+
+            return len(requests)
+
+    def delete(self, keys):
+        """
+        Deletes documents in one unordered bulk write
+
+        :param keys: **list** Filter values of the documents to delete
+        :return: **int** Amount of documents that were deleted
+        """
+        if len(keys) == 0:
+            return 0
+
+        # A pending upsert of a deleted document would bring it back
+        self.flush()
+
+        with self.flushLock:
+            try:
+                result = self.collection.bulk_write([DeleteOne(dict(zip(self.keys, key))) for key in keys],
+                                                    ordered=False)
+                deleted = result.deleted_count
+            except BulkWriteError as e:
+                deleted = e.details.get("nRemoved", 0)
+
+                self.log.error(str(len(e.details.get("writeErrors", []))) + " of " + str(len(keys)) +
+                               " deletes from " + self.collection.name + " failed")
+            finally:
+                self.forgetFingerprints(keys)
+
+        with self.lock:
+            self.stats["deleted"] += deleted
+
+        return deleted
+
+    def forgetFingerprints(self, keys):
+        """
+        Forgets the fingerprints of documents whose stored content is unknown
+
+        :param keys: **list** Filter values of the documents
+        :return:
+        """
+        with self.lock:
+            for key in keys:
+                self.fingerprints.pop(key, None)
+
+    def resetStats(self):
+        """
+        Resets the amount of inserted, updated, unchanged and deleted documents
+
+        :return: **dict** The amounts before they were reset
+        """
+        with self.lock:
+            stats = self.stats
+            self.stats = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+
+        return stats
@@ -5,16 +5,27 @@ Under MIT License - https://github.com/Step7750/ScheduleStorm/blob/master/LICENS
 
 This file is a resource for Schedule Storm - https://github.com/Step7750/ScheduleStorm
 """
-from . import UCalgary
-from . import MTRoyal
-from . import UAlberta
-from . import ULeth
-from . import UWaterloo
-
 
+import importlib
 
 
+def getUniversityClass(uniID, unisettings, scrape=True):
+    """
+    Returns the class to instantiate for a university, importing its module on demand
 
+    The module defaults to uni.{uniID} and the class to {uniID}, the "module" and "class" settings of the university
+    can point to a plugin outside of this package. Universities that don't scrape get the University base class, which
+    has every API handler, so their scraper module and its dependencies are never imported.
 
+    :param uniID: **string** ID of the university (ex. UCalgary)
+    :param unisettings: **dict** Settings of the university
+    :param scrape: **bool** Whether the university will scrape in this process
+    :return: **class** University subclass
+    """
+    if not scrape:
+        from .University import University
+        return University
 
+    module = importlib.import_module(unisettings.get("module", __name__ + "." + uniID))
 
+    return getattr(module, unisettings.get("class", uniID))